@@ -6,6 +6,8 @@ from typing import Dict, Any, List, Optional, Callable
 # Don't import Tool from livekit.agents since it's not available
 from livekit import agents
 
+from report_store_reader import ReportStoreReader, room_report_context
+
 logger = logging.getLogger(__name__)
 
 # TOEFL vocabulary tool that fetches vocabulary words for practice
@@ -67,6 +69,11 @@ class VocabularyTool:
             "count": len(selected_words)
         }
 
+# Fluency metrics are computed locally when a speaking test ends and stored
+# with the report (see socket_io_fluency.py at the repository root)
+report_store = ReportStoreReader()
+
+
 # Speaking feedback tool that analyzes speaking responses
 # Create a basic class without inheriting from Tool
 class SpeakingFeedbackTool:
@@ -108,12 +115,14 @@ class SpeakingFeedbackTool:
                 "error": "No response text provided for analysis"
             }
         
-        # In a real implementation, this would use language analysis APIs or ML models
-        # For now, we'll just provide some basic simulated feedback
-        
         # Count words as a simple metric
         word_count = len(response_text.split())
         
+        # Metrics measured from the recording of the student's speaking test.
+        # The model cannot know which report that is; the room tells us.
+        report = room_report_context(getattr(ctx, "room", None))
+        scores = report_store.load_scores(report.get("report_id"), report.get("user_id"))
+        
         feedback = {
             "word_count": word_count,
             "feedback": {
@@ -122,16 +131,65 @@ class SpeakingFeedbackTool:
             }
         }
         
-        # Generate simulated feedback for each focus area
+        if scores:
+            feedback["metrics"] = scores
+        
+        # Generate feedback for each focus area
         for area in focus_areas:
             if area in self.FEEDBACK_AREAS:
-                feedback["feedback"]["areas"][area] = self._generate_feedback_for_area(area, response_text)
+                feedback["feedback"]["areas"][area] = self._generate_feedback_for_area(area, response_text, scores)
         
         return feedback
     
-    def _generate_feedback_for_area(self, area: str, text: str) -> str:
-        """Generate simulated feedback for a specific area"""
-        # This would be replaced with actual analysis in production
+    def _fluency_feedback(self, scores: Dict[str, float]) -> Optional[str]:
+        """Fluency feedback from the measured speech rate and pauses"""
+        if "speech_rate_wpm" not in scores:
+            return None
+        wpm = scores["speech_rate_wpm"]
+        pauses = int(scores.get("pause_count", 0))
+        long_pauses = int(scores.get("long_pause_count", 0))
+        run = scores.get("mean_length_of_run", 0.0)
+        
+        if wpm < 100:
+            pace = f"Your pace was slow at about {wpm:.0f} words per minute; aim for 120-150."
+        elif wpm > 170:
+            pace = f"You spoke quickly at about {wpm:.0f} words per minute; slowing down slightly will help clarity."
+        else:
+            pace = f"Your pace of about {wpm:.0f} words per minute is natural."
+        
+        if long_pauses:
+            hesitation = (f"You paused {pauses} time{'s' if pauses != 1 else ''}, "
+                          f"{long_pauses} of them for a second or more. "
+                          f"Try to fill planning time with linking phrases instead of silence.")
+        elif pauses:
+            hesitation = f"Your {pauses} pauses were short, which keeps the response flowing."
+        else:
+            hesitation = "You spoke without noticeable pauses."
+        
+        runs = f" On average you said {run:.1f} words between pauses." if run else ""
+        fillers = int(scores.get("filler_count", 0))
+        filled = (f" You used {fillers} filler{'s' if fillers != 1 else ''} like \"um\" or \"uh\";"
+                  f" a short silent pause sounds more confident.") if fillers else ""
+        return f"{pace} {hesitation}{runs}{filled}"
+    
+    def _delivery_feedback(self, scores: Dict[str, float]) -> Optional[str]:
+        """Delivery note from the loudness stability of the recording"""
+        if "loudness_std_db" not in scores:
+            return None
+        if scores["loudness_std_db"] > 8.0:
+            return ("Your volume varied a lot while speaking; keep a steady distance from the microphone "
+                    "and project evenly so every word is heard.")
+        return "Your volume was steady throughout, which makes you easy to follow."
+    
+    def _generate_feedback_for_area(self, area: str, text: str, scores: Optional[Dict[str, float]] = None) -> str:
+        """Generate feedback for a specific area, from measured metrics where available"""
+        scores = scores or {}
+        if area == "fluency":
+            measured = self._fluency_feedback(scores)
+            if measured:
+                return measured
+        
+        # Template feedback for areas without measurements
         feedback_templates = {
             "pronunciation": "Your pronunciation is generally clear, but pay attention to stress patterns in longer words.",
             "fluency": "You speak at a good pace, with minimal hesitation. Continue practicing natural speech flow.",
@@ -140,7 +198,12 @@ class SpeakingFeedbackTool:
             "grammar": "Your sentence structure is mostly correct. Watch for subject-verb agreement in complex sentences."
         }
         
-        return feedback_templates.get(area, "No specific feedback available for this area.")
+        text_feedback = feedback_templates.get(area, "No specific feedback available for this area.")
+        if area == "pronunciation":
+            delivery = self._delivery_feedback(scores)
+            if delivery:
+                text_feedback = f"{text_feedback} {delivery}"
+        return text_feedback
 
 # TOEFL Speaking Timer Tool
 # Create a basic class without inheriting from Tool
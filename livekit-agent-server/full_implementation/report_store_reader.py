@@ -0,0 +1 @@
+../rox/report_store_reader.py
\ No newline at end of file
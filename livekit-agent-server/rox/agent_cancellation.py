@@ -0,0 +1,113 @@
+"""
+Cancelling agent replies the user no longer waits for.
+
+When the student barges in, CustomLLMBridge abandons the turn. It closes the
+HTTP connection and posts the turn's request ID to ``/cancel``. A streamed
+reply (agent_streaming.ndjson_response) notices either one between two
+events. It then stops, and closing its generators closes the OpenAI stream
+behind it, so no more tokens are generated. The explicit cancel also
+covers the stretches where nothing is written to the socket, such as tool
+calls or waiting for the first token.
+
+The bridge also sends how long it will wait for the reply to start
+(``X-Request-Timeout-Ms``). ``request_timeout`` turns that into a timeout
+for the agent's OpenAI calls, so they do not outlive the turn.
+
+Metrics (served at ``/metrics``):
+    agent_replies{outcome=completed|failed|cancelled|disconnected}
+    agent_cancel_requests{found=true|false}
+
+Usage:
+    register_cancellation_routes(app)
+    ...
+    if reply_cancelled():        # inside a streamed reply
+        return
+    client.chat.completions.create(..., timeout=request_timeout(client.timeout))
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from flask import jsonify, request
+
+from agent_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+TIMEOUT_HEADER = "X-Request-Timeout-Ms"
+
+
+class ReplyRegistry:
+    """Cancel flags of the replies currently being generated, by request ID"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._replies: Dict[str, threading.Event] = {}
+
+    def start(self, request_id: Optional[str]) -> threading.Event:
+        token = threading.Event()
+        if request_id:
+            with self._lock:
+                self._replies[request_id] = token
+        return token
+
+    def finish(self, request_id: Optional[str], outcome: str) -> None:
+        if request_id:
+            with self._lock:
+                self._replies.pop(request_id, None)
+        metrics.inc("agent_replies", outcome=outcome)
+
+    def cancel(self, request_id: str) -> bool:
+        with self._lock:
+            token = self._replies.get(request_id)
+        if token is not None:
+            token.set()
+        metrics.inc("agent_cancel_requests", found="true" if token is not None else "false")
+        return token is not None
+
+    def is_cancelled(self, request_id: Optional[str]) -> bool:
+        if not request_id:
+            return False
+        with self._lock:
+            token = self._replies.get(request_id)
+        return token is not None and token.is_set()
+
+
+replies = ReplyRegistry()
+
+
+def current_request_id() -> Optional[str]:
+    return request.headers.get(REQUEST_ID_HEADER)
+
+
+def request_timeout(default: Any = None) -> Any:
+    """Seconds the bridge waits for this request's reply, or ``default``"""
+    try:
+        return float(request.headers[TIMEOUT_HEADER]) / 1000.0
+    except (KeyError, ValueError, RuntimeError):  # no header, or outside a request
+        return default
+
+
+def reply_cancelled() -> bool:
+    """True if the bridge cancelled the reply being generated for this request"""
+    return replies.is_cancelled(current_request_id())
+
+
+def register_cancellation_routes(app) -> None:
+    """Add ``POST /cancel`` and ``GET /metrics`` to an agent's Flask app"""
+
+    @app.route('/cancel', methods=['POST'])
+    def cancel_reply():
+        data = request.get_json(silent=True) or {}
+        request_id = data.get("request_id") or current_request_id()
+        if not request_id:
+            return jsonify({"error": "Missing 'request_id'"}), 400
+        found = replies.cancel(request_id)
+        logger.info(f"Cancel requested for reply {request_id}: {'cancelling' if found else 'not running'}")
+        return jsonify({"request_id": request_id, "cancelled": found})
+
+    @app.route('/metrics', methods=['GET'])
+    def agent_metrics_route():
+        return jsonify(metrics.snapshot())
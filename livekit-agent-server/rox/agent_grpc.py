@@ -0,0 +1,138 @@
+"""
+gRPC transport for co-located agents, served on a Unix domain socket.
+
+The bridge usually runs on the same host as its agent. Over HTTP, every turn
+pays for a TCP connection through Flask's development server, HTTP/1.1
+framing and a JSON body. With ``AGENT_GRPC_SOCKET`` set, an agent also
+serves ``AgentTranscripts.ProcessTranscript`` (protos/interaction.proto) on
+that socket. CustomLLMBridge uses it when its URL is ``unix:///path``.
+
+The RPC is dispatched to the agent's own ``/process`` route in-process, with
+the same headers the bridge sends over HTTP. Command routing, streaming,
+cancellation and deadlines therefore behave exactly as they do over HTTP.
+The streamed NDJSON events become ``ReplyEvent`` messages. A legacy JSON
+reply becomes one delta, its DOM actions and done. When the bridge cancels
+the RPC, the reply is cancelled like a ``/cancel`` request.
+
+Usage (agent):
+    if AGENT_GRPC_SOCKET:
+        serve_grpc(app, AGENT_GRPC_SOCKET)
+    app.run(...)
+"""
+
+import json
+import logging
+import os
+from concurrent import futures
+from typing import Any, Dict, Iterator
+
+import grpc
+
+from agent_cancellation import REQUEST_ID_HEADER, TIMEOUT_HEADER, replies
+from agent_metrics import metrics
+from agent_streaming import STREAM_MIMETYPE, result_events
+from generated.protos import interaction_pb2, interaction_pb2_grpc
+
+logger = logging.getLogger(__name__)
+
+# Path of the agent's Unix socket, e.g. /tmp/rox_agent.sock; unset = HTTP only
+AGENT_GRPC_SOCKET = os.getenv("AGENT_GRPC_SOCKET", "")
+AGENT_GRPC_WORKERS = int(os.getenv("AGENT_GRPC_WORKERS", "8"))
+
+# HTTP status of a failed /process call -> gRPC status of the RPC
+_STATUS_CODES = {
+    400: grpc.StatusCode.INVALID_ARGUMENT,
+    404: grpc.StatusCode.NOT_FOUND,
+    429: grpc.StatusCode.RESOURCE_EXHAUSTED,
+    503: grpc.StatusCode.UNAVAILABLE,
+}
+
+
+def request_payload(message: interaction_pb2.TranscriptRequest) -> Dict[str, Any]:
+    """The JSON body the bridge would have posted to /process"""
+    payload: Dict[str, Any] = {"transcript": message.transcript}
+    if message.history:
+        payload["history"] = [{"role": turn.role, "content": turn.content} for turn in message.history]
+    if message.summary:
+        payload["summary"] = message.summary
+    if message.report_id:
+        payload["report_id"] = message.report_id
+    if message.user_id:
+        payload["user_id"] = message.user_id
+    return payload
+
+
+def reply_event(event: Dict[str, Any]) -> interaction_pb2.ReplyEvent:
+    """Protobuf form of one agent_streaming event"""
+    event_type = event.get("type")
+    if event_type == "delta":
+        return interaction_pb2.ReplyEvent(delta=event.get("text", ""))
+    if event_type == "dom_actions":
+        return interaction_pb2.ReplyEvent(dom_actions=json.dumps(event.get("dom_actions", [])))
+    result = event.get("result")
+    return interaction_pb2.ReplyEvent(done=json.dumps(result) if result else "")
+
+
+class TranscriptServicer(interaction_pb2_grpc.AgentTranscriptsServicer):
+    """Runs ProcessTranscript through the Flask app's /process route"""
+
+    def __init__(self, app, path: str = "/process"):
+        self.app = app
+        self.path = path
+
+    def ProcessTranscript(self, message, context) -> Iterator[interaction_pb2.ReplyEvent]:
+        request_id = message.request_id
+        headers = {"Accept": STREAM_MIMETYPE}
+        if request_id:
+            headers[REQUEST_ID_HEADER] = request_id
+        if message.timeout_ms:
+            headers[TIMEOUT_HEADER] = str(message.timeout_ms)
+        finished = False
+
+        def on_rpc_done():
+            # Dropped by the bridge (barge-in, deadline): same as POST /cancel
+            if not finished and request_id:
+                replies.cancel(request_id)
+
+        context.add_callback(on_rpc_done)
+
+        with self.app.test_request_context(self.path, method="POST", headers=headers,
+                                           json=request_payload(message)):
+            try:
+                response = self.app.full_dispatch_request()
+            except Exception as e:
+                logger.error(f"Error processing transcript over gRPC: {e}")
+                metrics.inc("agent_grpc_requests", status="500")
+                finished = True
+                context.abort(grpc.StatusCode.INTERNAL, str(e))
+            try:
+                if response.status_code != 200:
+                    metrics.inc("agent_grpc_requests", status=str(response.status_code))
+                    error = (response.get_json(silent=True) or {}).get("error") or response.status
+                    finished = True
+                    context.abort(_STATUS_CODES.get(response.status_code, grpc.StatusCode.INTERNAL), str(error))
+                metrics.inc("agent_grpc_requests", status="200")
+                if response.mimetype == STREAM_MIMETYPE:
+                    for line in response.response:
+                        if line.strip():
+                            yield reply_event(json.loads(line))
+                else:
+                    for event in result_events(response.get_json() or {}):
+                        yield reply_event(event)
+                finished = True
+            finally:
+                # Closes the streamed reply (and the OpenAI stream behind it) if
+                # the RPC ended early
+                response.close()
+
+
+def serve_grpc(app, socket_path: str = AGENT_GRPC_SOCKET, max_workers: int = AGENT_GRPC_WORKERS) -> grpc.Server:
+    """Start serving ProcessTranscript for ``app`` on a Unix socket, in the background"""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # left over from a previous run
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    interaction_pb2_grpc.add_AgentTranscriptsServicer_to_server(TranscriptServicer(app), server)
+    server.add_insecure_port(f"unix://{socket_path}")
+    server.start()
+    logger.info(f"Serving ProcessTranscript over gRPC at unix://{socket_path}")
+    return server
@@ -0,0 +1,44 @@
+"""
+Fixed voice commands of each agent persona.
+
+Each persona maps intent names to the phrases that trigger them. The agent
+compiles its persona with ``persona_router`` and maps intents to local
+handlers. Adding a phrase here is enough to route it without OpenAI.
+Intents whose handlers change something (the current highlight, the page)
+are listed in SIDE_EFFECT_INTENTS and only route when the phrase covers
+nearly all of the utterance.
+"""
+
+from intent_router import INTENT_ROUTER_THRESHOLD, IntentRouter
+
+# --- Speaking report agent ---
+NEXT_COMMANDS = ["next", "next highlight", "move to next", "go to next", "next suggestion", "continue"]
+EXPLAIN_COMMANDS = ["explain", "explain this", "tell me more", "what's this", "what's wrong here", "explain issue"]
+SUMMARY_COMMANDS = ["summarize", "give me a summary", "overview", "progress", "how many highlights", "status"]
+
+# --- Rox assistant ---
+STATUS_COMMANDS = ["show my status", "view my status", "my status", "show my progress", "my scores", "status"]
+START_COMMANDS = ["start learning", "begin learning", "start my session", "start next session", "continue learning"]
+
+PERSONA_INTENTS = {
+    "speaking_report": {
+        "next_highlight": NEXT_COMMANDS,
+        "explain_highlight": EXPLAIN_COMMANDS,
+        "get_progress": SUMMARY_COMMANDS,
+    },
+    "rox": {
+        "show_status": STATUS_COMMANDS,
+        "start_learning": START_COMMANDS,
+    },
+}
+
+SIDE_EFFECT_INTENTS = {
+    "speaking_report": {"next_highlight"},
+    "rox": {"show_status", "start_learning"},
+}
+
+
+def persona_router(persona: str, threshold: float = INTENT_ROUTER_THRESHOLD) -> IntentRouter:
+    """Compiled router for one persona's commands"""
+    return IntentRouter(persona, PERSONA_INTENTS[persona], threshold,
+                        side_effects=SIDE_EFFECT_INTENTS.get(persona, ()))
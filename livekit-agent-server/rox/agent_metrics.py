@@ -0,0 +1,156 @@
+"""
+In-process metrics for the LiveKit agent workers.
+
+The same small registry of counters, gauges and latency histograms as
+socket_io_metrics.py at the repository root (this directory is deployed on
+its own). The LLM bridge records connection reuse and turn latencies here;
+snapshots are plain dicts that are logged when an agent session ends.
+
+Usage:
+    from agent_metrics import metrics
+    metrics.inc("bridge_connections", result="reused")
+    with metrics.timer("bridge_request_ms"):
+        ...
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Deque, Iterator, Optional, Tuple
+
+# Number of most recent samples kept per histogram for percentile estimates
+DEFAULT_RESERVOIR_SIZE = 10000
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _make_key(name: str, labels: Dict[str, Any]) -> MetricKey:
+    """Build a hashable key from a metric name and its labels"""
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _nearest_rank(ordered, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted, non-empty sequence"""
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def _format_key(key: MetricKey) -> str:
+    """Render a metric key as name{label=value,...}"""
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+class LatencyHistogram:
+    """Keeps count/sum/min/max plus a bounded window of samples for percentiles"""
+
+    def __init__(self, reservoir_size: int = DEFAULT_RESERVOIR_SIZE):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.samples: Deque[float] = deque(maxlen=reservoir_size)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile over the retained samples"""
+        if not self.samples:
+            return None
+        return _nearest_rank(sorted(self.samples), pct)
+
+    def snapshot(self) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3),
+            "min": round(self.min, 3),
+            "max": round(self.max, 3),
+            "p50": round(_nearest_rank(ordered, 50), 3),
+            "p95": round(_nearest_rank(ordered, 95), 3),
+            "p99": round(_nearest_rank(ordered, 99), 3),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters, gauges and histograms"""
+
+    def __init__(self, reservoir_size: int = DEFAULT_RESERVOIR_SIZE):
+        self._lock = threading.Lock()
+        self._reservoir_size = reservoir_size
+        self._counters: Dict[MetricKey, float] = {}
+        self._gauges: Dict[MetricKey, float] = {}
+        self._histograms: Dict[MetricKey, LatencyHistogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Increment a counter"""
+        key = _make_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Set a gauge to an absolute value"""
+        key = _make_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def remove_gauge(self, name: str, **labels: Any) -> None:
+        """Drop a labelled gauge (e.g. when the test it tracked is gone)"""
+        key = _make_key(name, labels)
+        with self._lock:
+            self._gauges.pop(key, None)
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Record a sample (usually a latency in milliseconds)"""
+        key = _make_key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = LatencyHistogram(self._reservoir_size)
+                self._histograms[key] = histogram
+            histogram.observe(value)
+
+    def histogram(self, name: str, **labels: Any) -> Optional[LatencyHistogram]:
+        """Return the histogram for a metric, if any samples were recorded"""
+        with self._lock:
+            return self._histograms.get(_make_key(name, labels))
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """Context manager that observes the elapsed wall time in milliseconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000.0, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return all metrics as a JSON-serializable dict"""
+        with self._lock:
+            return {
+                "counters": {_format_key(k): v for k, v in self._counters.items()},
+                "gauges": {_format_key(k): v for k, v in self._gauges.items()},
+                "histograms": {_format_key(k): h.snapshot() for k, h in self._histograms.items()},
+            }
+
+    def reset(self) -> None:
+        """Clear every metric"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+# Shared registry used by the worker process
+metrics = MetricsRegistry()
@@ -0,0 +1,153 @@
+"""
+Streaming replies from the Flask agents to CustomLLMBridge.
+
+A bridge that can consume a streamed reply sends
+``Accept: application/x-ndjson``. The agent then answers with one JSON
+object per line instead of a single ``{"response": ...}`` document:
+
+    {"type": "dom_actions", "dom_actions": [{"action": "click", ...}]}
+    {"type": "delta", "text": "Let's look at"}
+    {"type": "delta", "text": " the next highlight."}
+    {"type": "done", "result": {"highlight_id": "h2"}}
+
+``delta`` lines carry the spoken text as it is generated, so TTS can start
+on the first one. ``dom_actions`` is sent as soon as the agent knows the
+actions, ahead of the text where possible; the bridge publishes them to the
+room right away. ``done`` ends the reply and carries any other fields of
+the legacy JSON result. Clients that do not
+ask for NDJSON keep getting the plain JSON response.
+
+Usage:
+    if wants_stream(request):
+        return ndjson_response(generate_events())
+    return jsonify(result)
+"""
+
+import json
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from flask import Response, stream_with_context
+
+from agent_cancellation import current_request_id, replies
+
+logger = logging.getLogger(__name__)
+
+STREAM_MIMETYPE = "application/x-ndjson"
+
+
+def wants_stream(req) -> bool:
+    """True if the caller asked for an NDJSON reply"""
+    return STREAM_MIMETYPE in req.headers.get("Accept", "")
+
+
+def delta_event(text: str) -> Dict[str, Any]:
+    return {"type": "delta", "text": text}
+
+
+def dom_actions_event(dom_actions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"type": "dom_actions", "dom_actions": dom_actions}
+
+
+def done_event(result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    event: Dict[str, Any] = {"type": "done"}
+    if result:
+        event["result"] = result
+    return event
+
+
+def result_events(result: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Events for a complete legacy result dict.
+
+    ``dom_actions`` (or an ``action``/``payload`` pair) becomes the
+    dom_actions event, sent first so the UI does not wait for the speech;
+    ``response`` becomes one delta, everything else the done event.
+    """
+    rest = dict(result)
+    text = rest.pop("response", "")
+    dom_actions = rest.pop("dom_actions", None)
+    if "action" in rest and "payload" in rest:
+        dom_actions = [{"action": rest.pop("action"), "payload": rest.pop("payload")}]
+    if dom_actions:
+        yield dom_actions_event(dom_actions)
+    if text:
+        yield delta_event(text)
+    yield done_event(rest)
+
+
+def completion_deltas(stream, tool_calls: Optional[List[Dict[str, Any]]] = None) -> Iterator[str]:
+    """
+    Text deltas of a streamed OpenAI chat completion.
+
+    Tool-call fragments are merged into ``tool_calls`` as
+    ``{"id", "type", "function": {"name", "arguments"}}`` dicts, ready to be
+    appended to the messages of a follow-up request.
+    """
+    try:
+        for chunk in stream:
+            yield from _chunk_deltas(chunk, tool_calls)
+    finally:
+        # Closing the generator early (cancelled reply) ends the OpenAI request
+        if hasattr(stream, "close"):
+            stream.close()
+
+
+def _chunk_deltas(chunk, tool_calls: Optional[List[Dict[str, Any]]]) -> Iterator[str]:
+    if chunk.choices:
+        delta = chunk.choices[0].delta
+        if delta.content:
+            yield delta.content
+        if tool_calls is None or not delta.tool_calls:
+            return
+        for fragment in delta.tool_calls:
+            while len(tool_calls) <= fragment.index:
+                tool_calls.append({"id": "", "type": "function",
+                                   "function": {"name": "", "arguments": ""}})
+            call = tool_calls[fragment.index]
+            if fragment.id:
+                call["id"] = fragment.id
+            if fragment.function is not None:
+                if fragment.function.name:
+                    call["function"]["name"] += fragment.function.name
+                if fragment.function.arguments:
+                    call["function"]["arguments"] += fragment.function.arguments
+
+
+def ndjson_response(events: Iterable[Dict[str, Any]]) -> Response:
+    """
+    Stream events as NDJSON; an error mid-stream still ends with done.
+
+    Stops early when the bridge cancels the request (agent_cancellation) or
+    disconnects, and closes ``events`` so the work behind it stops too.
+    """
+    request_id = current_request_id()
+    token = replies.start(request_id)
+
+    def generate():
+        finished = False
+        outcome = "disconnected"
+        try:
+            for event in events:
+                if token.is_set():
+                    logger.info(f"Reply {request_id} cancelled by the bridge")
+                    outcome = "cancelled"
+                    return
+                finished = event.get("type") == "done"
+                yield json.dumps(event) + "\n"
+            outcome = "completed"
+        except Exception as e:
+            logger.error(f"Error while streaming reply: {e}")
+            outcome = "failed"
+            if not finished:
+                yield json.dumps(done_event({"error": str(e)})) + "\n"
+                finished = True
+        finally:
+            # Runs on a client disconnect too (GeneratorExit from the server)
+            if hasattr(events, "close"):
+                events.close()
+            replies.finish(request_id, outcome)
+        if not finished:
+            yield json.dumps(done_event()) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype=STREAM_MIMETYPE)
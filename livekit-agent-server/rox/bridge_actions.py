@@ -0,0 +1,72 @@
+"""
+Early delivery of DOM actions on the LiveKit data channel.
+
+The bridge used to attach an agent's ``dom_actions`` to the last ChatChunk
+of the reply, as ``ChoiceDelta.metadata``. That put the UI reaction behind
+the whole reply text. The LiveKit agents SDK also drops that field before it
+reaches the room. Instead, the bridge now publishes the actions on a data
+channel topic as soon as it parses them from the agent's reply, while the
+text is still streaming to TTS:
+
+    topic "dom-actions" (BRIDGE_ACTIONS_TOPIC), reliable:
+    {"type": "dom_actions", "turn_id": "<id>", "dom_actions": [...]}
+
+``turn_id`` is also the ``id`` of every ChatChunk of the turn, so a client
+can match the actions to the speech they belong to. Publishing runs in the
+background; a slow or failed publish never holds up the reply.
+
+Metrics:
+    bridge_dom_actions{result=published|failed|no_room}
+    bridge_dom_actions_lead_ms   time between publishing and the end of the
+                                 reply text, where the metadata used to go
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set
+
+from agent_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BRIDGE_ACTIONS_TOPIC = os.getenv("BRIDGE_ACTIONS_TOPIC", "dom-actions")
+
+
+def actions_packet(turn_id: str, dom_actions: List[Dict[str, Any]]) -> bytes:
+    return json.dumps({"type": "dom_actions", "turn_id": turn_id, "dom_actions": dom_actions}).encode("utf-8")
+
+
+class DomActionPublisher:
+    """Publishes a turn's DOM actions to the room without waiting for them to be sent"""
+
+    def __init__(self, room=None, topic: str = BRIDGE_ACTIONS_TOPIC):
+        self.room = room
+        self.topic = topic
+        self._tasks: Set[asyncio.Future] = set()
+
+    def publish(self, turn_id: str, dom_actions: List[Dict[str, Any]]) -> bool:
+        """Start publishing; False if there is no room to publish to"""
+        participant = getattr(self.room, "local_participant", None)
+        if participant is None:
+            metrics.inc("bridge_dom_actions", result="no_room")
+            return False
+        task = asyncio.ensure_future(self._publish(participant, turn_id, dom_actions))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _publish(self, participant, turn_id: str, dom_actions: List[Dict[str, Any]]) -> None:
+        try:
+            await participant.publish_data(actions_packet(turn_id, dom_actions), reliable=True, topic=self.topic)
+            metrics.inc("bridge_dom_actions", result="published")
+            logger.info(f"Published DOM actions of turn {turn_id} on '{self.topic}': {dom_actions}")
+        except Exception as e:
+            metrics.inc("bridge_dom_actions", result="failed")
+            logger.error(f"Could not publish DOM actions of turn {turn_id}: {e}")
+
+    async def aclose(self, timeout: Optional[float] = 1.0) -> None:
+        """Give publications still in flight a moment to finish"""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
@@ -0,0 +1,122 @@
+"""
+Typed access to the agent SDK's chat context for CustomLLMBridge.
+
+The bridge only needs the latest user message of each turn. The LiveKit
+agents SDK has exposed it in different shapes across versions:
+``ChatContext.items`` (1.x), ``ChatContext.messages`` (0.x), a plain
+iterable, or ``to_dict()["messages"]``. Messages have likewise been objects
+with ``role``/``content`` or dicts. Which accessor works is decided once per
+chat-context class and once per message class, then cached, so a turn does
+no attribute probing. The SDK version in use fixes those classes.
+
+The latest user message is found by scanning from the tail of the context.
+It is usually the last item, so the cost does not grow with the session.
+The reply just before it is the previous turn's reply as the SDK kept it,
+which for an interrupted reply is only the part that was played.
+
+Usage:
+    transcript = latest_user_text(chat_ctx)
+"""
+
+import logging
+from typing import Any, Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+ItemsAccessor = Callable[[Any], Sequence[Any]]
+MessageAccessor = Callable[[Any], Any]
+
+
+def _content_text(content: Any) -> str:
+    """Text of a message's content, which is a string or a list of parts"""
+    if isinstance(content, list):
+        return " ".join(part for part in content if isinstance(part, str))
+    return "" if content is None else str(content)
+
+
+def _resolve_items(chat_ctx: Any) -> ItemsAccessor:
+    if hasattr(chat_ctx, "items") and not callable(chat_ctx.items):
+        return lambda ctx: ctx.items
+    if hasattr(chat_ctx, "messages") and not callable(chat_ctx.messages):
+        return lambda ctx: ctx.messages
+    if hasattr(chat_ctx, "__iter__"):
+        return lambda ctx: list(ctx)
+    if callable(getattr(chat_ctx, "to_dict", None)):
+        return lambda ctx: ctx.to_dict().get("messages", [])
+    logger.warning(f"No way to read messages from {type(chat_ctx).__name__}; treating it as empty")
+    return lambda ctx: []
+
+
+def _resolve_role(message: Any) -> MessageAccessor:
+    if isinstance(message, dict):
+        return lambda msg: msg.get("role")
+    if hasattr(message, "role"):
+        return lambda msg: msg.role
+    return lambda msg: None  # function calls and their outputs have no role
+
+
+def _resolve_text(message: Any) -> MessageAccessor:
+    if isinstance(message, dict):
+        return lambda msg: _content_text(msg.get("content"))
+    if hasattr(message, "text_content"):
+        return lambda msg: msg.text_content or ""
+    if hasattr(message, "content"):
+        return lambda msg: _content_text(msg.content)
+    return str
+
+
+class ChatContextAdapter:
+    """Accessors for the chat-context and message classes seen so far"""
+
+    def __init__(self):
+        self._items: Dict[type, ItemsAccessor] = {}
+        self._roles: Dict[type, MessageAccessor] = {}
+        self._texts: Dict[type, MessageAccessor] = {}
+
+    def items(self, chat_ctx: Any) -> Sequence[Any]:
+        accessor = self._items.get(type(chat_ctx))
+        if accessor is None:
+            accessor = self._items[type(chat_ctx)] = _resolve_items(chat_ctx)
+            logger.debug(f"Reading chat context {type(chat_ctx).__module__}.{type(chat_ctx).__name__}")
+        return accessor(chat_ctx)
+
+    def role(self, message: Any) -> str:
+        accessor = self._roles.get(type(message))
+        if accessor is None:
+            accessor = self._roles[type(message)] = _resolve_role(message)
+        return str(accessor(message) or "").lower()
+
+    def text(self, message: Any) -> str:
+        accessor = self._texts.get(type(message))
+        if accessor is None:
+            accessor = self._texts[type(message)] = _resolve_text(message)
+        return accessor(message)
+
+    def latest_user_message(self, items: Sequence[Any]) -> Optional[Any]:
+        """The last user message of the context, searched from the tail"""
+        for index in range(len(items) - 1, -1, -1):
+            if self.role(items[index]) == "user":
+                return items[index]
+        return None
+
+    def previous_reply(self, items: Sequence[Any]) -> Optional[Any]:
+        """The assistant message between the last two user messages, if any"""
+        seen_user = False
+        for index in range(len(items) - 1, -1, -1):
+            role = self.role(items[index])
+            if role == "user":
+                if seen_user:
+                    return None
+                seen_user = True
+            elif role == "assistant" and seen_user:
+                return items[index]
+        return None
+
+
+chat_context = ChatContextAdapter()
+
+
+def latest_user_text(chat_ctx: Any) -> Optional[str]:
+    """Text of the latest user message, or None if there is none"""
+    message = chat_context.latest_user_message(chat_context.items(chat_ctx))
+    return chat_context.text(message) if message is not None else None
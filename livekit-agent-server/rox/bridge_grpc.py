@@ -0,0 +1,93 @@
+"""
+gRPC transport of CustomLLMBridge for agents on the same host.
+
+A bridge URL of ``unix:///tmp/rox_agent.sock`` (or ``grpc://host:port``)
+sends each turn as one ``AgentTranscripts.ProcessTranscript`` call
+(protos/interaction.proto) instead of an HTTP POST. The agent serves it
+with agent_grpc.serve_grpc. The reply streams back as ``ReplyEvent``
+messages, which become the same ("delta", text) and ("dom_actions", list)
+events as an NDJSON reply.
+
+Cancelling the call, on barge-in or at the turn's deadline, cancels the
+reply on the agent. No separate /cancel request is needed.
+
+Compare per-turn overhead with HTTP using transport_bench.py.
+"""
+
+import json
+import logging
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import grpc
+
+from generated.protos import interaction_pb2, interaction_pb2_grpc
+
+logger = logging.getLogger(__name__)
+
+GRPC_SCHEMES = ("unix", "grpc")
+
+
+def is_grpc_url(url: str) -> bool:
+    return urlsplit(url).scheme in GRPC_SCHEMES
+
+
+def grpc_target(url: str) -> str:
+    """gRPC channel target of a bridge URL"""
+    parts = urlsplit(url)
+    if parts.scheme == "unix":
+        return url  # gRPC accepts unix:path and unix:///absolute/path as is
+    return parts.netloc
+
+
+class GrpcTransport:
+    """One long-lived gRPC channel to the agent, shared by all turns"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.target = grpc_target(url)
+        self._channel: Optional[grpc.aio.Channel] = None
+        self._stub: Optional[interaction_pb2_grpc.AgentTranscriptsStub] = None
+
+    def _get_stub(self) -> interaction_pb2_grpc.AgentTranscriptsStub:
+        # Created on the first turn, inside the agent's event loop
+        if self._stub is None:
+            self._channel = grpc.aio.insecure_channel(self.target)
+            self._stub = interaction_pb2_grpc.AgentTranscriptsStub(self._channel)
+        return self._stub
+
+    async def reply(self, payload: Dict[str, Any], request_id: str,
+                    timeout_ms: Optional[float] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Send one turn's request payload; yield the reply events"""
+        message = interaction_pb2.TranscriptRequest(
+            transcript=payload["transcript"],
+            request_id=request_id,
+            # 0 means no deadline, so a spent one is sent as 1 ms
+            timeout_ms=max(1, int(timeout_ms)) if timeout_ms is not None else 0,
+            history=[interaction_pb2.HistoryTurn(role=turn["role"], content=turn["content"])
+                     for turn in payload.get("history", [])],
+            summary=payload.get("summary", ""),
+            report_id=payload.get("report_id", ""),
+            user_id=payload.get("user_id", ""),
+        )
+        call = self._get_stub().ProcessTranscript(message)
+        try:
+            async for event in call:
+                kind = event.WhichOneof("event")
+                if kind == "delta" and event.delta:
+                    yield "delta", event.delta
+                elif kind == "dom_actions":
+                    dom_actions = json.loads(event.dom_actions)
+                    if dom_actions:
+                        yield "dom_actions", dom_actions
+                elif kind == "done" and event.done:
+                    logger.debug(f"Reply result fields from external agent: {event.done}")
+        finally:
+            # Stops the reply on the agent if the turn was dropped; no-op once it finished
+            call.cancel()
+
+    async def aclose(self) -> None:
+        if self._channel is not None:
+            await self._channel.close()
+        self._channel = None
+        self._stub = None
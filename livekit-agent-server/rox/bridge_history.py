@@ -0,0 +1,143 @@
+"""
+Token-budgeted conversation history for CustomLLMBridge.
+
+The bridge records each turn as it happens: the transcript it sends and the
+reply text it passes on to TTS. The text passed on runs ahead of playback,
+so an interrupted reply is recorded with words the student never heard. The
+agent SDK adds only the played part of an interrupted reply to the chat
+context. On the next turn the bridge replaces its record with that
+(``replace_reply``). Every request carries the most recent turns that fit in
+``budget_tokens``:
+
+    {"transcript": "...",
+     "history": [{"role": "user", "content": "..."},
+                 {"role": "assistant", "content": "..."}],
+     "summary": "Student: ... Tutor: ..."}
+
+Turns that fall out of the window are merged into a rolling summary, which
+starts with the opening of each turn (up to ~160 characters). When it
+outgrows ``summary_tokens``, the oldest lines are shortened first, down to
+SUMMARY_MIN_CHARS. After that the two oldest lines are merged into one. The
+summary therefore always reaches back to the start of the session, with
+older turns in less detail. It only changes when a turn is evicted, so
+prompt size stays bounded however long the session runs. Token counts are
+estimated at four characters per token.
+
+Metrics:
+    bridge_history_tokens       estimated tokens of history + summary sent
+    bridge_history_evicted      turns folded into the summary
+"""
+
+import logging
+import os
+import re
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from agent_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BRIDGE_HISTORY_TOKENS = int(os.getenv("BRIDGE_HISTORY_TOKENS", "1200"))
+BRIDGE_SUMMARY_TOKENS = int(os.getenv("BRIDGE_SUMMARY_TOKENS", "200"))
+# Longest excerpt of one turn kept in the summary
+SUMMARY_EXCERPT_CHARS = 160
+# Summary lines are shortened down to this before old lines are merged
+SUMMARY_MIN_CHARS = 48
+
+SPEAKERS = {"user": "Student", "assistant": "Tutor"}
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _excerpt(text: str, limit: int = SUMMARY_EXCERPT_CHARS) -> str:
+    """The opening of a text, at most ``limit`` characters, cut at a sentence end where possible"""
+    text = " ".join(text.split())
+    if len(text) <= limit:
+        return text
+    clipped = text[:limit]
+    ends = [match.start() for match in _SENTENCE_END.finditer(clipped)]
+    if ends and ends[-1] >= limit // 3:
+        return clipped[:ends[-1]]
+    return clipped[:limit - 3].rsplit(" ", 1)[0] + "..."
+
+
+class ConversationHistory:
+    """Recent turns within a token budget, older ones as a rolling summary"""
+
+    def __init__(self, budget_tokens: int = BRIDGE_HISTORY_TOKENS,
+                 summary_tokens: int = BRIDGE_SUMMARY_TOKENS):
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self._window: Deque[Tuple[str, str, int]] = deque()
+        self._window_tokens = 0
+        self._summary_lines: List[str] = []
+        self._summary = ""
+        self._summary_tokens = 0
+
+    def add(self, role: str, text: str) -> None:
+        """Append one turn; evicts the oldest turns beyond the budget"""
+        text = text.strip()
+        if not text:
+            return
+        tokens = estimate_tokens(text)
+        self._window.append((role, text, tokens))
+        self._window_tokens += tokens
+        while self._window_tokens > self.budget_tokens and len(self._window) > 1:
+            old_role, old_text, old_tokens = self._window.popleft()
+            self._window_tokens -= old_tokens
+            self._fold(old_role, old_text)
+
+    def replace_reply(self, played: str) -> bool:
+        """
+        Replace the last recorded reply with the part of it that was played.
+
+        Only a shorter opening of the recorded reply is taken, so an
+        unrelated assistant message never overwrites it.
+        """
+        played = " ".join(played.split())
+        if not self._window or not played:
+            return False
+        role, text, tokens = self._window[-1]
+        if role != "assistant" or len(played) >= len(text) or not " ".join(text.split()).startswith(played):
+            return False
+        played_tokens = estimate_tokens(played)
+        self._window[-1] = (role, played, played_tokens)
+        self._window_tokens += played_tokens - tokens
+        return True
+
+    def _fold(self, role: str, text: str) -> None:
+        self._summary_lines.append(f"{SPEAKERS.get(role, role)}: {_excerpt(text)}")
+        lines = self._summary_lines
+        while estimate_tokens(" ".join(lines)) > self.summary_tokens:
+            # Shorten the oldest line that can be, never the newest
+            for index in range(len(lines) - 1):
+                if len(lines[index]) > SUMMARY_MIN_CHARS:
+                    lines[index] = _excerpt(lines[index], max(SUMMARY_MIN_CHARS, len(lines[index]) // 2))
+                    break
+            else:
+                if len(lines) < 3:
+                    break
+                half = SUMMARY_MIN_CHARS // 2
+                lines[0:2] = [f"{_excerpt(lines[0], half)} {_excerpt(lines[1], half)}"]
+        self._summary = " ".join(lines)
+        self._summary_tokens = estimate_tokens(self._summary)
+        metrics.inc("bridge_history_evicted")
+
+    @property
+    def tokens(self) -> int:
+        return self._window_tokens + self._summary_tokens
+
+    def payload(self) -> Dict[str, Any]:
+        """History fields to send along with the next transcript"""
+        fields: Dict[str, Any] = {}
+        if self._window:
+            fields["history"] = [{"role": role, "content": text} for role, text, _ in self._window]
+        if self._summary:
+            fields["summary"] = self._summary
+        metrics.observe("bridge_history_tokens", self.tokens)
+        return fields
@@ -0,0 +1,291 @@
+"""
+Deadlines, retries and hedged requests for CustomLLMBridge.
+
+Each turn gets a deadline (``deadline_ms``) for the agent's reply to start.
+The time left is sent to the agent in the ``X-Request-Timeout-Ms`` header,
+so it can bound its own OpenAI calls (see agent_cancellation.request_timeout).
+Until the first event of a reply arrives:
+
+- A failure that shows the agent did not run the turn is retried. These are
+  a refused connection, HTTP 429, 502 or 503, and gRPC UNAVAILABLE or
+  RESOURCE_EXHAUSTED. There are at most
+  ``retries`` retries, with exponential backoff and full jitter.
+- With hedging on, a second request is sent if the first has not answered
+  after the p95 of recent reply latencies. The first to answer is used and
+  the other is cancelled.
+- When the deadline passes, all requests are cancelled. The student hears
+  the last reply the agent gave to the same transcript, or a templated
+  apology if there is none.
+
+Once a reply has started it streams as before; a failure after that point is
+not retried, since the agent has already acted on the turn.
+
+A speculative reply claimed for the turn (bridge_speculation.py) runs under
+the same rules. It takes the place of the first request, so the deadline,
+the fallback and the reply cache apply to it. Retries and hedges send new
+requests; they never replay the same buffer again. Its start latency is not
+recorded, since the request was sent before the turn began.
+
+Metrics:
+    bridge_turns{outcome=ok|retried|hedged|fallback_cached|fallback_template|failed}
+    bridge_retries{reason}             retries sent
+    bridge_hedges{winner=primary|hedge} hedged turns and which request answered
+    bridge_reply_start_ms              time for a request's reply to start
+
+Hedging sends the turn twice. Only enable it (BRIDGE_HEDGE=1) for agents
+whose /process handler is safe to run twice for the same turn.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import random
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+import aiohttp
+import grpc
+
+from agent_metrics import metrics
+from bridge_speculation import normalize_transcript
+
+logger = logging.getLogger(__name__)
+
+# Time the agent has for its reply to start; 0 = no deadline
+BRIDGE_DEADLINE_MS = float(os.getenv("BRIDGE_DEADLINE_MS", "8000"))
+BRIDGE_RETRIES = int(os.getenv("BRIDGE_RETRIES", "2"))
+BRIDGE_RETRY_BACKOFF_MS = float(os.getenv("BRIDGE_RETRY_BACKOFF_MS", "100"))
+BRIDGE_HEDGE = os.getenv("BRIDGE_HEDGE", "0").lower() in ("1", "true", "yes")
+# Earliest a hedged request is sent, however fast recent replies were
+BRIDGE_HEDGE_MIN_MS = float(os.getenv("BRIDGE_HEDGE_MIN_MS", "300"))
+
+# Reply latencies needed before the p95 is trusted for hedging
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+HEDGE_PERCENTILE = 95
+# Transcripts whose last complete reply is kept for deadline fallbacks
+FALLBACK_CACHE_SIZE = 64
+FALLBACK_TEMPLATE = "Sorry, that's taking me longer than usual. Could you say that again?"
+
+# Statuses the agent (or a proxy in front of it) returns without running the turn
+RETRYABLE_STATUSES = frozenset({429, 502, 503})
+RETRYABLE_GRPC_CODES = frozenset({grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.RESOURCE_EXHAUSTED})
+
+ReplyEvent = Tuple[str, Any]
+# Starts one request for the turn, given the milliseconds left (None = no deadline)
+AttemptFactory = Callable[[Optional[float]], AsyncIterator[ReplyEvent]]
+
+
+def retry_reason(error: BaseException) -> Optional[str]:
+    """Why a failed request can be sent again, or None if it cannot"""
+    if isinstance(error, aiohttp.ClientConnectorError):
+        return "connect"
+    if isinstance(error, aiohttp.ClientResponseError) and error.status in RETRYABLE_STATUSES:
+        return str(error.status)
+    if isinstance(error, grpc.aio.AioRpcError) and error.code() in RETRYABLE_GRPC_CODES:
+        return error.code().name.lower()
+    return None
+
+
+def backoff_delay(retry: int, base_ms: float = BRIDGE_RETRY_BACKOFF_MS) -> float:
+    """Seconds to wait before the given retry (1-based): full jitter"""
+    return random.uniform(0.0, base_ms * (2 ** (retry - 1))) / 1000.0
+
+
+class LatencyTracker:
+    """Recent reply start latencies, for the hedging delay"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, ms: float) -> None:
+        self._samples.append(ms)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+        return ordered[rank]
+
+
+class ReplyCache:
+    """Last complete text reply per normalized transcript, least recent evicted"""
+
+    def __init__(self, size: int = FALLBACK_CACHE_SIZE):
+        self.size = size
+        self._replies: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, transcript: str) -> Optional[str]:
+        key = normalize_transcript(transcript)
+        text = self._replies.get(key)
+        if text is not None:
+            self._replies.move_to_end(key)
+        return text
+
+    def put(self, transcript: str, text: str) -> None:
+        key = normalize_transcript(transcript)
+        if not key or not text.strip():
+            return
+        self._replies[key] = text
+        self._replies.move_to_end(key)
+        while len(self._replies) > self.size:
+            self._replies.popitem(last=False)
+
+
+class ReplyPolicy:
+    """Runs one turn's requests under a deadline, with retries and hedging"""
+
+    def __init__(self, deadline_ms: float = BRIDGE_DEADLINE_MS, retries: int = BRIDGE_RETRIES,
+                 backoff_ms: float = BRIDGE_RETRY_BACKOFF_MS, hedge: bool = BRIDGE_HEDGE,
+                 hedge_min_ms: float = BRIDGE_HEDGE_MIN_MS):
+        self.deadline_ms = deadline_ms
+        self.retries = retries
+        self.backoff_ms = backoff_ms
+        self.hedge = hedge
+        self.hedge_min_ms = hedge_min_ms
+        self.latency = LatencyTracker()
+        self.cache = ReplyCache()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while hedging is off"""
+        if not self.hedge:
+            return None
+        p95 = self.latency.percentile(HEDGE_PERCENTILE)
+        if p95 is None:
+            return None
+        return max(p95, self.hedge_min_ms) / 1000.0
+
+    async def reply(self, transcript: str, attempt: AttemptFactory,
+                    primary: Optional[AsyncIterator[ReplyEvent]] = None) -> AsyncIterator[ReplyEvent]:
+        """
+        The reply events of the first request to start answering, or a fallback.
+
+        ``primary`` is a reply already under way (a claimed speculative
+        request); it is used instead of the first ``attempt``.
+        """
+        loop = asyncio.get_running_loop()
+        began = loop.time()
+        deadline = began + self.deadline_ms / 1000.0 if self.deadline_ms > 0 else math.inf
+        hedge_delay = self.hedge_delay()
+        hedge_at = began + hedge_delay if hedge_delay is not None else math.inf
+
+        # Pending first event of each running request -> (events, kind, started)
+        running: Dict[asyncio.Future, Tuple[AsyncIterator[ReplyEvent], str, float]] = {}
+        retries = 0
+        retry_at = math.inf
+        hedged = False
+        last_error: Optional[BaseException] = None
+        winner = None
+        first: Optional[ReplyEvent] = None
+
+        def launch(kind: str) -> None:
+            nonlocal primary
+            if primary is not None:
+                events, primary, kind = primary, None, "speculative"
+            else:
+                remaining = (deadline - loop.time()) * 1000.0 if deadline != math.inf else None
+                events = attempt(remaining)
+            running[asyncio.ensure_future(events.__anext__())] = (events, kind, loop.time())
+
+        try:
+            launch("primary")
+            while winner is None:
+                now = loop.time()
+                if now >= deadline:
+                    break
+                if now >= retry_at:
+                    retry_at = math.inf
+                    launch("retry")
+                if now >= hedge_at:
+                    hedge_at = math.inf
+                    if running:
+                        logger.info(f"No reply after {hedge_delay * 1000.0:.0f} ms; sending a hedged request")
+                        hedged = True
+                        launch("hedge")
+                if not running and retry_at == math.inf:
+                    metrics.inc("bridge_turns", outcome="failed")
+                    raise last_error
+
+                wake = min(deadline, retry_at, hedge_at)
+                timeout = None if wake == math.inf else max(0.0, wake - now)
+                if running:
+                    done, _ = await asyncio.wait(list(running), timeout=timeout,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    await asyncio.sleep(timeout)
+                    done = set()
+
+                for task in done:
+                    events, kind, started = running.pop(task)
+                    try:
+                        first = task.result()
+                    except StopAsyncIteration:
+                        first = None  # an empty reply still answers the turn
+                    except Exception as e:
+                        last_error = e
+                        reason = retry_reason(e)
+                        if reason and retries < self.retries:
+                            retries += 1
+                            retry_at = loop.time() + backoff_delay(retries, self.backoff_ms)
+                            metrics.inc("bridge_retries", reason=reason)
+                            logger.warning(f"Agent request failed ({e}); retry {retries} of {self.retries}")
+                        else:
+                            logger.error(f"Agent request failed: {e}")
+                        continue
+                    start_ms = (loop.time() - started) * 1000.0
+                    if kind != "speculative":
+                        self.latency.record(start_ms)
+                        metrics.observe("bridge_reply_start_ms", start_ms)
+                    winner = events, kind
+                    break
+        finally:
+            # Cancel the requests that lost the race or ran out of time
+            await self._abandon(running)
+
+        if winner is None:
+            async for event in self._fallback(transcript):
+                yield event
+            return
+
+        events, kind = winner
+        if hedged:
+            metrics.inc("bridge_hedges", winner="hedge" if kind == "hedge" else "primary")
+        outcome = {"primary": "ok", "speculative": "ok", "retry": "retried", "hedge": "hedged"}[kind]
+        metrics.inc("bridge_turns", outcome=outcome)
+
+        text = []
+        cacheable = True
+        try:
+            event = first
+            while event is not None:
+                event_kind, value = event
+                if event_kind == "delta":
+                    text.append(value)
+                else:
+                    cacheable = False  # a reply with actions is not replayed alone
+                yield event
+                event = await events.__anext__()
+        except StopAsyncIteration:
+            if cacheable:
+                self.cache.put(transcript, "".join(text))
+        finally:
+            await events.aclose()
+
+    async def _fallback(self, transcript: str) -> AsyncIterator[ReplyEvent]:
+        cached = self.cache.get(transcript)
+        metrics.inc("bridge_turns", outcome="fallback_cached" if cached else "fallback_template")
+        logger.warning(f"No agent reply within {self.deadline_ms:.0f} ms; "
+                       f"using a {'cached' if cached else 'templated'} reply")
+        yield "delta", cached or FALLBACK_TEMPLATE
+
+    @staticmethod
+    async def _abandon(running: Dict[asyncio.Future, Tuple[AsyncIterator[ReplyEvent], str, float]]) -> None:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        for events, _, _ in running.values():
+            await events.aclose()
+        running.clear()
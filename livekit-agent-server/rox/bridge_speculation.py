@@ -0,0 +1,192 @@
+"""
+Speculative agent requests on interim transcripts.
+
+The LLM node only runs once the turn detector has closed the user's turn,
+which is usually well after the last word was recognized. The speculator
+watches the session's transcription events instead. Once the text of the
+current turn (final segments so far plus the latest interim) has not
+changed for ``stable_ms``, it starts the external-agent request and buffers
+the reply. A final segment counts as stable right away.
+
+When the turn is committed, ``take`` compares the committed transcript with
+the speculated one after normalization (case, punctuation, whitespace). On a
+match the buffered reply, which may still be streaming, is used as is. On a
+mismatch the speculative request is cancelled and the bridge sends a fresh
+one.
+
+Metrics:
+    bridge_speculation{result=hit|miss|discarded}   discarded = text changed
+                                                     before the turn ended
+    bridge_speculation_saved_ms                      time the request had
+                                                     been running on a hit
+
+Speculation sends requests the user may not end up making. Only enable it
+(BRIDGE_SPECULATION_MS > 0) for agents whose /process handler is safe to run
+for a discarded guess.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+from agent_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# How long the turn text must stay unchanged before a request is sent; 0 = off
+BRIDGE_SPECULATION_MS = float(os.getenv("BRIDGE_SPECULATION_MS", "0"))
+
+ReplyEvent = Tuple[str, Any]
+ReplySource = Callable[[str], AsyncIterator[ReplyEvent]]
+
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+
+
+def normalize_transcript(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a transcript"""
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+
+class SpeculativeReply:
+    """A reply requested ahead of time; can be replayed while still streaming"""
+
+    def __init__(self, key: str, transcript: str, source: ReplySource):
+        self.key = key
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self._events: List[ReplyEvent] = []
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._run(source(transcript)))
+
+    async def _run(self, events: AsyncIterator[ReplyEvent]) -> None:
+        try:
+            async for event in events:
+                self._events.append(event)
+                self._changed.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._error = e
+        finally:
+            self.finished = time.perf_counter()
+            self._changed.set()
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+    @property
+    def failed(self) -> bool:
+        return self._error is not None
+
+    def saved_ms(self) -> float:
+        """How long the request had been running when it was claimed"""
+        end = self.finished if self.done else time.perf_counter()
+        return (end - self.started) * 1000.0
+
+    async def replay(self) -> AsyncIterator[ReplyEvent]:
+        """Buffered events first, then the rest as they arrive"""
+        index = 0
+        try:
+            while True:
+                while index < len(self._events):
+                    yield self._events[index]
+                    index += 1
+                if self.done:
+                    break
+                self._changed.clear()
+                if index == len(self._events) and not self.done:
+                    await self._changed.wait()
+        finally:
+            # The consumer stopped early (e.g. the turn was interrupted)
+            if not self.done:
+                self.cancel()
+        if self._error is not None:
+            raise self._error
+
+    def cancel(self) -> None:
+        self._task.cancel()
+
+
+class TranscriptSpeculator:
+    """Starts agent requests for stable transcripts, hands them to the next turn"""
+
+    def __init__(self, source: ReplySource, stable_ms: float = BRIDGE_SPECULATION_MS):
+        self._source = source
+        self.stable_ms = stable_ms
+        self._committed: List[str] = []  # final segments of the current turn
+        self._pending_key: Optional[str] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._reply: Optional[SpeculativeReply] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.stable_ms > 0
+
+    def observe(self, transcript: str, is_final: bool) -> None:
+        """Feed one transcription event of the user's current turn"""
+        if not self.enabled:
+            return
+        text = " ".join(self._committed + [transcript])
+        if is_final and transcript.strip():
+            self._committed.append(transcript)
+        key = normalize_transcript(text)
+        if not key:
+            return
+        if self._reply is not None and self._reply.key == key:
+            return
+        if self._pending_key == key and not is_final:
+            return  # unchanged; let the running timer fire
+
+        self._cancel_timer()
+        if self._reply is not None:
+            metrics.inc("bridge_speculation", result="discarded")
+            self._reply.cancel()
+            self._reply = None
+        self._pending_key = key
+        delay = 0.0 if is_final else self.stable_ms / 1000.0
+        self._timer = asyncio.get_running_loop().call_later(delay, self._start, key, text)
+
+    def _start(self, key: str, text: str) -> None:
+        self._timer = None
+        self._pending_key = None
+        logger.debug(f"Speculative request for stable transcript: '{text}'")
+        self._reply = SpeculativeReply(key, text, self._source)
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._pending_key = None
+
+    def take(self, transcript: str) -> Optional[SpeculativeReply]:
+        """
+        Claim the speculative reply for the committed user turn.
+
+        Returns it if it was made for the same (normalized) transcript;
+        otherwise cancels it and returns None.
+        """
+        self._cancel_timer()
+        self._committed = []
+        reply, self._reply = self._reply, None
+        if reply is None:
+            return None
+        if reply.key == normalize_transcript(transcript) and not reply.failed:
+            metrics.inc("bridge_speculation", result="hit")
+            metrics.observe("bridge_speculation_saved_ms", reply.saved_ms())
+            return reply
+        metrics.inc("bridge_speculation", result="miss")
+        reply.cancel()
+        return None
+
+    def cancel(self) -> None:
+        """Drop any pending or running speculation"""
+        self._cancel_timer()
+        self._committed = []
+        if self._reply is not None:
+            self._reply.cancel()
+            self._reply = None
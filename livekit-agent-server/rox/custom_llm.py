@@ -1,32 +1,221 @@
 # custom_llm.py (create this new file or add the class to your main.py)
 
+import asyncio
 import os
 import json
 import logging
+import time
 import aiohttp # Required for async HTTP requests: pip install aiohttp
-from typing import AsyncIterable, Optional
+import grpc
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional, Set, Tuple
 from contextlib import asynccontextmanager
+from urllib.parse import urljoin
 
 from livekit.agents.llm import LLM, ChatContext, ChatMessage, ChatRole, ChatChunk, ChoiceDelta
 import uuid
 
+from agent_metrics import metrics
+from bridge_actions import DomActionPublisher
+from bridge_chat_context import chat_context
+from bridge_grpc import GrpcTransport, is_grpc_url
+from bridge_history import ConversationHistory
+from bridge_resilience import BRIDGE_DEADLINE_MS, BRIDGE_HEDGE, ReplyPolicy
+from bridge_speculation import BRIDGE_SPECULATION_MS, TranscriptSpeculator
+from report_store_reader import room_report_context
+
 logger = logging.getLogger(__name__)
 
 # Get the URL of your custom backend agent from environment variables
 # Example: export MY_CUSTOM_AGENT_URL="http://localhost:5005/process"
 MY_CUSTOM_AGENT_URL = os.getenv("MY_CUSTOM_AGENT_URL", "http://localhost:5005/process") # Default URL
 
+# Content type of streamed agent replies: one JSON event per line
+STREAM_MIMETYPE = "application/x-ndjson"
+
+# Header carrying the per-turn ID the agent can be asked to cancel
+REQUEST_ID_HEADER = "X-Request-ID"
+BRIDGE_CANCEL_TIMEOUT = 2.0  # seconds
+# Header carrying the milliseconds left until the turn's deadline
+TIMEOUT_HEADER = "X-Request-Timeout-Ms"
+
+# Keep-alive pool towards the external agent, shared by all turns of a session
+BRIDGE_MAX_CONNECTIONS = int(os.getenv("BRIDGE_MAX_CONNECTIONS", "8"))
+BRIDGE_KEEPALIVE_TIMEOUT = 60.0  # seconds an idle connection is kept open
+
+
+def _connection_trace_config() -> aiohttp.TraceConfig:
+    """Count new vs. reused pooled connections"""
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_connection_create_end(session, context, params):
+        metrics.inc("bridge_connections", result="new")
+
+    async def on_connection_reuseconn(session, context, params):
+        metrics.inc("bridge_connections", result="reused")
+
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace_config
+
 class CustomLLMBridge(LLM):
     """
     A custom LLM component that bridges to an external backend script/service.
     """
-    def __init__(self, url: str = MY_CUSTOM_AGENT_URL):
+    def __init__(self, url: str = MY_CUSTOM_AGENT_URL, speculation_ms: float = BRIDGE_SPECULATION_MS,
+                 deadline_ms: float = BRIDGE_DEADLINE_MS, hedge: bool = BRIDGE_HEDGE, room=None):
         super().__init__()
         if not url:
             raise ValueError("External agent URL cannot be empty. Set MY_CUSTOM_AGENT_URL environment variable.")
         self._url = url
+        self._session: Optional[aiohttp.ClientSession] = None
+        # unix:///path.sock selects the gRPC transport to a co-located agent (bridge_grpc.py)
+        self._grpc = GrpcTransport(url) if is_grpc_url(url) else None
+        # Agents accept cancellations next to /process (see rox/agent_cancellation.py)
+        self._cancel_url = urljoin(url, "cancel")
+        self._cancel_tasks: Set[asyncio.Future] = set()
+        # Earlier turns of this session, sent along within a token budget
+        self._history = ConversationHistory()
+        # Sends the request early once the interim transcript is stable (off if 0)
+        self._speculator = TranscriptSpeculator(self._agent_reply, speculation_ms)
+        # Deadline, retries and hedging of each turn's request
+        self._policy = ReplyPolicy(deadline_ms=deadline_ms, hedge=hedge)
+        # DOM actions go to the room's data channel as soon as they arrive
+        self._actions = DomActionPublisher(room)
+        # Identifies the student's stored report to agents that read it
+        self._room = room
         logger.info(f"CustomLLMBridge initialized. Will send requests to: {self._url}")
 
+    def _get_session(self) -> aiohttp.ClientSession:
+        """The bridge's long-lived HTTP session, created on the first turn"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=BRIDGE_MAX_CONNECTIONS,
+                keepalive_timeout=BRIDGE_KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                trace_configs=[_connection_trace_config()],
+            )
+        return self._session
+
+    def on_user_input_transcribed(self, event) -> None:
+        """
+        Feed the session's "user_input_transcribed" events to the speculator:
+        session.on("user_input_transcribed", llm_bridge.on_user_input_transcribed)
+        """
+        self._speculator.observe(event.transcript, event.is_final)
+
+    async def aclose(self) -> None:
+        """Close the pooled connections; hook this to the agent session shutdown"""
+        self._speculator.cancel()
+        await self._actions.aclose()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._grpc is not None:
+            await self._grpc.aclose()
+        logger.info(f"CustomLLMBridge closed. Metrics: {json.dumps(metrics.snapshot())}")
+
+    async def _agent_reply(self, transcript: str, context: Optional[Dict[str, Any]] = None,
+                           timeout_ms: Optional[float] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Send the transcript, with the conversation ``context`` (history window
+        and summary, by default the current one) and the student's report
+        ids from the room, to the external agent and yield its reply as
+        ("delta", text) and ("dom_actions", list) events.
+        ``timeout_ms`` tells the agent how long the bridge will wait.
+
+        Agents that support it stream NDJSON lines (see rox/agent_streaming.py);
+        a plain JSON reply is turned into a single delta. Over the gRPC
+        transport the reply is always streamed.
+        """
+        if context is None:
+            context = self._history.payload()
+        payload = {"transcript": transcript, **room_report_context(self._room), **context} # Send transcript as JSON
+        request_id = uuid.uuid4().hex
+        started = False
+        try:
+            if self._grpc is not None:
+                metrics.inc("bridge_replies", mode="grpc")
+                events = self._grpc.reply(payload, request_id, timeout_ms)
+                try:
+                    async for event in events:
+                        started = True
+                        yield event
+                finally:
+                    await events.aclose()  # cancels the RPC if the turn was dropped
+                return
+
+            # Reuse the bridge's pooled session; no TCP/TLS setup per turn
+            session = self._get_session()
+            headers = {"Accept": f"{STREAM_MIMETYPE}, application/json", REQUEST_ID_HEADER: request_id}
+            if timeout_ms is not None:
+                headers[TIMEOUT_HEADER] = str(max(1, int(timeout_ms)))
+            async with session.post(self._url, json=payload, headers=headers) as response:
+                started = True
+                response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+                if response.content_type == STREAM_MIMETYPE:
+                    metrics.inc("bridge_replies", mode="stream")
+                    async for line in response.content:
+                        if not line.strip():
+                            continue
+                        event = json.loads(line)
+                        event_type = event.get("type")
+                        if event_type == "delta" and event.get("text"):
+                            yield "delta", event["text"]
+                        elif event_type == "dom_actions" and event.get("dom_actions"):
+                            yield "dom_actions", event["dom_actions"]
+                        elif event_type == "done" and event.get("result"):
+                            # Read on to the end of the body so the connection can be reused
+                            logger.debug(f"Reply result fields from external agent: {event['result']}")
+                    return
+
+                metrics.inc("bridge_replies", mode="json")
+                result = await response.json() # Expecting JSON back, e.g., {"response": "..."}
+                response_text = result.get("response", "") # Extract the response text
+                logger.info(f"Received response from external agent: '{response_text}'")
+            
+                # Check for special actions from the agent
+                if "action" in result and "payload" in result:
+                    logger.info(f"Received special action from agent: {result['action']} with payload: {result['payload']}")
+                    # Convert the action and payload to the dom_actions format
+                    yield "dom_actions", [{
+                        "action": result["action"],
+                        "payload": result["payload"]
+                    }]
+                # Check if the response contains DOM actions (for backward compatibility)
+                elif result.get("dom_actions"):
+                    yield "dom_actions", result["dom_actions"]
+                if response_text:
+                    yield "delta", response_text
+        except (asyncio.CancelledError, GeneratorExit):
+            # The turn was interrupted: leaving the block dropped the connection
+            # (or cancelled the RPC); over HTTP also tell the agent so it stops
+            # generating right away
+            metrics.inc("bridge_cancelled", stage="streaming" if started else "waiting")
+            if self._grpc is None:
+                self._cancel_remote(request_id)
+            raise
+
+    def _cancel_remote(self, request_id: str) -> None:
+        """Post the abandoned request's ID to the agent's /cancel, without waiting"""
+        session = self._session
+        if session is None or session.closed:
+            return
+        task = asyncio.ensure_future(self._post_cancel(session, request_id))
+        self._cancel_tasks.add(task)
+        task.add_done_callback(self._cancel_tasks.discard)
+
+    async def _post_cancel(self, session: aiohttp.ClientSession, request_id: str) -> None:
+        try:
+            timeout = aiohttp.ClientTimeout(total=BRIDGE_CANCEL_TIMEOUT)
+            async with session.post(self._cancel_url, json={"request_id": request_id}, timeout=timeout) as response:
+                cancelled = response.status == 200 and (await response.json()).get("cancelled")
+            metrics.inc("bridge_cancel_requests", delivered="true" if cancelled else "false")
+        except Exception as e:
+            metrics.inc("bridge_cancel_requests", delivered="error")
+            logger.debug(f"Could not cancel request {request_id} at {self._cancel_url}: {e}")
+
     def chat(self, *, chat_ctx: ChatContext = None, tools = None, tool_choice = None):
         """
         Receives the chat history, sends the latest user message to the external
@@ -55,173 +244,129 @@ class CustomLLMBridge(LLM):
                     yield ChatChunk(id=str(uuid.uuid4()), delta=ChoiceDelta(role='assistant', content=""))
                     return
                 
-                # Debug the chat context structure - more safely this time
-                logger.debug(f"CustomLLMBridge received chat context of type: {type(chat_ctx)}")
-                
-                # Get messages - try different approaches based on the API
+                # Latest user message, read through accessors resolved once per SDK class
                 try:
-                    # First attempt: try to access _items directly if it exists
-                    if hasattr(chat_ctx, '_items'):
-                        messages = getattr(chat_ctx, '_items')
-                        logger.debug(f"Got messages from chat_ctx._items: {len(messages)}")
-                    # Second attempt: try to use items() as a method
-                    elif hasattr(chat_ctx, 'items') and callable(getattr(chat_ctx, 'items')):
-                        messages = list(chat_ctx.items())
-                        logger.debug(f"Got {len(messages)} messages from chat_ctx.items()")
-                    # Third attempt: try to iterate through the object
-                    elif hasattr(chat_ctx, '__iter__'):
-                        messages = list(chat_ctx)
-                        logger.debug(f"Got {len(messages)} messages by iterating chat_ctx")
-                    # Last fallback: try using to_dict() if available
-                    elif hasattr(chat_ctx, 'to_dict') and callable(getattr(chat_ctx, 'to_dict')):
-                        dict_data = chat_ctx.to_dict()
-                        if 'messages' in dict_data:
-                            messages = dict_data['messages']
-                            logger.debug(f"Got {len(messages)} messages from chat_ctx.to_dict()['messages']")
-                        else:
-                            messages = []
-                            logger.debug("chat_ctx.to_dict() doesn't contain 'messages' key")
-                    else:
-                        messages = []
-                        logger.debug("Couldn't find a way to access messages from chat_ctx")
+                    messages = chat_context.items(chat_ctx)
                 except Exception as e:
                     logger.error(f"Error accessing messages from chat_ctx: {e}")
                     messages = []
-                    logger.debug("Using empty messages list due to error")
                 
                 if not messages:
                     logger.warning("Empty chat history or couldn't access messages")
                     yield ChatChunk(id=str(uuid.uuid4()), delta=ChoiceDelta(role='assistant', content="I didn't receive any message to process."))
                     return
 
-                # Extract the latest user message (transcript)
-                # Be more resilient when checking for user messages
-                user_messages = []
-                # Log the message structure to help debug
-                if messages and len(messages) > 0:
-                    logger.debug(f"First message type: {type(messages[0])}")
-                    logger.debug(f"First message attributes: {dir(messages[0]) if hasattr(messages[0], '__dir__') else 'No dir attributes'}")
-                
-                for msg in reversed(messages):
-                    try:
-                        # More detailed logging of the message
-                        logger.debug(f"Processing message: {msg}")
-                        
-                        # Check if this is a user message using multiple approaches
-                        is_user_message = False
-                        
-                        # Try the direct role attribute
-                        if hasattr(msg, 'role'):
-                            role_value = getattr(msg, 'role')
-                            logger.debug(f"Message has role attribute: {role_value}, type: {type(role_value)}")
-                            if str(role_value).lower() == 'user':
-                                is_user_message = True
-                        
-                        # Try accessing it as a dict
-                        elif isinstance(msg, dict) and 'role' in msg:
-                            logger.debug(f"Message has role key: {msg['role']}")
-                            if str(msg['role']).lower() == 'user':
-                                is_user_message = True
-                        
-                        if is_user_message:
-                            logger.debug(f"Found a user message: {msg}")
-                            user_messages.append(msg)
-                    except Exception as e:
-                        logger.error(f"Error checking message type: {e}")
-                
-                user_message = user_messages[0] if user_messages else None
+                user_message = chat_context.latest_user_message(messages)
+                transcript = chat_context.text(user_message) if user_message is not None else ""
+
+                # An interrupted reply is kept in the context only as far as it was played
+                played = chat_context.previous_reply(messages)
+                if played is not None and self._history.replace_reply(chat_context.text(played)):
+                    logger.debug("Recorded only the played part of the interrupted reply")
 
-                if not user_message or not user_message.content:
+                if not transcript:
                     logger.warning("No user message found in history to send to external agent.")
                     # You might want to yield an empty response or a default message
                     yield ChatChunk(id=str(uuid.uuid4()), delta=ChoiceDelta(role='assistant', content=""))
                     return
 
-                # Get the transcript content, handling different object structures
-                transcript = ""
-                try:
-                    if hasattr(user_message, 'content'):
-                        content = getattr(user_message, 'content')
-                        # Handle both string and list content formats
-                        if isinstance(content, list):
-                            transcript = ' '.join(content)
-                        else:
-                            transcript = str(content)
-                    elif isinstance(user_message, dict) and 'content' in user_message:
-                        content = user_message['content']
-                        if isinstance(content, list):
-                            transcript = ' '.join(content)
-                        else:
-                            transcript = str(content)
-                    else:
-                        # Last resort - try to convert the whole message to a string
-                        transcript = str(user_message)
-                except Exception as e:
-                    logger.error(f"Error extracting content from user message: {e}")
-                    transcript = "[Error: Could not extract transcript]"
-                
                 logger.info(f"Sending transcript to external agent at {self._url}: '{transcript}'")
-                # Add more verbosity to help debug
-                logger.debug(f"User message object: {user_message}")
-                logger.debug(f"User message type: {type(user_message)}")
+                # Dumping the message is only worth its cost when debugging
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"User message ({type(user_message).__name__}) of {len(messages)} items: {user_message}")
 
-                response_text = ""
                 dom_actions = None
+                actions_published_at = None
+                spoken = False
+                spoken_text = []
+                # Correlates the chunks of this turn with its data-channel DOM actions
+                turn_id = uuid.uuid4().hex
                 
+                request_start = time.perf_counter()
+                reply = None
+                speculative = None
                 try:
-                    # Use aiohttp for async HTTP requests
-                    async with aiohttp.ClientSession() as session:
-                        payload = {"transcript": transcript} # Send transcript as JSON
-                        async with session.post(self._url, json=payload) as response:
-                            response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-                            result = await response.json() # Expecting JSON back, e.g., {"response": "..."}
-                            response_text = result.get("response", "") # Extract the response text
-                            
-                            # Check for special actions from the agent
-                            if "action" in result and "payload" in result:
-                                action = result["action"]
-                                payload = result["payload"]
-                                logger.info(f"Received special action from agent: {action} with payload: {payload}")
-                                
-                                # Convert the action and payload to a format that can be sent as metadata
-                                dom_actions = [{
-                                    "action": action,
-                                    "payload": payload
-                                }]
-                                logger.info(f"Converted to dom_actions format: {dom_actions}")
-                            # Check if the response contains DOM actions (for backward compatibility)
-                            elif "dom_actions" in result:
-                                dom_actions = result["dom_actions"]
-                                logger.info(f"Received DOM actions from external agent: {dom_actions}")
-                            
-                            logger.info(f"Received response from external agent: '{response_text}'")
-
-                except aiohttp.ClientError as e:
+                    # Use the reply requested while the user was still speaking, if
+                    # it was for this transcript; it gets the same deadline and
+                    # fallback, and retries or hedges send new requests
+                    speculative = self._speculator.take(transcript)
+                    context = self._history.payload()
+                    reply = self._policy.reply(
+                        transcript, lambda timeout_ms: self._agent_reply(transcript, context, timeout_ms),
+                        primary=speculative.replay() if speculative else None
+                    )
+                    # One ChatChunk per text delta, so TTS starts on the first one
+                    async for kind, value in reply:
+                        if kind == "dom_actions":
+                            dom_actions = value
+                            logger.info(f"Received DOM actions from external agent: {dom_actions}")
+                            # Let the UI react now instead of after the reply text
+                            if self._actions.publish(turn_id, dom_actions):
+                                actions_published_at = time.perf_counter()
+                            continue
+                        if not spoken:
+                            metrics.observe("bridge_first_token_ms", (time.perf_counter() - request_start) * 1000.0)
+                            spoken = True
+                        spoken_text.append(value)
+                        yield ChatChunk(id=turn_id, delta=ChoiceDelta(role='assistant', content=value))
+                    metrics.observe("bridge_request_ms", (time.perf_counter() - request_start) * 1000.0)
+                    if actions_published_at is not None:
+                        metrics.observe("bridge_dom_actions_lead_ms", (time.perf_counter() - actions_published_at) * 1000.0)
+                    metrics.inc("bridge_requests", status="ok")
+                    error_text = None
+
+                except (asyncio.CancelledError, GeneratorExit):
+                    # Barge-in: the pipeline dropped this turn
+                    metrics.inc("bridge_requests", status="cancelled")
+                    raise
+                except (aiohttp.ClientError, grpc.aio.AioRpcError) as e:
+                    metrics.inc("bridge_requests", status="error")
                     logger.error(f"Error communicating with external agent at {self._url}: {e}")
-                    response_text = "Sorry, I encountered an error trying to process your request." # Error message
+                    error_text = "Sorry, I encountered an error trying to process your request." # Error message
                 except Exception as e:
+                    metrics.inc("bridge_requests", status="error")
                     logger.error(f"An unexpected error occurred in CustomLLMBridge: {e}")
-                    response_text = "Sorry, an unexpected error occurred." # Generic error message
+                    error_text = "Sorry, an unexpected error occurred." # Generic error message
+                finally:
+                    # Closing the reply aborts its HTTP request if it is still running
+                    if reply is not None:
+                        await reply.aclose()
+                    # A speculative request that lost to a hedge or the deadline
+                    if speculative is not None:
+                        speculative.cancel()
+                    # Record the turn, with as much of the reply as was passed on;
+                    # cut to what was played on the next turn if it was interrupted
+                    self._history.add("user", transcript)
+                    self._history.add("assistant", "".join(spoken_text))
 
-                # Prepare metadata if dom_actions are present
+                # Only apologize if nothing has been spoken yet; a broken stream just ends early
+                response_text = error_text if error_text and not spoken else ""
+
+                # Without a room to publish to, fall back to metadata on the last chunk
                 current_metadata = None
-                if dom_actions:
+                if dom_actions and actions_published_at is None:
                     current_metadata = {"dom_actions": json.dumps(dom_actions)}
                 
-                # Yield the response back to the LiveKit pipeline as a single chunk,
-                # including dom_actions in metadata if they exist.
-                yield ChatChunk(
-                    id=str(uuid.uuid4()),
-                    delta=ChoiceDelta(
-                        role='assistant',
-                        content=response_text,
-                        metadata=current_metadata # dom_actions are now here
-                    )
-                )            
+                # Close the reply with a final chunk carrying the error text and
+                # the dom_actions in metadata if they exist.
+                if response_text or current_metadata or not spoken:
+                    yield ChatChunk(
+                        id=turn_id,
+                        delta=ChoiceDelta(
+                            role='assistant',
+                            content=response_text,
+                            metadata=current_metadata # dom_actions are now here
+                        )
+                    )            
                 logger.debug("Finished yielding response from CustomLLMBridge.")
             
-            # Yield the async generator
-            yield response_generator()
+            # Yield the async generator; close it when the pipeline is done with
+            # the turn, which also happens when the user interrupts it
+            generator = response_generator()
+            try:
+                yield generator
+            finally:
+                await generator.aclose()
         except Exception as e:
             logger.error(f"Error in _chat_context_manager: {e}")
             raise
\ No newline at end of file
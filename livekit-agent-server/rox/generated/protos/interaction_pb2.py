@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11interaction.proto\x12\x0frox.interaction\"\x07\n\x05\x45mpty\"D\n\x1a\x46rontendButtonClickRequest\x12\x11\n\tbutton_id\x18\x01 \x01(\t\x12\x13\n\x0b\x63ustom_data\x18\x02 \x01(\t\"=\n\rAgentResponse\x12\x16\n\x0estatus_message\x18\x01 \x01(\t\x12\x14\n\x0c\x64\x61ta_payload\x18\x02 \x01(\t2w\n\x10\x41gentInteraction\x12\x63\n\x14HandleFrontendButton\x12+.rox.interaction.FrontendButtonClickRequest\x1a\x1e.rox.interaction.AgentResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11interaction.proto\x12\x0frox.interaction\"\x07\n\x05\x45mpty\"D\n\x1a\x46rontendButtonClickRequest\x12\x11\n\tbutton_id\x18\x01 \x01(\t\x12\x13\n\x0b\x63ustom_data\x18\x02 \x01(\t\"=\n\rAgentResponse\x12\x16\n\x0estatus_message\x18\x01 \x01(\t\x12\x14\n\x0c\x64\x61ta_payload\x18\x02 \x01(\t\",\n\x0bHistoryTurn\x12\x0c\n\x04role\x18\x01 \x01(\t\x12\x0f\n\x07\x63ontent\x18\x02 \x01(\t\"\xb3\x01\n\x11TranscriptRequest\x12\x12\n\ntranscript\x18\x01 \x01(\t\x12\x12\n\nrequest_id\x18\x02 \x01(\t\x12\x12\n\ntimeout_ms\x18\x03 \x01(\r\x12-\n\x07history\x18\x04 \x03(\x0b\x32\x1c.rox.interaction.HistoryTurn\x12\x0f\n\x07summary\x18\x05 \x01(\t\x12\x11\n\treport_id\x18\x06 \x01(\t\x12\x0f\n\x07user_id\x18\x07 \x01(\t\"M\n\nReplyEvent\x12\x0f\n\x05\x64\x65lta\x18\x01 \x01(\tH\x00\x12\x15\n\x0b\x64om_actions\x18\x02 \x01(\tH\x00\x12\x0e\n\x04\x64one\x18\x03 \x01(\tH\x00\x42\x07\n\x05\x65vent2w\n\x10\x41gentInteraction\x12\x63\n\x14HandleFrontendButton\x12+.rox.interaction.FrontendButtonClickRequest\x1a\x1e.rox.interaction.AgentResponse2j\n\x10\x41gentTranscripts\x12V\n\x11ProcessTranscript\x12\".rox.interaction.TranscriptRequest\x1a\x1b.rox.interaction.ReplyEvent0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -37,6 +37,14 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_FRONTENDBUTTONCLICKREQUEST']._serialized_end=115
   _globals['_AGENTRESPONSE']._serialized_start=117
   _globals['_AGENTRESPONSE']._serialized_end=178
-  _globals['_AGENTINTERACTION']._serialized_start=180
-  _globals['_AGENTINTERACTION']._serialized_end=299
+  _globals['_HISTORYTURN']._serialized_start=180
+  _globals['_HISTORYTURN']._serialized_end=224
+  _globals['_TRANSCRIPTREQUEST']._serialized_start=227
+  _globals['_TRANSCRIPTREQUEST']._serialized_end=406
+  _globals['_REPLYEVENT']._serialized_start=408
+  _globals['_REPLYEVENT']._serialized_end=485
+  _globals['_AGENTINTERACTION']._serialized_start=487
+  _globals['_AGENTINTERACTION']._serialized_end=606
+  _globals['_AGENTTRANSCRIPTS']._serialized_start=608
+  _globals['_AGENTTRANSCRIPTS']._serialized_end=714
 # @@protoc_insertion_point(module_scope)
@@ -1,6 +1,7 @@
+from google.protobuf.internal import containers as _containers
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
-from typing import ClassVar as _ClassVar, Optional as _Optional
+from typing import ClassVar as _ClassVar, Iterable as _Iterable, Mapping as _Mapping, Optional as _Optional, Union as _Union
 
 DESCRIPTOR: _descriptor.FileDescriptor
 
@@ -23,3 +24,39 @@ class AgentResponse(_message.Message):
     status_message: str
     data_payload: str
     def __init__(self, status_message: _Optional[str] = ..., data_payload: _Optional[str] = ...) -> None: ...
+
+class HistoryTurn(_message.Message):
+    __slots__ = ("role", "content")
+    ROLE_FIELD_NUMBER: _ClassVar[int]
+    CONTENT_FIELD_NUMBER: _ClassVar[int]
+    role: str
+    content: str
+    def __init__(self, role: _Optional[str] = ..., content: _Optional[str] = ...) -> None: ...
+
+class TranscriptRequest(_message.Message):
+    __slots__ = ("transcript", "request_id", "timeout_ms", "history", "summary", "report_id", "user_id")
+    TRANSCRIPT_FIELD_NUMBER: _ClassVar[int]
+    REQUEST_ID_FIELD_NUMBER: _ClassVar[int]
+    TIMEOUT_MS_FIELD_NUMBER: _ClassVar[int]
+    HISTORY_FIELD_NUMBER: _ClassVar[int]
+    SUMMARY_FIELD_NUMBER: _ClassVar[int]
+    REPORT_ID_FIELD_NUMBER: _ClassVar[int]
+    USER_ID_FIELD_NUMBER: _ClassVar[int]
+    transcript: str
+    request_id: str
+    timeout_ms: int
+    history: _containers.RepeatedCompositeFieldContainer[HistoryTurn]
+    summary: str
+    report_id: str
+    user_id: str
+    def __init__(self, transcript: _Optional[str] = ..., request_id: _Optional[str] = ..., timeout_ms: _Optional[int] = ..., history: _Optional[_Iterable[_Union[HistoryTurn, _Mapping]]] = ..., summary: _Optional[str] = ..., report_id: _Optional[str] = ..., user_id: _Optional[str] = ...) -> None: ...
+
+class ReplyEvent(_message.Message):
+    __slots__ = ("delta", "dom_actions", "done")
+    DELTA_FIELD_NUMBER: _ClassVar[int]
+    DOM_ACTIONS_FIELD_NUMBER: _ClassVar[int]
+    DONE_FIELD_NUMBER: _ClassVar[int]
+    delta: str
+    dom_actions: str
+    done: str
+    def __init__(self, delta: _Optional[str] = ..., dom_actions: _Optional[str] = ..., done: _Optional[str] = ...) -> None: ...
@@ -98,3 +98,78 @@ class AgentInteraction(object):
             timeout,
             metadata,
             _registered_method=True)
+
+
+class AgentTranscriptsStub(object):
+    """Service the agents implement (called by the LLM bridge over a Unix socket)
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.ProcessTranscript = channel.unary_stream(
+                '/rox.interaction.AgentTranscripts/ProcessTranscript',
+                request_serializer=interaction__pb2.TranscriptRequest.SerializeToString,
+                response_deserializer=interaction__pb2.ReplyEvent.FromString,
+                _registered_method=True)
+
+
+class AgentTranscriptsServicer(object):
+    """Service the agents implement (called by the LLM bridge over a Unix socket)
+    """
+
+    def ProcessTranscript(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_AgentTranscriptsServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'ProcessTranscript': grpc.unary_stream_rpc_method_handler(
+                    servicer.ProcessTranscript,
+                    request_deserializer=interaction__pb2.TranscriptRequest.FromString,
+                    response_serializer=interaction__pb2.ReplyEvent.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'rox.interaction.AgentTranscripts', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('rox.interaction.AgentTranscripts', rpc_method_handlers)
+
+
+ # This class is part of an EXPERIMENTAL API.
+class AgentTranscripts(object):
+    """Service the agents implement (called by the LLM bridge over a Unix socket)
+    """
+
+    @staticmethod
+    def ProcessTranscript(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/rox.interaction.AgentTranscripts/ProcessTranscript',
+            interaction__pb2.TranscriptRequest.SerializeToString,
+            interaction__pb2.ReplyEvent.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,248 @@
+"""
+Local intent routing for fixed voice commands.
+
+Many utterances sent to the agents are fixed commands ("next", "explain
+this", "how many highlights"). The router answers those in-process,
+without an OpenAI function-calling round. Each persona compiles its
+command phrases into a token trie. Routing normalizes the utterance
+(lowercase, no punctuation, filler words dropped) and walks the trie from
+every token position. A token matches a trie edge exactly or fuzzily, by
+edit-distance similarity to the phrase vocabulary (computed once per
+distinct token and cached), so "explian this" or "give me a sumary" still
+route.
+
+A match's confidence is its mean token similarity, scaled down by the part
+of the utterance the phrase does not cover:
+
+    coverage = matched / (matched + uncovered)
+    confidence = similarity * (COVERAGE_FLOOR + (1 - COVERAGE_FLOOR) * coverage)
+
+Uncovered request words ("can you", "I want to") count REQUEST_WORD_WEIGHT
+of a token, any other uncovered word a whole one. Below the persona's
+threshold the utterance is left to the LLM, e.g. "what's next on my reading
+list". Utterances with a negation ("I don't want to continue") are always
+left to the LLM. Intents with side effects (moving to the next highlight,
+clicking a button) also need SIDE_EFFECT_COVERAGE of the words other than
+request words, so "start my session tomorrow" does not start it now.
+
+Metrics:
+    intent_routed{persona,intent}   utterances handled locally
+    intent_fallback{persona}        utterances left to the LLM
+    intent_route_ms{persona}        routing time
+
+Usage:
+    router = IntentRouter("speaking_report", {"next_highlight": NEXT_COMMANDS},
+                          side_effects={"next_highlight"})
+    match = router.route(transcript)
+    if match:
+        handlers[match.intent]()
+"""
+
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from agent_metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INTENT_ROUTER_THRESHOLD = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.75"))
+# Weight a match keeps even when it covers little of the utterance
+COVERAGE_FLOOR = 0.6
+# Tokens shorter than this only match exactly
+FUZZY_MIN_LENGTH = 4
+# Lowest similarity at which a token can match a different trie edge
+TOKEN_SIMILARITY_MIN = 0.7
+# Share of a token an uncovered request word counts for
+REQUEST_WORD_WEIGHT = 0.25
+# Share of the non-request words a side-effect intent's phrase must cover
+SIDE_EFFECT_COVERAGE = 0.9
+# Distinct utterance tokens whose fuzzy neighbours are remembered
+NEIGHBOUR_CACHE_SIZE = 4096
+
+# Politeness and hesitation words that never decide an intent
+FILLER_WORDS = frozenset({
+    "please", "um", "uh", "hmm", "ok", "okay", "so", "just", "hey", "well", "the", "a", "an",
+})
+
+# Words that frame a request; they are kept, but cost little when a phrase
+# does not cover them
+REQUEST_WORDS = frozenset({
+    "can", "could", "would", "will", "you", "i", "i'd", "want", "like", "to", "me", "we",
+    "let", "lets", "let's", "now",
+})
+
+# Words that turn a command around; STT may drop the apostrophe
+NEGATION_WORDS = frozenset({
+    "not", "no", "never", "dont", "cant", "cannot", "wont", "didnt", "doesnt", "isnt",
+    "wouldnt", "shouldnt",
+})
+
+_NON_WORD = re.compile(r"[^\w\s']+")
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Lowercased words of an utterance without punctuation or filler words"""
+    return [token for token in _NON_WORD.sub(" ", text.lower()).split()
+            if token not in FILLER_WORDS]
+
+
+def is_negation(token: str) -> bool:
+    return token in NEGATION_WORDS or token.endswith("n't")
+
+
+def token_similarity(a: str, b: str) -> float:
+    """1 - normalized Levenshtein distance; 0 for short tokens that differ"""
+    if a == b:
+        return 1.0
+    if min(len(a), len(b)) < FUZZY_MIN_LENGTH:
+        return 0.0
+    longest = max(len(a), len(b))
+    max_distance = int(longest * (1.0 - TOKEN_SIMILARITY_MIN))
+    if abs(len(a) - len(b)) > max_distance:
+        return 0.0
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return 0.0
+        previous = current
+    return 1.0 - previous[-1] / longest
+
+
+@dataclass
+class IntentMatch:
+    intent: str
+    confidence: float
+    phrase: str
+
+
+class _TrieNode:
+    __slots__ = ("children", "intent", "phrase")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.intent: Optional[str] = None
+        self.phrase: Optional[str] = None
+
+
+class IntentRouter:
+    """Compiled command phrases of one persona"""
+
+    def __init__(self, persona: str, intents: Dict[str, Sequence[str]],
+                 threshold: float = INTENT_ROUTER_THRESHOLD, side_effects: Iterable[str] = ()):
+        self.persona = persona
+        self.threshold = threshold
+        self.intents = list(intents)
+        self.side_effects = frozenset(side_effects)
+        self._root = _TrieNode()
+        self._vocabulary: Set[str] = set()
+        for intent, phrases in intents.items():
+            for phrase in phrases:
+                self._add(intent, phrase)
+        # Fuzzy neighbours of utterance tokens in the phrase vocabulary
+        self._neighbours: Dict[str, Tuple[Tuple[str, float], ...]] = {}
+
+    def _add(self, intent: str, phrase: str) -> None:
+        tokens = normalize_tokens(phrase)
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.children.setdefault(token, _TrieNode())
+            self._vocabulary.add(token)
+        # The first intent listing a phrase keeps it
+        if node.intent is None:
+            node.intent, node.phrase = intent, phrase
+
+    def _similar(self, token: str) -> Tuple[Tuple[str, float], ...]:
+        """Vocabulary words the token can stand for, with their similarity"""
+        neighbours = self._neighbours.get(token)
+        if neighbours is None:
+            if token in self._vocabulary:
+                neighbours = ((token, 1.0),)
+            else:
+                neighbours = tuple((label, similarity) for label in self._vocabulary
+                                   for similarity in (token_similarity(token, label),)
+                                   if similarity >= TOKEN_SIMILARITY_MIN)
+            if len(self._neighbours) >= NEIGHBOUR_CACHE_SIZE:
+                self._neighbours.clear()
+            self._neighbours[token] = neighbours
+        return neighbours
+
+    @staticmethod
+    def _edges(node: _TrieNode, similar: Tuple[Tuple[str, float], ...]) -> List[Tuple[float, _TrieNode]]:
+        edges = []
+        for label, similarity in similar:
+            child = node.children.get(label)
+            if child is not None:
+                edges.append((similarity, child))
+        return edges
+
+    def _best_match(self, tokens: List[str]) -> Optional[IntentMatch]:
+        best: Optional[IntentMatch] = None
+        best_key = (0.0, 0, 0)
+        similar = [self._similar(token) for token in tokens]
+        # Running totals of uncovered weight and of non-request words
+        weight_sums, content_sums = [0.0], [0]
+        for token in tokens:
+            request_word = token in REQUEST_WORDS
+            weight_sums.append(weight_sums[-1] + (REQUEST_WORD_WEIGHT if request_word else 1.0))
+            content_sums.append(content_sums[-1] + (not request_word))
+        for start in range(len(tokens)):
+            if not similar[start]:
+                continue  # no phrase can start with this token
+            # (node, summed similarity, depth) of every partial match from here
+            frontier = [(self._root, 0.0, 0)]
+            for candidates in similar[start:]:
+                advanced = []
+                for node, total, depth in frontier:
+                    for similarity, child in self._edges(node, candidates):
+                        advanced.append((child, total + similarity, depth + 1))
+                if not advanced:
+                    break
+                frontier = advanced
+                for node, total, depth in frontier:
+                    if node.intent is None:
+                        continue
+                    end = start + depth
+                    uncovered = weight_sums[-1] - (weight_sums[end] - weight_sums[start])
+                    if node.intent in self.side_effects:
+                        content_left = content_sums[-1] - (content_sums[end] - content_sums[start])
+                        if depth / (depth + content_left) < SIDE_EFFECT_COVERAGE:
+                            continue
+                    coverage = depth / (depth + uncovered)
+                    confidence = (total / depth) * (COVERAGE_FLOOR + (1.0 - COVERAGE_FLOOR) * coverage)
+                    # Higher confidence wins, then the longer phrase, then intent order
+                    key = (round(confidence, 6), depth, -self.intents.index(node.intent))
+                    if key > best_key:
+                        best_key = key
+                        best = IntentMatch(node.intent, round(confidence, 3), node.phrase)
+        return best
+
+    def match(self, text: str) -> Optional[IntentMatch]:
+        """Best match for the utterance regardless of the threshold"""
+        tokens = normalize_tokens(text)
+        if not tokens or any(is_negation(token) for token in tokens):
+            return None
+        return self._best_match(tokens)
+
+    def route(self, text: str) -> Optional[IntentMatch]:
+        """The intent to handle locally, or None to fall back to the LLM"""
+        start = time.perf_counter()
+        match = self.match(text)
+        metrics.observe("intent_route_ms", (time.perf_counter() - start) * 1000.0, persona=self.persona)
+        if match is None or match.confidence < self.threshold:
+            metrics.inc("intent_fallback", persona=self.persona)
+            if match is not None:
+                logger.debug(f"'{text}' looks like {match.intent} ({match.confidence}), below threshold")
+            return None
+        metrics.inc("intent_routed", persona=self.persona, intent=match.intent)
+        logger.info(f"Routed '{text}' to {match.intent} locally (confidence {match.confidence})")
+        return match
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Routing-latency benchmark for the local intent router.
+
+Routes a set of utterances through a persona's compiled router and through
+the substring scan the speaking report agent used before
+(``any(cmd in text for cmd in NEXT_COMMANDS)`` and so on). It prints the
+per-utterance latency percentiles of both, for the router warm and with an
+empty fuzzy-match cache, and how many utterances each would answer locally. Utterances default to a built-in sample of commands,
+misrecognized commands and free-form questions; pass a file with one
+utterance per line to use real transcripts.
+
+Usage:
+    python3 intent_router_bench.py --persona speaking_report --repeat 2000
+    python3 intent_router_bench.py transcripts.txt --threshold 0.8
+"""
+
+import argparse
+import statistics
+import time
+from collections import Counter
+from typing import Callable, List, Optional
+
+from agent_intents import EXPLAIN_COMMANDS, NEXT_COMMANDS, SUMMARY_COMMANDS, persona_router
+from intent_router import INTENT_ROUTER_THRESHOLD
+
+SAMPLE_UTTERANCES = [
+    "next", "Next.", "next highlight please", "okay, go to next", "continue",
+    "explain this", "Can you explain this one?", "tell me more about it", "explian this",
+    "what's wrong here?", "how many highlights are left", "give me a sumary", "status",
+    "show my status", "start learning", "begin lerning",
+    "what's next on my reading list", "I don't understand why this sentence is wrong",
+    "hello there", "can we talk about my pronunciation instead",
+    "what does coherence mean", "thanks, that was helpful",
+]
+
+
+def legacy_route(text: str) -> Optional[str]:
+    """The speaking report agent's former substring scan"""
+    text = text.lower()
+    if any(cmd in text for cmd in NEXT_COMMANDS):
+        return "next_highlight"
+    elif any(cmd in text for cmd in EXPLAIN_COMMANDS):
+        return "explain_highlight"
+    elif any(cmd in text for cmd in SUMMARY_COMMANDS):
+        return "get_progress"
+    return None
+
+
+def time_routing(route: Callable[[str], Optional[str]], utterances: List[str], repeat: int) -> List[float]:
+    """Per-call latency in microseconds, averaged over ``repeat`` calls"""
+    samples = []
+    for text in utterances:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            route(text)
+        samples.append((time.perf_counter() - start) / repeat * 1e6)
+    return samples
+
+
+def time_cold_routing(persona: str, threshold: float, utterances: List[str]) -> List[float]:
+    """First-call latency in microseconds, with an empty fuzzy-match cache"""
+    samples = []
+    for text in utterances:
+        router = persona_router(persona, threshold)
+        start = time.perf_counter()
+        router.match(text)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def summarize(name: str, samples: List[float]) -> None:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{name:<10} p50 {statistics.median(ordered):8.1f} us   p95 {p95:8.1f} us   max {ordered[-1]:8.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark local intent routing')
+    parser.add_argument('utterances', nargs='?', help='File with one utterance per line')
+    parser.add_argument('--persona', default='speaking_report', help='Persona in agent_intents.PERSONA_INTENTS')
+    parser.add_argument('--threshold', type=float, default=INTENT_ROUTER_THRESHOLD, help='Confidence threshold')
+    parser.add_argument('--repeat', type=int, default=1000, help='Routing calls per utterance')
+    args = parser.parse_args()
+
+    if args.utterances:
+        with open(args.utterances, encoding="utf-8") as f:
+            utterances = [line.strip() for line in f if line.strip()]
+    else:
+        utterances = SAMPLE_UTTERANCES
+
+    router = persona_router(args.persona, args.threshold)
+
+    def route(text: str) -> Optional[str]:
+        match = router.match(text)
+        return match.intent if match and match.confidence >= router.threshold else None
+
+    print(f"{len(utterances)} utterances, persona '{args.persona}', threshold {args.threshold}")
+    summarize("router", time_routing(route, utterances, args.repeat))
+    summarize("cold", time_cold_routing(args.persona, args.threshold, utterances))
+    if args.persona == "speaking_report":
+        summarize("substring", time_routing(legacy_route, utterances, args.repeat))
+
+    routed = Counter()
+    print()
+    print(f"  {'conf':<5}  {'router':<18} {'substring':<18} utterance")
+    for text in utterances:
+        match = router.match(text)
+        intent = route(text)
+        routed[intent or "(llm)"] += 1
+        confidence = f"{match.confidence:.3f}" if match else "  -  "
+        legacy = legacy_route(text) if args.persona == "speaking_report" else ""
+        print(f"  {confidence}  {intent or '(llm)':<18} {legacy or '':<18} {text}")
+    print()
+    print("Routes: " + ", ".join(f"{intent} {count}" for intent, count in routed.most_common()))
+
+
+if __name__ == "__main__":
+    main()
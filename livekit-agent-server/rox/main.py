@@ -180,13 +180,18 @@ async def entrypoint(ctx: JobContext):
 
     try:
         logger.info("Creating main agent session with VPA pipeline...")
+        # The bridge keeps a pooled HTTP session for the whole job
+        llm_bridge = CustomLLMBridge(room=ctx.room)
+        ctx.add_shutdown_callback(llm_bridge.aclose)
         main_agent_session = agents.AgentSession( # Renamed for clarity
             stt=deepgram.STT(model="nova-2", language="multi"), # nova-2 or nova-3
-            llm=CustomLLMBridge(), # Pass URL explicitly
+            llm=llm_bridge,
             tts=deepgram.TTS(model=GLOBAL_MODEL),
             vad=silero.VAD.load(),
             turn_detection=MultilingualModel(),
         )
+        # Interim transcripts let the bridge start the agent request early
+        main_agent_session.on("user_input_transcribed", llm_bridge.on_user_input_transcribed)
         logger.info("Main agent session created successfully.")
 
         if avatar_session: # Implies GLOBAL_AVATAR_ENABLED was true and session created
@@ -0,0 +1,187 @@
+"""
+Shared read access to the speaking-test report store.
+
+The Socket.IO server's report pipeline writes finished reports to an SQLite
+database (socket_io_report_store.py at the repository root). This module
+holds the queries and the row assembly for reading them back, so the
+writer's own cache, the speaking report agent and the speaking feedback tool
+all load reports the same way. It is the only copy: the repository root and
+full_implementation/ import it through symlinks to this file.
+
+ReportStoreReader opens the file read-only, so the agents can load a report
+and its highlights, in document order, with one indexed query instead of
+re-fetching them from Socket.IO or the frontend.
+
+Usage:
+    reader = ReportStoreReader()
+    report = reader.load_report(report_id)
+    report = reader.load_latest_for_user(user_id)
+    scores = reader.load_scores(report_id=report_id)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REPORT_STORE_PATH = os.environ.get("REPORT_STORE_PATH") or os.path.join(tempfile.gettempdir(), "speaking_reports.sqlite3")
+
+# One row per highlight (or a single row with NULL highlight columns);
+# scores are folded into a JSON object by a correlated subquery
+LOAD_REPORT_SQL = """
+SELECT r.report_id, r.user_id, r.topic_id, r.created_at, r.completed_at,
+       r.audio_bytes, r.audio_chunks, r.analysis, t.text,
+       (SELECT json_group_object(s.name, s.value) FROM scores s WHERE s.report_id = r.report_id),
+       h.highlight_id, h.start, h.end, h.type, h.message, h.wrong_version, h.correct_version,
+       h.audio_start, h.audio_end
+FROM reports r
+LEFT JOIN transcripts t ON t.report_id = r.report_id
+LEFT JOIN highlights h ON h.report_id = r.report_id
+WHERE r.report_id = {where}
+ORDER BY h.start, h.end
+"""
+
+SCORES_SQL = "SELECT name, value FROM scores WHERE report_id = {where}"
+
+LATEST_FOR_USER = "(SELECT report_id FROM reports WHERE user_id = ? ORDER BY created_at DESC LIMIT 1)"
+
+
+def report_query(sql: str, report_id: Optional[str] = None, user_id: Optional[str] = None) -> Tuple[str, Tuple]:
+    """``sql`` with its ``{where}`` bound to a report id, or else to the user's latest report"""
+    if report_id:
+        return sql.format(where="?"), (report_id,)
+    return sql.format(where=LATEST_FOR_USER), (user_id,)
+
+
+def rows_to_report(rows: List[Tuple]) -> Optional[Dict[str, Any]]:
+    """Assemble the rows of LOAD_REPORT_SQL into a report dict"""
+    if not rows:
+        return None
+    (report_id, user_id, topic_id, created_at, completed_at,
+     audio_bytes, audio_chunks, analysis, text, scores) = rows[0][:10]
+    text = text or ""
+    highlights = []
+    for row in rows:
+        if row[10] is None:
+            continue
+        highlights.append({
+            "id": row[10],
+            "start": row[11],
+            "end": row[12],
+            "type": row[13],
+            "message": row[14],
+            "wrongVersion": row[15],
+            "correctVersion": row[16],
+            "audioStart": row[17],
+            "audioEnd": row[18],
+            "text": text[row[11]:row[12]],
+        })
+    return {
+        "report_id": report_id,
+        "user_id": user_id,
+        "topic_id": topic_id,
+        "created_at": created_at,
+        "completed_at": completed_at,
+        "audio": {"bytes": audio_bytes, "chunks": audio_chunks},
+        "analysis": json.loads(analysis) if analysis else {},
+        "transcript": text,
+        "scores": json.loads(scores) if scores else {},
+        "highlights": highlights,
+    }
+
+
+def room_report_context(room) -> Dict[str, str]:
+    """
+    Which stored report the student in a LiveKit room is looking at.
+
+    The student's participant identity is taken as the user id the test
+    was stored under. A ``report_id`` (or ``reportId``) in the
+    participant's attributes or JSON metadata pins a specific report;
+    otherwise readers use the user's latest report.
+    """
+    participants = getattr(room, "remote_participants", None) or {}
+    for participant in participants.values():
+        context: Dict[str, str] = {}
+        if getattr(participant, "identity", None):
+            context["user_id"] = participant.identity
+        details = dict(getattr(participant, "attributes", None) or {})
+        try:
+            metadata = json.loads(getattr(participant, "metadata", None) or "{}")
+            if isinstance(metadata, dict):
+                details.update(metadata)
+        except ValueError:
+            pass
+        report_id = details.get("report_id") or details.get("reportId")
+        if report_id:
+            context["report_id"] = str(report_id)
+        if context:
+            return context
+    return {}
+
+
+class ReportStoreReader:
+    """Loads reports by id or as the latest report of a user"""
+
+    def __init__(self, path: str = REPORT_STORE_PATH, cache_size: int = 32):
+        self.path = path
+        self.cache_size = cache_size
+        self._db: Optional[sqlite3.Connection] = None
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        return self._db
+
+    def load_report(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """Load one report; finished reports never change, so they are cached"""
+        with self._lock:
+            cached = self._cache.get(report_id)
+            if cached is not None:
+                self._cache.move_to_end(report_id)
+                return cached
+        report = rows_to_report(self._query(*report_query(LOAD_REPORT_SQL, report_id=report_id)))
+        if report is not None:
+            self._remember(report)
+        return report
+
+    def load_latest_for_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Load the most recent report of a user"""
+        report = rows_to_report(self._query(*report_query(LOAD_REPORT_SQL, user_id=user_id)))
+        if report is not None:
+            self._remember(report)
+        return report
+
+    def load_scores(self, report_id: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, float]:
+        """Stored scores of a report (or of a user's latest report), without loading the rest"""
+        if not (report_id or user_id):
+            return {}
+        return dict(self._query(*report_query(SCORES_SQL, report_id, user_id)))
+
+    def _remember(self, report: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cache[report["report_id"]] = report
+            self._cache.move_to_end(report["report_id"])
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _query(self, sql: str, params: Tuple) -> List[Tuple]:
+        if not self.available:
+            return []
+        try:
+            with self._lock:
+                return self._connect().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading report store {self.path}: {e}")
+            return []
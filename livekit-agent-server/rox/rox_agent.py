@@ -18,6 +18,13 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from agent_cancellation import register_cancellation_routes, reply_cancelled, request_timeout
+from agent_grpc import AGENT_GRPC_SOCKET, serve_grpc
+from agent_streaming import (
+    completion_deltas, delta_event, dom_actions_event, done_event, ndjson_response, result_events, wants_stream
+)
+from agent_intents import persona_router
+
 # --- Setup ---
 load_dotenv()  # Load environment variables from .env file
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -28,6 +35,9 @@ app = Flask(__name__)
 # Enable CORS for all routes and origins
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Let the bridge cancel replies the student interrupted
+register_cancellation_routes(app)
+
 # --- Student Data API URL ---
 STUDENT_API_URL = os.getenv("STUDENT_API_URL", "http://localhost:5080/api")
 
@@ -93,6 +103,42 @@ def click_ui_button(button_id):
     
     return json.dumps(result)
 
+def history_messages(data):
+    """Earlier turns sent by the bridge (summary first), as OpenAI messages"""
+    messages = []
+    if data.get("summary"):
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {data['summary']}"})
+    for turn in data.get("history") or []:
+        if turn.get("role") in ("user", "assistant") and turn.get("content"):
+            messages.append({"role": turn["role"], "content": turn["content"]})
+    return messages
+
+# --- Local Command Handlers ---
+
+def show_status():
+    """Open the status panel and read out the scores"""
+    data = get_student_data()
+    scores = ", ".join(f"{subject} {score}" for subject, score in data.get("progress", {}).items())
+    return {
+        "response": f"Here's where you stand, {data.get('name', 'there')}: {scores}. I've opened your status panel.",
+        "dom_actions": [{"action": "click", "payload": {"selector": "#statusViewButton"}}]
+    }
+
+def start_learning():
+    """Start the next learning session"""
+    return {
+        "response": "Great, let's get going! I'm starting your next learning session.",
+        "dom_actions": [{"action": "click", "payload": {"selector": "#startLearningButton"}}]
+    }
+
+COMMAND_HANDLERS = {
+    "show_status": show_status,
+    "start_learning": start_learning,
+}
+
+# Rox commands (agent_intents.py) compiled for local routing
+command_router = persona_router("rox")
+
 # --- OpenAI Function Definitions ---
 tools = [
     {
@@ -144,14 +190,130 @@ You can:
 Be concise, helpful, and focus on being a supportive learning assistant.
 """
 
+# --- Tool Call Execution ---
+def execute_tool_call(call_id, function_name, arguments, messages):
+    """
+    Run one tool call requested by the model and append its result to messages.
+
+    Returns the DOM actions the call produced (a button click), or None.
+    """
+    dom_actions = None
+
+    # Match the function name to the actual function
+    function_to_call = None
+    if function_name == "get_student_status":
+        function_to_call = get_student_status
+    elif function_name == "click_ui_button":
+        function_to_call = click_ui_button
+    else:
+        logger.error(f"Unknown function call: {function_name}")
+        return None
+    
+    # Parse arguments and call the function
+    try:
+        function_args = json.loads(arguments or "{}")
+        logger.info(f"Calling function '{function_name}' with args: {function_args}")
+        
+        # Call the appropriate function based on the name
+        if function_name == "get_student_status":
+            function_response = function_to_call()
+        elif function_name == "click_ui_button":
+            button_id = function_args.get("button_id")
+            function_response = function_to_call(button_id)
+            
+            # If this is a button click, prepare DOM actions
+            try:
+                button_result = json.loads(function_response)
+                if button_result.get("success"):
+                    # Create DOM action for the button click
+                    dom_actions = [{
+                        "action": "click",
+                        "payload": {
+                            "selector": f"#{button_result['button_id']}"
+                        }
+                    }]
+                    logger.info(f"Created DOM action for button click: {dom_actions}")
+            except Exception as e:
+                logger.error(f"Error processing button click result: {e}")
+        
+        logger.info(f"Function '{function_name}' returned: {function_response}")
+        
+        # Add the function result to messages for the second API call
+        messages.append({
+            "tool_call_id": call_id,
+            "role": "tool",
+            "name": function_name, 
+            "content": function_response
+        })
+        
+    except Exception as e:
+        logger.error(f"Error calling function {function_name}: {e}")
+        # Add an error message
+        messages.append({
+            "tool_call_id": call_id,
+            "role": "tool",
+            "name": function_name,
+            "content": json.dumps({"error": str(e)})
+        })
+    
+    return dom_actions
+
+def stream_reply(messages, dom_actions):
+    """
+    Streamed variant of /process: text deltas as OpenAI generates them.
+    DOM actions are sent as soon as they are known: the 'hello' rule's
+    before the text, a tool call's before the follow-up answer.
+    """
+    if dom_actions:
+        yield dom_actions_event(dom_actions)
+    try:
+        logger.info("Calling OpenAI API (streaming)...")
+        tool_calls = []
+        stream = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            tools=tools,
+            tool_choice="auto",
+            stream=True,
+            timeout=request_timeout(client.timeout),
+        )
+        content = []
+        for text in completion_deltas(stream, tool_calls):
+            content.append(text)
+            yield delta_event(text)
+
+        # --- Process any function calls, then stream the follow-up answer ---
+        if tool_calls and reply_cancelled():
+            logger.info("Reply cancelled before the tool calls; skipping the second API call")
+            return
+        if tool_calls:
+            messages.append({"role": "assistant", "content": "".join(content) or None, "tool_calls": tool_calls})
+            for tool_call in tool_calls:
+                tool_dom_actions = execute_tool_call(
+                    tool_call["id"], tool_call["function"]["name"], tool_call["function"]["arguments"], messages
+                )
+                if tool_dom_actions and tool_dom_actions != dom_actions:
+                    dom_actions = tool_dom_actions
+                    yield dom_actions_event(dom_actions)
+            
+            logger.info("Making second API call to process function results (streaming)...")
+            second_stream = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                stream=True,
+                timeout=request_timeout(client.timeout),
+            )
+            for text in completion_deltas(second_stream):
+                yield delta_event(text)
+    except Exception as e:
+        logger.error(f"Error streaming response: {e}")
+        yield delta_event("I'm sorry, I encountered a problem. Please try again.")
+    yield done_event()
+
 # --- Flask Route for Processing Transcripts ---
 @app.route('/process', methods=['POST'])
 def process_transcript():
     """Process incoming transcripts and generate agent responses"""
-    if not client:
-        logger.error("OpenAI client not initialized. Cannot process request.")
-        return jsonify({"response": "Sorry, my connection to the AI service is not configured."}), 500
-
     data = request.get_json()
     if not data or 'transcript' not in data:
         logger.error("Received invalid request data.")
@@ -160,6 +322,18 @@ def process_transcript():
     transcript = data['transcript']
     logger.info(f"Received transcript: '{transcript}'")
 
+    # Fixed navigation commands are answered without calling OpenAI
+    match = command_router.route(transcript)
+    if match:
+        result = COMMAND_HANDLERS[match.intent]()
+        if wants_stream(request):
+            return ndjson_response(result_events(result))
+        return jsonify(result)
+
+    if not client:
+        logger.error("OpenAI client not initialized. Cannot process request.")
+        return jsonify({"response": "Sorry, my connection to the AI service is not configured."}), 500
+
     # Initialize dom_actions for UI manipulation - will be populated by 'hello' or LLM tool call
     dom_actions = None
 
@@ -182,7 +356,11 @@ def process_transcript():
                    ", ".join([f"{subject}: {score}" for subject, score in student_data.get("progress", {}).items()])
     }
     
-    messages = [system_message, {"role": "user", "content": transcript}]
+    messages = [system_message] + history_messages(data) + [{"role": "user", "content": transcript}]
+    
+    # Stream the reply to bridges that accept NDJSON
+    if wants_stream(request):
+        return ndjson_response(stream_reply(messages, dom_actions))
     
     try:
         logger.info("Calling OpenAI API...")
@@ -191,6 +369,7 @@ def process_transcript():
             messages=messages,
             tools=tools,
             tool_choice="auto",
+            timeout=request_timeout(client.timeout),
         )
         
         response_message = response.choices[0].message
@@ -208,71 +387,19 @@ def process_transcript():
             
             # --- Process each tool call ---
             for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                
-                # Match the function name to the actual function
-                function_to_call = None
-                if function_name == "get_student_status":
-                    function_to_call = get_student_status
-                elif function_name == "click_ui_button":
-                    function_to_call = click_ui_button
-                else:
-                    logger.error(f"Unknown function call: {function_name}")
-                    continue
-                
-                # Parse arguments and call the function
-                try:
-                    function_args = json.loads(tool_call.function.arguments)
-                    logger.info(f"Calling function '{function_name}' with args: {function_args}")
-                    
-                    # Call the appropriate function based on the name
-                    if function_name == "get_student_status":
-                        function_response = function_to_call()
-                    elif function_name == "click_ui_button":
-                        button_id = function_args.get("button_id")
-                        function_response = function_to_call(button_id)
-                        
-                        # If this is a button click, prepare DOM actions
-                        try:
-                            button_result = json.loads(function_response)
-                            if button_result.get("success"):
-                                # Create DOM action for the button click
-                                dom_actions = [{
-                                    "action": "click",
-                                    "payload": {
-                                        "selector": f"#{button_result['button_id']}"
-                                    }
-                                }]
-                                logger.info(f"Created DOM action for button click: {dom_actions}")
-                        except Exception as e:
-                            logger.error(f"Error processing button click result: {e}")
-                    
-                    logger.info(f"Function '{function_name}' returned: {function_response}")
-                    
-                    # Add the function result to messages for the second API call
-                    messages.append({
-                        "tool_call_id": tool_call.id,
-                        "role": "tool",
-                        "name": function_name, 
-                        "content": function_response
-                    })
-                    
-                except Exception as e:
-                    logger.error(f"Error calling function {function_name}: {e}")
-                    # Add an error message
-                    messages.append({
-                        "tool_call_id": tool_call.id,
-                        "role": "tool",
-                        "name": function_name,
-                        "content": json.dumps({"error": str(e)})
-                    })
+                tool_dom_actions = execute_tool_call(
+                    tool_call.id, tool_call.function.name, tool_call.function.arguments, messages
+                )
+                if tool_dom_actions:
+                    dom_actions = tool_dom_actions
             
             # Make a second API call to process the function results
             try:
                 logger.info("Making second API call to process function results...")
                 second_response = client.chat.completions.create(
                     model="gpt-4o-mini",
-                    messages=messages
+                    messages=messages,
+                    timeout=request_timeout(client.timeout),
                 )
                 final_response = second_response.choices[0].message.content
                 logger.info(f"Generated final response: {final_response}")
@@ -300,4 +427,7 @@ if __name__ == '__main__':
     # Use port 5005 to match the URL expected by custom_llm.py
     port = int(os.getenv("PORT", 5005))
     logger.info(f"Starting Rox Agent Flask server on port {port}")
+    # Also serve the bridge's gRPC transport on a Unix socket if configured
+    if AGENT_GRPC_SOCKET:
+        serve_grpc(app, AGENT_GRPC_SOCKET)
     app.run(host='0.0.0.0', port=port, debug=False)
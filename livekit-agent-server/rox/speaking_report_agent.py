@@ -4,6 +4,7 @@
 import json
 import logging
 import os
+import re
 import requests
 import time
 import uuid
@@ -17,6 +18,13 @@ import threading
 
 # Import the highlight handler
 from highlight_handler import HighlightHandler
+from report_store_reader import ReportStoreReader
+from agent_cancellation import register_cancellation_routes, request_timeout
+from agent_grpc import AGENT_GRPC_SOCKET, serve_grpc
+from agent_intents import NEXT_COMMANDS, EXPLAIN_COMMANDS, SUMMARY_COMMANDS, persona_router
+from agent_streaming import (
+    completion_deltas, delta_event, done_event, ndjson_response, result_events, wants_stream
+)
 
 # --- Setup ---
 load_dotenv()  # Load environment variables from .env file
@@ -195,6 +203,9 @@ app = Flask(__name__)
 # Enable CORS for all routes and origins
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Let the bridge cancel replies the student interrupted
+register_cancellation_routes(app)
+
 # --- OpenAI Client Initialization ---
 openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
@@ -210,6 +221,29 @@ highlight_handler = HighlightHandler(FRONTEND_URL)
 socket_io_url = os.getenv('SOCKET_IO_URL', 'http://localhost:8001')
 socket_client = HighlightSocketClient(socket_io_url)
 
+# Read-only access to reports stored by the Socket.IO server's report pipeline
+report_store = ReportStoreReader()
+
+def update_highlights_from_store(report_id=None, user_id=None):
+    """Load the highlights of a stored report (by id, or the user's latest)"""
+    if report_id:
+        report = report_store.load_report(report_id)
+    elif user_id:
+        report = report_store.load_latest_for_user(user_id)
+    else:
+        return False
+    
+    if not report or not report["highlights"]:
+        return False
+    
+    highlights = report["highlights"]
+    logger.info(f"Loaded {len(highlights)} highlights from stored report {report['report_id']}")
+    if highlight_handler.highlights != highlights:
+        highlight_handler.highlights = highlights
+        highlight_handler.explained_highlights = set()
+        highlight_handler.current_highlight_id = highlights[0].get('id')
+    return True
+
 # Function to update highlights from Socket.IO
 def update_highlights_from_socket():
     """Update highlights from the Socket.IO connection if available"""
@@ -228,9 +262,9 @@ def update_highlights_from_socket():
     return False
 
 # --- Common Commands to Recognize ---
-NEXT_COMMANDS = ["next", "next highlight", "move to next", "go to next", "next suggestion", "continue"]
-EXPLAIN_COMMANDS = ["explain", "explain this", "tell me more", "what's this", "what's wrong here", "explain issue"]
-SUMMARY_COMMANDS = ["summarize", "give me a summary", "overview", "progress", "how many highlights", "status"]
+# NEXT_COMMANDS, EXPLAIN_COMMANDS and SUMMARY_COMMANDS (agent_intents.py),
+# compiled for local routing
+command_router = persona_router("speaking_report")
 
 # --- OpenAI Function Definition ---
 tools = [
@@ -373,7 +407,8 @@ def explain_highlight(highlight_id=None):
                 messages=[{"role": "system", "content": SYSTEM_PROMPT}, 
                           {"role": "user", "content": prompt}],
                 temperature=0.7,
-                max_tokens=300
+                max_tokens=300,
+                timeout=request_timeout(client.timeout)
             )
             
             ai_explanation = response.choices[0].message.content
@@ -477,6 +512,13 @@ def get_progress():
         "progress": progress
     }
 
+# Local handlers of the routed commands
+COMMAND_HANDLERS = {
+    "next_highlight": next_highlight,
+    "explain_highlight": explain_highlight,
+    "get_progress": get_progress,
+}
+
 # --- System Prompt for OpenAI ---
 
 # --- Test highlights for debugging ---
@@ -743,6 +785,52 @@ def check_frontend():
             "error": str(e)
         }), 500
 
+def respond(result):
+    """Reply with the result as JSON, or as an NDJSON stream if the bridge asked for one"""
+    if wants_stream(request):
+        return ndjson_response(result_events(result))
+    return jsonify(result)
+
+def call_highlight_function(function_name, function_args):
+    """Run the highlight function chosen by the model"""
+    logger.info(f"Function call: {function_name} with args {function_args}")
+    if function_name == "explain_highlight":
+        return explain_highlight(function_args.get("highlight_id"))
+    elif function_name == "next_highlight":
+        return next_highlight()
+    elif function_name == "get_progress":
+        return get_progress()
+    return {"response": "I'm not sure how to help with that. Try asking about the current highlight, moving to the next one, or getting a progress summary."}
+
+def stream_command(prompt):
+    """
+    Streamed OpenAI command interpretation: a plain answer is sent as it is
+    generated; a function call is run and its result sent when it completes.
+    """
+    tool_calls = []
+    try:
+        stream = client.chat.completions.create(
+            model="gpt-4",
+            messages=[{"role": "system", "content": SYSTEM_PROMPT}, 
+                      {"role": "user", "content": prompt}],
+            tools=tools,
+            temperature=0.7,
+            stream=True,
+            timeout=request_timeout(client.timeout)
+        )
+        for text in completion_deltas(stream, tool_calls):
+            yield delta_event(text)
+        
+        if tool_calls:
+            function = tool_calls[0]["function"]
+            result = call_highlight_function(function["name"], json.loads(function["arguments"] or "{}"))
+            yield from result_events(result)
+            return
+    except Exception as e:
+        logger.error(f"Error with OpenAI function calling: {e}")
+        yield delta_event("I'm having trouble understanding that request. Try asking about highlights specifically.")
+    yield done_event()
+
 @app.route('/process', methods=['POST'])
 def process_transcript():
     """Process incoming transcripts and commands from the LiveKit agent"""
@@ -758,15 +846,21 @@ def process_transcript():
     logger.info(f"Received transcript: '{transcript}'")
     
     # Try to get highlights in this order:
+    # 0. Report store (stored report, by report_id or the user's latest)
     # 1. Socket.IO (direct from report_gen_server) - most reliable source
     # 2. Frontend API (from Next.js globalThis) - if available
     # 3. Test highlights (fallback)
+    store_success = update_highlights_from_store(data.get('report_id'), data.get('user_id'))
     
-    # First try to get highlights directly from Socket.IO server
-    logger.info("Checking Socket.IO for highlights")
-    socket_success = update_highlights_from_socket()
+    # Otherwise try to get highlights directly from Socket.IO server
+    socket_success = False
+    if not store_success:
+        logger.info("Checking Socket.IO for highlights")
+        socket_success = update_highlights_from_socket()
     
-    if socket_success:
+    if store_success:
+        logger.info(f"Using {len(highlight_handler.highlights)} highlights from the report store")
+    elif socket_success:
         logger.info(f"Successfully loaded {len(highlight_handler.highlights)} highlights from Socket.IO")
     else:
         # If Socket.IO failed, try the frontend API
@@ -807,29 +901,18 @@ def process_transcript():
         # First check for basic command patterns
         text = transcript.lower()
         
-        # Navigation commands
-        if any(cmd in text for cmd in NEXT_COMMANDS):
-            logger.info("Processing as 'next highlight' command")
-            result = next_highlight()
-            return jsonify(result)
-            
-        # Explanation commands
-        elif any(cmd in text for cmd in EXPLAIN_COMMANDS):
-            logger.info("Processing as 'explain highlight' command")
-            result = explain_highlight()
-            return jsonify(result)
-            
-        # Progress/summary commands
-        elif any(cmd in text for cmd in SUMMARY_COMMANDS):
-            logger.info("Processing as 'progress' command")
-            result = get_progress()
-            return jsonify(result)
+        # Navigation, explanation and progress commands are answered locally
+        match = command_router.route(transcript)
+        if match:
+            logger.info(f"Processing as '{match.intent}' command")
+            result = COMMAND_HANDLERS[match.intent]()
+            return respond(result)
             
         # Special command to load test highlights
         elif re.search(r'\b(load|use|test) highlights\b', text):
             logger.info("Processing as 'load test highlights' command")
             success = use_test_highlights(force=True)
-            return jsonify({
+            return respond({
                 "success": success,
                 "response": f"I've loaded {len(highlight_handler.highlights)} test highlights for demonstration purposes."
             })
@@ -840,13 +923,18 @@ def process_transcript():
             prompt = f"The user said: '{transcript}'. Determine if they want to explain the current highlight, " + \
                      f"move to the next highlight, or get a progress summary. If none of these apply, provide a helpful response."
             
+            # Stream the model's answer (or the chosen function's result) to bridges that accept NDJSON
+            if wants_stream(request):
+                return ndjson_response(stream_command(prompt))
+            
             try:
                 response = client.chat.completions.create(
                     model="gpt-4",
                     messages=[{"role": "system", "content": SYSTEM_PROMPT}, 
                               {"role": "user", "content": prompt}],
                     tools=tools,
-                    temperature=0.7
+                    temperature=0.7,
+                    timeout=request_timeout(client.timeout)
                 )
                 
                 message = response.choices[0].message
@@ -854,40 +942,32 @@ def process_transcript():
                 # Check if the model wants to call a function
                 if message.tool_calls:
                     tool_call = message.tool_calls[0]
-                    function_name = tool_call.function.name
-                    function_args = json.loads(tool_call.function.arguments)
-                    
-                    logger.info(f"Function call: {function_name} with args {function_args}")
-                    
-                    if function_name == "explain_highlight":
-                        highlight_id = function_args.get("highlight_id")
-                        result = explain_highlight(highlight_id)
-                    elif function_name == "next_highlight":
-                        result = next_highlight()
-                    elif function_name == "get_progress":
-                        result = get_progress()
-                    else:
-                        result = {"response": "I'm not sure how to help with that. Try asking about the current highlight, moving to the next one, or getting a progress summary."}
+                    result = call_highlight_function(tool_call.function.name, json.loads(tool_call.function.arguments))
                 else:
                     # If no function call, use the model's text response
                     result = {"response": message.content}
                 
-                return jsonify(result)
+                return respond(result)
                 
             except Exception as e:
                 logger.error(f"Error with OpenAI function calling: {e}")
-                return jsonify({
+                return respond({
                     "response": "I'm having trouble understanding that request. Try asking about highlights specifically."
                 })
         else:
+            # Without OpenAI, a command match below the threshold beats no answer
+            match = command_router.match(transcript)
+            if match:
+                logger.info(f"Processing as '{match.intent}' command (confidence {match.confidence})")
+                return respond(COMMAND_HANDLERS[match.intent]())
             # Default response if OpenAI not available
-            return jsonify({
+            return respond({
                 "response": "I didn't recognize that as a highlight-related command. Try saying 'next highlight' or 'explain this highlight'."
             })
             
     except Exception as e:
         logger.error(f"Error processing command: {e}")
-        return jsonify({
+        return respond({
             "response": "Sorry, I encountered an error processing your request. Please try again."
         })
 
@@ -1225,4 +1305,7 @@ if __name__ == '__main__':
     # Use port 5005 to match the URL expected by custom_llm.py
     port = int(os.getenv("PORT", 5005))
     logger.info(f"Starting Speaking Coach Agent Flask server on port {port}")
+    # Also serve the bridge's gRPC transport on a Unix socket if configured
+    if AGENT_GRPC_SOCKET:
+        serve_grpc(app, AGENT_GRPC_SOCKET)
     app.run(host='0.0.0.0', port=port, debug=False)
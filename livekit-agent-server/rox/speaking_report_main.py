@@ -106,14 +106,19 @@ async def entrypoint(ctx: agents.JobContext):
     try:
         # Create the agent session with the VPA pipeline using CustomLLMBridge
         logger.info("Creating agent session with VPA pipeline using CustomLLMBridge...")
+        # The bridge keeps a pooled HTTP session for the whole job
+        llm_bridge = CustomLLMBridge(room=ctx.room)
+        ctx.add_shutdown_callback(llm_bridge.aclose)
         session = AgentSession(
             # Use Deepgram for STT, our custom bridge for LLM, and Deepgram for TTS
             stt=deepgram.STT(model="nova-3", language="multi"),
-            llm=CustomLLMBridge(),  # Our custom bridge to the Flask server
+            llm=llm_bridge,  # Our custom bridge to the Flask server
             tts=deepgram.TTS(model=GLOBAL_MODEL),
             vad=silero.VAD.load(),
             turn_detection=MultilingualModel(),
         )
+        # Interim transcripts let the bridge start the agent request early
+        session.on("user_input_transcribed", llm_bridge.on_user_input_transcribed)
         logger.info("Agent session created successfully")
         
         # Start the agent session
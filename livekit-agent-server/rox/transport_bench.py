@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Per-turn overhead of the bridge's HTTP and gRPC transports.
+
+Sends the same turns through CustomLLMBridge over HTTP (NDJSON through
+Flask's development server) and over gRPC on a Unix socket. It prints the
+latency percentiles of the first reply event and of the whole reply. By
+default both transports talk to a built-in echo agent. It streams
+``--deltas`` fixed deltas with no model behind it, so the numbers are pure
+transport and dispatch cost. Pass ``--http-url`` and ``--grpc-url`` to
+measure a running agent instead.
+
+Usage:
+    python3 transport_bench.py --turns 500 --history 10
+    python3 transport_bench.py --http-url http://localhost:5005/process \\
+        --grpc-url unix:///tmp/rox_agent.sock
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from flask import Flask, request
+from werkzeug.serving import make_server
+
+from agent_cancellation import register_cancellation_routes
+from agent_grpc import serve_grpc
+from agent_streaming import delta_event, done_event, ndjson_response
+from custom_llm import CustomLLMBridge
+
+
+def echo_agent(deltas: int) -> Flask:
+    """An agent whose /process streams ``deltas`` fixed text deltas"""
+    app = Flask(__name__)
+    register_cancellation_routes(app)
+
+    @app.route('/process', methods=['POST'])
+    def process():
+        transcript = request.get_json()["transcript"]
+
+        def events():
+            for i in range(deltas):
+                yield delta_event(f"Part {i} of the answer to '{transcript}'. ")
+            yield done_event()
+        return ndjson_response(events())
+
+    return app
+
+
+def sample_context(turns: int) -> Dict[str, Any]:
+    history = [{"role": "user" if i % 2 == 0 else "assistant",
+                "content": f"Turn {i}: a sentence of about the length a student or tutor would say."}
+               for i in range(turns)]
+    return {"history": history} if history else {}
+
+
+async def time_turns(bridge: CustomLLMBridge, turns: int, context: Dict[str, Any]) -> Tuple[List[float], List[float]]:
+    """First-event and total latency of each turn, in milliseconds"""
+    first_ms, total_ms = [], []
+    for i in range(turns):
+        start = time.perf_counter()
+        first = None
+        async for _ in bridge._agent_reply(f"question {i}", context):
+            if first is None:
+                first = time.perf_counter()
+        end = time.perf_counter()
+        first_ms.append(((first or end) - start) * 1000.0)
+        total_ms.append((end - start) * 1000.0)
+    return first_ms, total_ms
+
+
+def summarize(name: str, samples: List[float]) -> None:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{name:<18} p50 {statistics.median(ordered):7.2f} ms   p95 {p95:7.2f} ms   max {ordered[-1]:7.2f} ms")
+
+
+async def run(args) -> None:
+    context = sample_context(args.history)
+    for name, url in (("http", args.http_url), ("grpc", args.grpc_url)):
+        bridge = CustomLLMBridge(url=url)
+        try:
+            await time_turns(bridge, args.warmup, context)
+            first_ms, total_ms = await time_turns(bridge, args.turns, context)
+        finally:
+            await bridge.aclose()
+        summarize(f"{name} first event", first_ms)
+        summarize(f"{name} full reply", total_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bridge transports')
+    parser.add_argument('--turns', type=int, default=300, help='Measured turns per transport')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured turns first (connection setup)')
+    parser.add_argument('--deltas', type=int, default=5, help='Deltas per reply of the built-in agent')
+    parser.add_argument('--history', type=int, default=0, help='History turns sent with each transcript')
+    parser.add_argument('--http-url', help='/process URL of a running agent')
+    parser.add_argument('--grpc-url', help='unix:///path of a running agent')
+    args = parser.parse_args()
+
+    servers = []
+    if not (args.http_url and args.grpc_url):
+        app = echo_agent(args.deltas)
+        http_server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        socket_path = os.path.join(tempfile.mkdtemp(), "agent.sock")
+        grpc_server = serve_grpc(app, socket_path)
+        servers = [http_server.shutdown, lambda: grpc_server.stop(None)]
+        args.http_url = args.http_url or f"http://127.0.0.1:{http_server.server_port}/process"
+        args.grpc_url = args.grpc_url or f"unix://{socket_path}"
+
+    print(f"{args.turns} turns, {args.history} history turns: {args.http_url} vs {args.grpc_url}")
+    try:
+        asyncio.run(run(args))
+    finally:
+        for stop in servers:
+            stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,10 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+from agent_cancellation import register_cancellation_routes
+from agent_grpc import AGENT_GRPC_SOCKET, serve_grpc
+from agent_streaming import delta_event, done_event, ndjson_response, result_events, wants_stream
+
 # --- Setup ---
 load_dotenv()  # Load environment variables from .env file
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,6 +28,9 @@ app = Flask(__name__)
 # Enable CORS for all routes and origins
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+# Let the bridge cancel replies the student interrupted
+register_cancellation_routes(app)
+
 # --- OpenAI Client Initialization ---
 openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
@@ -247,6 +254,23 @@ When a student mentions a vocabulary word, help them understand it by:
 If students are struggling, be patient and try different approaches to help them understand.
 """
 
+# --- Streaming Reply ---
+def stream_explanation(explanation: str, prompt: str, request_id: str):
+    """Send the explanation first, then the image-generation metadata"""
+    yield delta_event(explanation)
+    success, response_data = trigger_image_generation("serendipity", prompt, request_id)
+    meta = None
+    if success and response_data:
+        meta = {
+            "meta": {
+                "image_generated": True,
+                "image_id": response_data.get("imageId"),
+                "request_id": request_id,
+                "word": "serendipity"
+            }
+        }
+    yield done_event(meta)
+
 # --- Flask Route ---
 @app.route('/process', methods=['POST'])
 def process_transcript():
@@ -272,6 +296,10 @@ def process_transcript():
         # Generate a unique request ID for this specific request 
         request_id = f"serendipity_{uuid.uuid4().hex[:8]}_{int(time.time())}"
         
+        # Streaming bridges can speak the explanation while the image request runs
+        if wants_stream(request):
+            return ndjson_response(stream_explanation(explanation, serendipity_prompt, request_id))
+        
         # Trigger direct image generation through the API endpoint
         success, response_data = trigger_image_generation("serendipity", serendipity_prompt, request_id)
         
@@ -294,7 +322,7 @@ def process_transcript():
     except Exception as e:
         logger.error(f"Error: {e}")
         # Even in case of error, return serendipity info
-        return jsonify({
+        result = {
             "response": "Let me teach you about the word 'serendipity'! It refers to finding something good by chance when you weren't looking for it.",
             "action": "generate_image",
             "payload": {
@@ -308,7 +336,10 @@ def process_transcript():
                     "context": "serendipity"
                 }
             }
-        })
+        }
+        if wants_stream(request):
+            return ndjson_response(result_events(result))
+        return jsonify(result)
 
 
 
@@ -316,4 +347,7 @@ if __name__ == '__main__':
     # Use port 5005 to match the URL expected by custom_llm.py
     port = int(os.getenv("PORT", 5005))
     logger.info(f"Starting Vocabulary Teacher Agent Flask server on port {port}")
+    # Also serve the bridge's gRPC transport on a Unix socket if configured
+    if AGENT_GRPC_SOCKET:
+        serve_grpc(app, AGENT_GRPC_SOCKET)
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -100,14 +100,19 @@ async def entrypoint(ctx: agents.JobContext):
 
     try:
         logger.info("Creating agent session with VPA pipeline using CustomLLMBridge...")
+        # The bridge keeps a pooled HTTP session for the whole job
+        llm_bridge = CustomLLMBridge(room=ctx.room)
+        ctx.add_shutdown_callback(llm_bridge.aclose)
         session = AgentSession(
             stt=deepgram.STT(model="nova-3", language="multi"),
             # Use our CustomLLMBridge to connect to vocab_teacher_agent.py
-            llm=CustomLLMBridge(),
+            llm=llm_bridge,
             tts=deepgram.TTS(model=GLOBAL_MODEL),
             vad=silero.VAD.load(),
             turn_detection=MultilingualModel(),
         )
+        # Interim transcripts let the bridge start the agent request early
+        session.on("user_input_transcribed", llm_bridge.on_user_input_transcribed)
         logger.info("Agent session created successfully")
 
         logger.info("Starting agent session...")
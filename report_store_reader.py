@@ -0,0 +1 @@
+livekit-agent-server/rox/report_store_reader.py
\ No newline at end of file
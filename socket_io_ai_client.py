@@ -0,0 +1,52 @@
+"""
+Shared HTTP client for the AI analysis service.
+
+Every caller (text_update suggestions, live grammar checks, report jobs)
+reuses one pooled httpx.AsyncClient instead of opening a new connection per
+request. The client is created lazily on first use and closed on server
+shutdown.
+
+Usage:
+    from socket_io_ai_client import AI_SERVICE_URL, get_ai_client
+    response = await get_ai_client().post(AI_SERVICE_URL, json=payload, timeout=3.0)
+"""
+
+import logging
+import os
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger('socket_io_ai_client')
+
+AI_SERVICE_URL = os.getenv("AI_SERVICE_URL", "http://127.0.0.1:8000/analyze")
+
+# Connection pool limits for the AI service
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "32"))
+AI_MAX_KEEPALIVE = int(os.getenv("AI_MAX_KEEPALIVE", "16"))
+AI_DEFAULT_TIMEOUT = 30.0
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_ai_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it on first use"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=AI_DEFAULT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=AI_MAX_CONNECTIONS,
+                max_keepalive_connections=AI_MAX_KEEPALIVE,
+            ),
+        )
+        logger.info(f"Created pooled AI service client (max {AI_MAX_CONNECTIONS} connections)")
+    return _client
+
+
+async def close_ai_client() -> None:
+    """Close the shared client (called on server shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,217 @@
+"""
+Binary audio frames for the speaking test.
+
+Newer clients send ``audio_frame`` events carrying raw audio bytes instead of
+base64 text inside JSON. Every frame starts with a small fixed header:
+
+    offset  size  field
+    0       1     version (currently 1)
+    1       1     codec (see CODECS)
+    2       2     reserved
+    4       4     sequence number (uint32, increments per frame)
+    8       4     sample rate in Hz (0 if implied by the codec)
+    12      8     capture timestamp in milliseconds (float64)
+    20      ...   audio payload
+
+All fields are big-endian. Socket.IO delivers the frame as a binary
+attachment, so no base64 decoding happens on either side. A dict payload
+``{"seq", "codec", "sample_rate", "timestamp", "audio": <bytes>}`` is also
+accepted for clients that prefer to keep the header as JSON.
+
+Frames can arrive out of order or not at all; FrameReorderBuffer releases
+them strictly in sequence order and reports gaps.
+"""
+
+import struct
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Union
+
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct("!BBHIId")
+
+# Codec identifiers used in the frame header
+CODECS = {
+    0: "webm-opus",
+    1: "pcm16le",
+    2: "ogg-opus",
+    3: "pcm-f32le",
+}
+CODEC_IDS = {name: codec_id for codec_id, name in CODECS.items()}
+
+# How many frames may be held back waiting for a missing one, and for how long
+DEFAULT_REORDER_WINDOW = 32
+DEFAULT_REORDER_MAX_DELAY = 0.5  # seconds
+
+
+class FrameError(ValueError):
+    """Raised for frames that cannot be parsed"""
+
+
+@dataclass
+class AudioFrame:
+    seq: int
+    codec: str
+    sample_rate: int
+    timestamp_ms: float
+    audio: bytes
+    wire_bytes: int = 0
+
+
+def pack_frame(seq: int, audio: bytes, codec: str = "webm-opus", sample_rate: int = 0,
+               timestamp_ms: Optional[float] = None) -> bytes:
+    """Build a binary frame (used by test clients and benchmarks)"""
+    if timestamp_ms is None:
+        timestamp_ms = time.time() * 1000.0
+    header = FRAME_HEADER.pack(FRAME_VERSION, CODEC_IDS[codec], 0, seq & 0xFFFFFFFF,
+                               sample_rate, timestamp_ms)
+    return header + audio
+
+
+def parse_frame(data: Union[bytes, bytearray, memoryview, Dict[str, Any]]) -> AudioFrame:
+    """
+    Parse an ``audio_frame`` payload in either binary or dict form.
+
+    Raises:
+        FrameError: if the payload is malformed
+    """
+    if isinstance(data, dict):
+        audio = data.get("audio")
+        if not isinstance(audio, (bytes, bytearray)):
+            raise FrameError("audio_frame dict must carry binary 'audio'")
+        try:
+            return AudioFrame(
+                seq=int(data["seq"]),
+                codec=str(data.get("codec", "webm-opus")),
+                sample_rate=int(data.get("sample_rate", 0)),
+                timestamp_ms=float(data.get("timestamp", 0.0)),
+                audio=bytes(audio),
+                wire_bytes=len(audio),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise FrameError(f"Invalid audio_frame header: {e}")
+
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        raise FrameError(f"Unsupported audio_frame payload type {type(data).__name__}")
+    if len(data) < FRAME_HEADER.size:
+        raise FrameError("audio_frame shorter than its header")
+    version, codec_id, _, seq, sample_rate, timestamp_ms = FRAME_HEADER.unpack_from(data)
+    if version != FRAME_VERSION:
+        raise FrameError(f"Unsupported audio_frame version {version}")
+    if codec_id not in CODECS:
+        raise FrameError(f"Unknown audio_frame codec {codec_id}")
+    return AudioFrame(
+        seq=seq,
+        codec=CODECS[codec_id],
+        sample_rate=sample_rate,
+        timestamp_ms=timestamp_ms,
+        audio=bytes(memoryview(data)[FRAME_HEADER.size:]),
+        wire_bytes=len(data),
+    )
+
+
+class FrameReorderBuffer:
+    """
+    Releases frames in sequence order.
+
+    Frames that arrive early are held until the missing ones show up. If more
+    than ``window`` frames are held, or the oldest held frame has waited longer
+    than ``max_delay`` seconds, the missing frames are declared lost and
+    counted as a gap. Duplicates and frames older than the release point are
+    dropped.
+
+    The delay is checked on every push, but frames can stop arriving right
+    after a gap; the owner then calls ``release_expired`` at ``release_at``
+    so held frames do not wait for the end of the test.
+    """
+
+    def __init__(self, window: int = DEFAULT_REORDER_WINDOW, max_delay: float = DEFAULT_REORDER_MAX_DELAY):
+        self.window = window
+        self.max_delay = max_delay
+        self.next_seq: Optional[int] = None
+        self._held: Dict[int, AudioFrame] = {}
+        self._held_since: Optional[float] = None
+        self.frames_in = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.gaps = 0
+        self.lost_frames = 0
+
+    @property
+    def held(self) -> int:
+        return len(self._held)
+
+    @property
+    def release_at(self) -> Optional[float]:
+        """Monotonic time at which held frames are given up waiting for, if any are held"""
+        if not self._held:
+            return None
+        return self._held_since + self.max_delay
+
+    def push(self, frame: AudioFrame, now: Optional[float] = None) -> List[AudioFrame]:
+        """Add a frame and return the frames that are now ready, in order"""
+        now = time.monotonic() if now is None else now
+        self.frames_in += 1
+        if self.next_seq is None:
+            self.next_seq = frame.seq
+
+        if frame.seq < self.next_seq or frame.seq in self._held:
+            self.duplicates += 1
+            return []
+
+        if frame.seq != self.next_seq:
+            self.reordered += 1
+            if not self._held:
+                self._held_since = now
+        self._held[frame.seq] = frame
+
+        ready = self._drain()
+        if self._held and (len(self._held) > self.window or now - self._held_since >= self.max_delay):
+            self._skip_gap()
+            ready.extend(self._drain())
+        if self._held and ready:
+            self._held_since = now
+        return ready
+
+    def release_expired(self, now: Optional[float] = None) -> List[AudioFrame]:
+        """Skip the gap in front of frames held for ``max_delay`` and return what is ready"""
+        now = time.monotonic() if now is None else now
+        ready: List[AudioFrame] = []
+        if self._held and now - self._held_since >= self.max_delay:
+            self._skip_gap()
+            ready = self._drain()
+            if self._held:
+                self._held_since = now
+        return ready
+
+    def flush(self) -> List[AudioFrame]:
+        """Release everything still held (end of test), skipping over gaps"""
+        ready: List[AudioFrame] = []
+        while self._held:
+            self._skip_gap()
+            ready.extend(self._drain())
+        return ready
+
+    def _drain(self) -> List[AudioFrame]:
+        ready = []
+        while self.next_seq in self._held:
+            ready.append(self._held.pop(self.next_seq))
+            self.next_seq += 1
+        return ready
+
+    def _skip_gap(self) -> None:
+        lowest = min(self._held)
+        if lowest > self.next_seq:
+            self.gaps += 1
+            self.lost_frames += lowest - self.next_seq
+            self.next_seq = lowest
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "frames_in": self.frames_in,
+            "reordered": self.reordered,
+            "duplicates": self.duplicates,
+            "gaps": self.gaps,
+            "lost_frames": self.lost_frames,
+            "held": self.held,
+        }
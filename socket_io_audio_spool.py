@@ -0,0 +1,125 @@
+"""
+Disk spool for speaking-test audio.
+
+Each test appends its decoded audio chunks to one spool file instead of
+keeping base64 strings in memory. Only the chunk offsets and a few counters
+stay in RAM; the recording itself lives in the page cache / on disk and is
+read back zero-copy through mmap when the test ends.
+
+Usage:
+    spool = AudioSpool(test_id)
+    spool.append(chunk_bytes)
+    with spool.recording() as audio:   # memoryview over the whole file
+        process(audio)
+    spool.release()                    # close and delete the file
+"""
+
+import logging
+import mmap
+import os
+import tempfile
+import uuid
+from array import array
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger('audio_spool')
+
+# Directory for spool files; defaults to a subdirectory of the system temp dir
+SPOOL_DIR = os.getenv("STT_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "speaking_test_spool")
+
+
+class AudioSpool:
+    """Append-only audio file for a single speaking test"""
+
+    def __init__(self, test_id: Optional[str] = None, directory: Optional[str] = None,
+                 path: Optional[str] = None):
+        """
+        Create a new spool, or reopen an existing spool file when ``path`` is given.
+
+        Args:
+            test_id: Identifier used in the file name
+            directory: Where to create the file (defaults to SPOOL_DIR)
+            path: Existing spool file to reopen for reading/appending
+        """
+        if path is None:
+            directory = directory or SPOOL_DIR
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{test_id or uuid.uuid4().hex}-{uuid.uuid4().hex[:8]}.audio")
+        self.path = path
+        self._fd: Optional[int] = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+        # Start offset of every chunk; array('Q') keeps this at 8 bytes per chunk
+        self.offsets = array('Q')
+        self.size = os.fstat(self._fd).st_size
+        if self.size:
+            # Chunk boundaries are not persisted; a reopened spool is one chunk
+            self.offsets.append(0)
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def released(self) -> bool:
+        return self._fd is None
+
+    def append(self, data: bytes) -> int:
+        """
+        Append one decoded chunk.
+
+        Returns:
+            The byte offset of the chunk within the recording
+        """
+        if self._fd is None:
+            raise ValueError("Audio spool has been released")
+        offset = self.size
+        view = memoryview(data)
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+        self.offsets.append(offset)
+        self.size += len(data)
+        return offset
+
+    @contextmanager
+    def recording(self) -> Iterator[memoryview]:
+        """
+        Map the whole recording read-only and yield it as a memoryview.
+
+        The view is only valid inside the ``with`` block.
+        """
+        if self._fd is None:
+            raise ValueError("Audio spool has been released")
+        if self.size == 0:
+            yield memoryview(b"")
+            return
+        mapped = mmap.mmap(self._fd, self.size, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        try:
+            yield view
+        finally:
+            view.release()
+            mapped.close()
+
+    def read_chunk(self, index: int) -> bytes:
+        """Read back a single chunk by index"""
+        start = self.offsets[index]
+        end = self.offsets[index + 1] if index + 1 < len(self.offsets) else self.size
+        return os.pread(self._fd, end - start, start)
+
+    def detach(self) -> str:
+        """Close the file but keep it on disk (e.g. for a background job)"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        return self.path
+
+    def release(self) -> None:
+        """Close and delete the spool file"""
+        self.detach()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error removing audio spool {self.path}: {e}")
@@ -0,0 +1,196 @@
+"""
+Opt-in traffic capture for the Socket.IO feedback server.
+
+When enabled (``--capture PATH`` or the SOCKET_IO_CAPTURE_PATH environment
+variable) the server appends one compact JSON line per inbound event to a
+capture log. The log is anonymized: session IDs are replaced with salted
+hashes, document content is never written, and only sizes, size deltas and
+relative timestamps are kept. Content hashes can be added with
+``--capture-hash-content`` so repeated documents are still recognizable.
+
+Record format (one JSON object per line, keys kept short on purpose):
+    {"v": 2, "type": "header", "started_at": ..., "hash_content": false}
+    {"s": "<session>", "e": "connect", "t": 0.0, "o": 12.5}
+    {"s": "<session>", "e": "text_update", "t": 1.234, "n": 5120, "d": 12, "h": "<hash>"}
+
+    s - anonymized session key
+    e - event type (connect, disconnect, text_update, highlights_update, ...)
+    t - seconds since the session connected
+    o - seconds since the capture started; only on a session's first record,
+        so replay can start each session at its recorded arrival time
+    n - payload size (characters for documents, items for lists, bytes for audio)
+    d - size delta against the previous event of the same type in the session
+    h - keyed hash of the content (only when hash_content is enabled)
+
+Paths ending in ``.gz`` are written gzip-compressed. The log is replayed with
+socket_io_replay.py.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, IO, List
+
+logger = logging.getLogger('socket_io_capture')
+
+CAPTURE_FORMAT_VERSION = 2
+
+
+class TrafficCapture:
+    """Appends anonymized per-session event streams to a JSONL capture log"""
+
+    def __init__(self, path: str, hash_content: bool = False, flush_every: int = 64):
+        self.path = path
+        self.hash_content = hash_content
+        self.flush_every = max(1, flush_every)
+        # A fresh random salt per capture run so session keys and content
+        # hashes cannot be correlated across runs or reversed by brute force
+        self._salt = os.urandom(16)
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._closed = False
+        self._started = time.monotonic()
+        self.records_written = 0
+
+        opener = gzip.open if path.endswith(".gz") else open
+        self._file: IO[str] = opener(path, "at", encoding="utf-8")
+        self._write_line({
+            "v": CAPTURE_FORMAT_VERSION,
+            "type": "header",
+            "started_at": round(time.time(), 3),
+            "hash_content": hash_content,
+        })
+        logger.info(f"Traffic capture enabled, writing to {path} (hash_content={hash_content})")
+
+    # --- Anonymization helpers ---
+
+    def _session_key(self, sid: str) -> str:
+        return hashlib.blake2b(sid.encode("utf-8"), key=self._salt, digest_size=6).hexdigest()
+
+    def _content_hash(self, content: Any) -> str:
+        if not isinstance(content, (str, bytes)):
+            content = json.dumps(content, sort_keys=True, default=str)
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        return hashlib.blake2b(content, key=self._salt, digest_size=8).hexdigest()
+
+    # --- Recording ---
+
+    def record(self, sid: str, event: str, size: int = 0, content: Any = None) -> None:
+        """
+        Record one inbound event.
+
+        Args:
+            sid: The session ID of the client (never written as-is)
+            event: Event type name
+            size: Payload size used to reproduce the load shape
+            content: Optional raw content; only its keyed hash is stored
+        """
+        if self._closed:
+            return
+
+        now = time.monotonic()
+        session = self._sessions.get(sid)
+        first = session is None
+        if first:
+            session = {"key": self._session_key(sid), "start": now, "last_size": {}}
+            self._sessions[sid] = session
+
+        record: Dict[str, Any] = {
+            "s": session["key"],
+            "e": event,
+            "t": round(now - session["start"], 3),
+        }
+        if first:
+            record["o"] = round(now - self._started, 3)
+        if size:
+            record["n"] = size
+            previous = session["last_size"].get(event)
+            if previous is not None:
+                record["d"] = size - previous
+            session["last_size"][event] = size
+        if self.hash_content and content is not None:
+            record["h"] = self._content_hash(content)
+
+        self._write_line(record)
+
+        if event == "disconnect":
+            self._sessions.pop(sid, None)
+
+    def _write_line(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+        try:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._file.flush()
+            self.records_written += len(self._buffer)
+        except Exception as e:
+            logger.error(f"Error writing traffic capture to {self.path}: {e}")
+        self._buffer.clear()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        """Flush pending records and close the capture file"""
+        with self._lock:
+            if self._closed:
+                return
+            self._flush_locked()
+            self._closed = True
+            self._file.close()
+        logger.info(f"Traffic capture closed: {self.records_written} records written to {self.path}")
+
+
+def load_capture(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Load a capture log and group its records by session.
+
+    Args:
+        path: Path to a .jsonl or .jsonl.gz capture file
+
+    Returns:
+        Mapping of session key to that session's records ordered by time
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    sessions: Dict[str, List[Dict[str, Any]]] = {}
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed capture line {line_no} in {path}")
+                continue
+            if record.get("type") == "header":
+                continue
+            sessions.setdefault(record["s"], []).append(record)
+
+    for records in sessions.values():
+        records.sort(key=lambda r: r.get("t", 0))
+    return sessions
+
+
+def session_offset(records: List[Dict[str, Any]]) -> float:
+    """
+    Seconds between the start of the capture and a session's first event.
+
+    Captures written before format version 2 carry no offset; their sessions
+    all report 0.
+    """
+    return records[0].get("o", 0.0) if records else 0.0
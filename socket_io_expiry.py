@@ -0,0 +1,117 @@
+"""
+Inactivity expiry for speaking tests.
+
+ExpiryScheduler keeps one deadline per key in a dict and a min-heap of
+(deadline, key) entries. ``touch`` only rewrites the dict entry, so it is
+O(1) on every audio chunk. When a heap entry comes due, the runner compares
+it with the key's current deadline. If the key was touched since, it is
+pushed back with its new deadline; otherwise it has expired. The heap
+therefore holds at most one live entry per key, and the runner sleeps
+exactly until the next deadline instead of scanning every test.
+
+Usage:
+    expiry = ExpiryScheduler(timeout=120, name="speaking_tests")
+    expiry.touch(sid)          # on test start and on every chunk
+    expiry.discard(sid)        # when the test ends normally
+    await expiry.run(on_expire)  # background task; on_expire(sid) is awaited
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from socket_io_metrics import metrics
+
+logger = logging.getLogger('expiry')
+
+ExpireCallback = Callable[[Hashable], Awaitable[None]]
+
+
+class ExpiryScheduler:
+    """Fires a callback for keys that were not touched for ``timeout`` seconds"""
+
+    def __init__(self, timeout: float, name: str = "expiry", clock: Callable[[], float] = time.monotonic):
+        self.timeout = timeout
+        self.name = name
+        self.clock = clock
+        self._deadlines: Dict[Hashable, float] = {}
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._in_heap: Set[Hashable] = set()
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def touch(self, key: Hashable) -> None:
+        """Push the key's deadline to ``timeout`` seconds from now"""
+        deadline = self.clock() + self.timeout
+        new_key = key not in self._deadlines
+        self._deadlines[key] = deadline
+        if key not in self._in_heap:
+            self._push(key, deadline)
+            if self._wakeup is not None and self._heap[0][2] == key:
+                # New earliest deadline; let the runner re-arm its sleep
+                self._wakeup.set()
+        if new_key:
+            self._report_size()
+
+    def discard(self, key: Hashable) -> None:
+        """Stop tracking a key; its heap entry is dropped lazily"""
+        if self._deadlines.pop(key, None) is not None:
+            self._report_size()
+
+    def next_deadline(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now: Optional[float] = None) -> List[Hashable]:
+        """Remove and return every key whose deadline has passed"""
+        now = self.clock() if now is None else now
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, key = heapq.heappop(self._heap)
+            self._in_heap.discard(key)
+            deadline = self._deadlines.get(key)
+            if deadline is None:
+                continue  # discarded
+            if deadline > now:
+                self._push(key, deadline)  # touched since this entry was pushed
+                continue
+            del self._deadlines[key]
+            expired.append(key)
+        if expired:
+            self._report_size()
+        return expired
+
+    async def run(self, on_expire: ExpireCallback) -> None:
+        """Sleep until the next deadline and expire due keys, forever"""
+        self._wakeup = asyncio.Event()
+        while True:
+            deadline = self.next_deadline()
+            delay = None if deadline is None else max(0.0, deadline - self.clock())
+            self._wakeup.clear()
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            for key in self.pop_expired():
+                try:
+                    await on_expire(key)
+                except Exception as e:
+                    logger.error(f"Error expiring {key}: {e}", exc_info=True)
+
+    def _push(self, key: Hashable, deadline: float) -> None:
+        self._in_heap.add(key)
+        # The counter breaks deadline ties so keys are never compared
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+
+    def _report_size(self) -> None:
+        metrics.set_gauge("expiry_scheduled", len(self._deadlines), scheduler=self.name)
@@ -0,0 +1,255 @@
+"""
+Local fluency analytics for speaking-test recordings.
+
+Works on the spooled PCM of a test with NumPy, without any network call.
+One vectorized pass over 20 ms frames yields a speech/silence mask, from
+which run-length encoding gives:
+
+    speech rate           words per minute over the speaking span
+    articulation rate     words per minute of actual phonation
+    pauses                count, mean and total duration, long (>= 1 s) pauses
+    mean length of run    words per run between pauses
+    pause histogram       silent gaps bucketed by duration
+    loudness stability    spread of frame loudness while speaking
+
+Speech frames are those clearly above the recording's noise floor, which is
+the quietest stretch of a few hundred milliseconds (minimum statistics). A
+recording with hardly any real silence therefore does not get its quietest
+speech marked as pauses, as it would with a fixed share of frames.
+
+Filled pauses ("um", "uh") are not silent; ``filler_metrics`` counts them
+from the transcript (the websocket STT backend asks Deepgram to keep them).
+
+``analyze_batch`` frames many recordings in one pass over their
+concatenated samples. When the audio is compressed (webm/opus) and cannot be
+decoded here, ``analyze_segments`` derives the timing metrics from the STT
+segment timestamps instead.
+
+The flat ``scores`` dict of a result is what the report store keeps in its
+scores table.
+"""
+
+import logging
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger('fluency')
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FRAME_MS = 20
+# Silent gaps shorter than this are part of the speech run
+PAUSE_MIN_S = 0.25
+LONG_PAUSE_S = 1.0
+# Frames this far above the recording's noise floor count as speech ...
+SPEECH_MARGIN_DB = 12.0
+# ... clamped to this range: never below the absolute floor, and loud frames
+# are speech even when the noise floor estimate is high
+ABSOLUTE_FLOOR_DBFS = -55.0
+SPEECH_CEILING_DBFS = -35.0
+# The noise floor is the quietest stretch of this length
+NOISE_WINDOW_MS = 300
+
+# Filled-pause tokens as transcribed by STT
+FILLER_TOKENS = frozenset(("uh", "um", "uhm", "umm", "er", "erm", "ah", "hmm", "mm"))
+
+PAUSE_BINS = (0.25, 0.5, 1.0, 2.0, float("inf"))
+
+PCM_DTYPES = {
+    "pcm16le": ("<i2", 32768.0),
+    "pcm-f32le": ("<f4", 1.0),
+}
+
+
+def available() -> bool:
+    return np is not None
+
+
+def _runs(mask: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Run-length encode a boolean mask: (values, starts, lengths)"""
+    if mask.size == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return np.zeros(0, dtype=bool), empty, empty
+    change = np.flatnonzero(mask[1:] != mask[:-1]) + 1
+    starts = np.concatenate(([0], change))
+    lengths = np.diff(np.concatenate((starts, [mask.size])))
+    return mask[starts], starts, lengths
+
+
+def _frame_energy_db(samples: "np.ndarray", frame_size: int) -> "np.ndarray":
+    usable = samples.size - samples.size % frame_size
+    frames = samples[:usable].reshape(-1, frame_size)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-9))
+
+
+def _noise_floor_db(energy_db: "np.ndarray") -> float:
+    """Mean energy of the quietest NOISE_WINDOW_MS stretch of the recording"""
+    window = min(energy_db.size, max(1, NOISE_WINDOW_MS // FRAME_MS))
+    cumulative = np.concatenate(([0.0], np.cumsum(energy_db, dtype=np.float64)))
+    return float(np.min((cumulative[window:] - cumulative[:-window]) / window))
+
+
+def _speech_mask(energy_db: "np.ndarray") -> "np.ndarray":
+    if energy_db.size == 0:
+        return np.zeros(0, dtype=bool)
+    threshold = min(max(_noise_floor_db(energy_db) + SPEECH_MARGIN_DB, ABSOLUTE_FLOOR_DBFS),
+                    SPEECH_CEILING_DBFS)
+    mask = energy_db > threshold
+    # Close gaps shorter than a pause so short stops stay inside a run
+    values, starts, lengths = _runs(mask)
+    min_pause_frames = int(PAUSE_MIN_S * 1000 / FRAME_MS)
+    short_gaps = (~values) & (lengths < min_pause_frames)
+    short_gaps[0] = short_gaps[-1] = False  # leading/trailing silence is not a gap
+    return np.repeat(values | short_gaps, lengths)
+
+
+def _timing_metrics(pauses: "np.ndarray", speaking_span: float, phonation: float,
+                    word_count: int) -> Dict[str, Any]:
+    """Metrics shared by the audio and the segment-timestamp paths"""
+    buckets = len(PAUSE_BINS) - 1
+    index = np.searchsorted(PAUSE_BINS, pauses, side="right") - 1
+    histogram = np.bincount(index[(index >= 0) & (index < buckets)], minlength=buckets)
+    labels = [f"{low:g}-{high:g}s" if high != float("inf") else f">={low:g}s"
+              for low, high in zip(PAUSE_BINS[:-1], PAUSE_BINS[1:])]
+    return {
+        "speaking_span_s": round(speaking_span, 3),
+        "phonation_time_s": round(phonation, 3),
+        "speech_rate_wpm": round(word_count / speaking_span * 60.0, 1) if speaking_span > 0 else 0.0,
+        "articulation_rate_wpm": round(word_count / phonation * 60.0, 1) if phonation > 0 else 0.0,
+        "pause_count": int(pauses.size),
+        "long_pause_count": int(np.count_nonzero(pauses >= LONG_PAUSE_S)),
+        "mean_pause_s": round(float(pauses.mean()), 3) if pauses.size else 0.0,
+        "total_pause_s": round(float(pauses.sum()), 3),
+        "mean_length_of_run": round(word_count / (pauses.size + 1), 2) if word_count else 0.0,
+        "pause_histogram": dict(zip(labels, (int(n) for n in histogram))),
+    }
+
+
+def _metrics_from_energy(energy_db: "np.ndarray", word_count: int, duration: float) -> Dict[str, Any]:
+    frame_s = FRAME_MS / 1000.0
+    mask = _speech_mask(energy_db)
+    values, starts, lengths = _runs(mask)
+    speech_runs = np.flatnonzero(values)
+    if speech_runs.size == 0:
+        result = _timing_metrics(np.zeros(0), 0.0, 0.0, word_count)
+        result.update({"duration_s": round(duration, 3), "speech_ratio": 0.0,
+                       "loudness_std_db": 0.0, "loudness_range_db": 0.0, "source": "audio"})
+        return result
+
+    first, last = speech_runs[0], speech_runs[-1]
+    inner = slice(first, last + 1)
+    inner_values, inner_lengths = values[inner], lengths[inner]
+    pauses = inner_lengths[~inner_values] * frame_s
+    phonation = float(inner_lengths[inner_values].sum()) * frame_s
+    span = float(inner_lengths.sum()) * frame_s
+
+    speech_db = energy_db[mask]
+    result = _timing_metrics(pauses, span, phonation, word_count)
+    result.update({
+        "duration_s": round(duration, 3),
+        "speech_ratio": round(phonation / duration, 3) if duration else 0.0,
+        "loudness_std_db": round(float(speech_db.std()), 2),
+        "loudness_range_db": round(float(np.percentile(speech_db, 95) - np.percentile(speech_db, 5)), 2),
+        "source": "audio",
+    })
+    return result
+
+
+def pcm_samples(audio, codec: str) -> Optional["np.ndarray"]:
+    """View raw PCM bytes (or a memoryview over the spool) as float32 samples"""
+    if np is None or codec not in PCM_DTYPES:
+        return None
+    dtype, scale = PCM_DTYPES[codec]
+    itemsize = np.dtype(dtype).itemsize
+    raw = np.frombuffer(audio, dtype=np.uint8, count=len(audio) - len(audio) % itemsize)
+    return raw.view(dtype).astype(np.float32) / scale
+
+
+def analyze_pcm(audio, codec: str, sample_rate: int, word_count: int = 0) -> Optional[Dict[str, Any]]:
+    """Fluency metrics for one PCM recording, or None if it cannot be decoded"""
+    samples = pcm_samples(audio, codec)
+    if samples is None or not sample_rate:
+        return None
+    frame_size = sample_rate * FRAME_MS // 1000
+    energy_db = _frame_energy_db(samples, frame_size)
+    return _metrics_from_energy(energy_db, word_count, samples.size / sample_rate)
+
+
+def analyze_batch(recordings: Sequence[Tuple[Any, str, int, int]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Analyze many recordings at once.
+
+    Args:
+        recordings: (audio, codec, sample_rate, word_count) tuples; recordings
+                    sharing a sample rate are framed together in one pass
+
+    Returns:
+        One metrics dict (or None) per recording, in input order
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(recordings)
+    if np is None:
+        return results
+    by_rate: Dict[int, List[Tuple[int, "np.ndarray"]]] = {}
+    for index, (audio, codec, sample_rate, _) in enumerate(recordings):
+        samples = pcm_samples(audio, codec)
+        if samples is not None and sample_rate:
+            by_rate.setdefault(sample_rate, []).append((index, samples))
+
+    for sample_rate, items in by_rate.items():
+        frame_size = sample_rate * FRAME_MS // 1000
+        # Trim each recording to whole frames so frames never straddle two
+        trimmed = [samples[:samples.size - samples.size % frame_size] for _, samples in items]
+        energy_db = _frame_energy_db(np.concatenate(trimmed), frame_size)
+        bounds = np.cumsum([t.size // frame_size for t in trimmed])[:-1]
+        for (index, samples), energy in zip(items, np.split(energy_db, bounds)):
+            word_count = recordings[index][3]
+            results[index] = _metrics_from_energy(energy, word_count, samples.size / sample_rate)
+    return results
+
+
+def analyze_segments(segments: Sequence[Sequence[Any]], word_count: int) -> Optional[Dict[str, Any]]:
+    """
+    Timing metrics from STT segment timestamps ([text, start, end, confidence]
+    items, as produced by TranscriptLog.to_list()) when the audio is not PCM.
+    """
+    if np is None or not segments:
+        return None
+    times = np.array([[float(s[1]), float(s[2])] for s in segments], dtype=np.float64)
+    if not np.any(times[:, 1] > 0):
+        return None  # backend did not report timestamps
+    starts, ends = times[:, 0], times[:, 1]
+    gaps = starts[1:] - ends[:-1]
+    pauses = gaps[gaps >= PAUSE_MIN_S]
+    span = float(ends[-1] - starts[0])
+    phonation = float(np.sum(ends - starts))
+    result = _timing_metrics(pauses, span, phonation, word_count)
+    result["source"] = "segments"
+    return result
+
+
+def filler_metrics(transcript: str, speaking_span: float = 0.0) -> Dict[str, Any]:
+    """Filled pauses in the transcript, and their rate over the speaking span"""
+    words = [word.strip(".,!?;:\"'-").lower() for word in transcript.split()]
+    count = sum(1 for word in words if word in FILLER_TOKENS)
+    return {
+        "filler_count": count,
+        "filler_ratio": round(count / len(words), 3) if words else 0.0,
+        "fillers_per_minute": round(count / speaking_span * 60.0, 1) if speaking_span > 0 else 0.0,
+    }
+
+
+def to_scores(metrics: Dict[str, Any]) -> Dict[str, float]:
+    """Flatten a metrics dict into name -> number pairs for the report store"""
+    scores: Dict[str, float] = {}
+    for name, value in metrics.items():
+        if isinstance(value, bool) or name == "source":
+            continue
+        if isinstance(value, (int, float)):
+            scores[name] = float(value)
+        elif isinstance(value, dict):
+            for bucket, count in value.items():
+                scores[f"{name}[{bucket}]"] = float(count)
+    return scores
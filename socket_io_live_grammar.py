@@ -0,0 +1,176 @@
+"""
+Incremental live grammar checking for the speaking test.
+
+Each test owns a LiveGrammarStage. Final STT segments are fed into it; a
+check is triggered every ``every_words`` new words or when a segment ends a
+sentence. A check sends only the trailing window of the transcript to the AI
+service, shifts the returned error positions by the window's offset in the
+full transcript, and emits only highlights that were not sent before as a
+``live_grammar_highlight`` delta.
+
+Checks run in a background task so STT results are never blocked on the AI
+service. At most one request per test is in flight, requests are spaced at
+least ``min_interval`` seconds apart, and triggers that arrive meanwhile are
+coalesced into a single follow-up check.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from socket_io_ai_client import AI_SERVICE_URL, get_ai_client
+from socket_io_metrics import metrics
+from socket_io_transcript import TranscriptLog
+
+logger = logging.getLogger('live_grammar')
+
+# Trigger a check after this many new words (or at a sentence end)
+LIVE_GRAMMAR_EVERY_WORDS = 8
+
+# Characters of trailing transcript sent with each check
+LIVE_GRAMMAR_WINDOW_CHARS = 400
+
+# Minimum spacing between two checks of the same test, in seconds
+LIVE_GRAMMAR_MIN_INTERVAL = 2.0
+
+# Short timeout for real-time checks
+LIVE_GRAMMAR_TIMEOUT = 3.0
+
+SENTENCE_ENDINGS = (".", "?", "!")
+
+HighlightKey = Tuple[int, int, str, str]
+
+
+def trailing_window(transcript: TranscriptLog, window_chars: int) -> Tuple[int, str]:
+    """
+    Return ``(offset, window)`` for the last ``window_chars`` characters of
+    the transcript, moved forward to a word boundary so no word is cut in half.
+    Only the trailing segments are joined.
+    """
+    base, text = transcript.tail(window_chars)
+    if len(text) <= window_chars:
+        return base, text
+    start = len(text) - window_chars
+    space = text.find(" ", start)
+    if space != -1 and space + 1 < len(text):
+        start = space + 1
+    return base + start, text[start:]
+
+
+class LiveGrammarStage:
+    """Rolling-window grammar checks for one speaking test"""
+
+    def __init__(self, sio, sid: str, transcript: TranscriptLog, topic: str = "Speaking Test",
+                 every_words: int = LIVE_GRAMMAR_EVERY_WORDS,
+                 window_chars: int = LIVE_GRAMMAR_WINDOW_CHARS,
+                 min_interval: float = LIVE_GRAMMAR_MIN_INTERVAL):
+        self.sio = sio
+        self.sid = sid
+        self.transcript = transcript
+        self.topic = topic
+        self.every_words = every_words
+        self.window_chars = window_chars
+        self.min_interval = min_interval
+        self.words_since_check = 0
+        self.last_request = 0.0
+        self.pending = False
+        self.sent: Dict[HighlightKey, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def feed(self, segment: str) -> None:
+        """Account for a new final segment and schedule a check if one is due"""
+        self.words_since_check += len(segment.split())
+        at_sentence_end = segment.rstrip().endswith(SENTENCE_ENDINGS)
+        if self.words_since_check < self.every_words and not at_sentence_end:
+            return
+        self.words_since_check = 0
+        self.pending = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        else:
+            metrics.inc("live_grammar_coalesced")
+
+    def cancel(self) -> None:
+        """Stop any scheduled or running check"""
+        self.pending = False
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def _run(self) -> None:
+        try:
+            while self.pending:
+                wait = self.min_interval - (time.monotonic() - self.last_request)
+                if wait > 0:
+                    metrics.inc("live_grammar_rate_limited")
+                    await asyncio.sleep(wait)
+                self.pending = False
+                self.last_request = time.monotonic()
+                await self.check()
+        except asyncio.CancelledError:
+            pass
+
+    async def check(self) -> List[Dict[str, Any]]:
+        """Analyze the trailing window and emit new highlights"""
+        offset, window = trailing_window(self.transcript, self.window_chars)
+        if len(window.split()) < 3:
+            return []
+
+        ai_request_payload = {
+            "transcripts": [{
+                "topic": self.topic,
+                "paragraph": window
+            }]
+        }
+        try:
+            with metrics.timer("live_grammar_ms"):
+                response = await get_ai_client().post(
+                    AI_SERVICE_URL, json=ai_request_payload, timeout=LIVE_GRAMMAR_TIMEOUT
+                )
+            metrics.inc("live_grammar_checks", status=response.status_code)
+            if response.status_code != 200:
+                return []
+            ai_results = response.json()
+        except Exception as e:
+            metrics.inc("live_grammar_checks", status="error")
+            logger.error(f"Error processing grammar for {self.sid}: {e}")
+            return []
+
+        highlights = self._new_highlights(ai_results, offset)
+        if highlights:
+            await self.sio.emit('live_grammar_highlight', highlights, room=self.sid)
+            logger.info(f"Sent {len(highlights)} new grammar highlights to {self.sid}")
+        return highlights
+
+    def _new_highlights(self, ai_results: Dict[str, Any], offset: int) -> List[Dict[str, Any]]:
+        """Shift errors to transcript positions and keep the ones not sent yet"""
+        results = ai_results.get("results") or []
+        if not results:
+            return []
+        seen: Set[HighlightKey] = set()
+        highlights = []
+        for error in results[0].get("errors", []):
+            start = offset + int(error.get("start", 0))
+            end = offset + int(error.get("end", 0))
+            wrong = error.get("wrong_version", "")
+            correct = error.get("correct_version", "")
+            key = (start, end, wrong, correct)
+            if key in self.sent or key in seen:
+                continue
+            seen.add(key)
+            highlight_id = str(uuid.uuid4())
+            self.sent[key] = highlight_id
+            audio_start, audio_end = self.transcript.span_for(start, end)
+            highlights.append({
+                "id": highlight_id,
+                "start": start,
+                "end": end,
+                "audioStart": round(audio_start, 3),
+                "audioEnd": round(audio_end, 3),
+                "type": "grammar",
+                "message": f"Grammar error: {wrong}",
+                "wrongVersion": wrong,
+                "correctVersion": correct
+            })
+        return highlights
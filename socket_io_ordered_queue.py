@@ -0,0 +1,162 @@
+"""
+Per-test ordered work queue for inbound audio.
+
+python-socketio runs every event handler in its own task, so the work for
+chunk N+1 can finish before chunk N. The queue splits each item into two
+steps:
+
+    prepare  - runs concurrently for up to ``depth`` items (e.g. a
+               request-based STT call)
+    commit   - runs strictly in submission order, one at a time (append
+               transcript segments, confirm the chunk)
+
+Items submitted while ``depth`` items are in flight wait in order and are
+started as earlier ones commit. The first such item marks the queue
+saturated and ``on_pressure(True)`` is called. ``on_pressure(False)``
+follows once it has drained to half its depth.
+The current depth is exported as the ``audio_queue_depth{sid}`` gauge.
+
+A client that ignores the pause would grow the waiting line without limit,
+so at most ``max_waiting`` items wait. Further items are refused: ``submit``
+returns None and ``on_error`` is called with a QueueOverflow. A prepare or
+commit step that raises is also passed to ``on_error``; the items behind it
+still commit.
+
+Usage:
+    queue = OrderedWorkQueue(sid, depth=4, on_pressure=notify, on_error=report)
+    queue.submit(lambda: stream.transcribe(audio), commit)
+    await queue.drain()
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional, Tuple
+
+from socket_io_metrics import metrics
+
+logger = logging.getLogger('ordered_queue')
+
+# Items prepared concurrently per test
+AUDIO_PIPELINE_DEPTH = int(os.getenv("AUDIO_PIPELINE_DEPTH", "4"))
+# Items allowed to wait behind those in flight, per test
+AUDIO_QUEUE_MAX_WAITING = int(os.getenv("AUDIO_QUEUE_MAX_WAITING", "64"))
+
+Prepare = Callable[[], Awaitable[Any]]
+Commit = Callable[[Any], Awaitable[None]]
+PressureCallback = Callable[[bool, int], Awaitable[None]]
+ErrorCallback = Callable[[Exception], Awaitable[None]]
+
+
+class QueueOverflow(RuntimeError):
+    """An item was refused because too many items are already waiting"""
+
+
+class OrderedWorkQueue:
+    """Concurrent prepare, in-order commit, bounded in-flight work"""
+
+    def __init__(self, key: str, depth: int = AUDIO_PIPELINE_DEPTH,
+                 on_pressure: Optional[PressureCallback] = None,
+                 on_error: Optional[ErrorCallback] = None,
+                 max_waiting: int = AUDIO_QUEUE_MAX_WAITING):
+        self.key = key
+        self.depth = max(1, depth)
+        self.max_waiting = max(0, max_waiting)
+        self.on_pressure = on_pressure
+        self.on_error = on_error
+        self.saturated = False
+        self.submitted = 0
+        self.committed = 0
+        self.failed = 0
+        self.refused = 0
+        self._in_flight: Deque[Tuple[asyncio.Future, Commit]] = deque()
+        self._waiting: Deque[Tuple[Prepare, Commit]] = deque()
+        self._committer: Optional[asyncio.Task] = None
+
+    @property
+    def queued(self) -> int:
+        """Items submitted but not committed yet"""
+        return len(self._in_flight) + len(self._waiting)
+
+    def submit(self, prepare: Prepare, commit: Commit) -> Optional[int]:
+        """
+        Queue an item; returns its sequence number, or None if it was refused.
+
+        Must be called in the order items should be committed. It does not
+        block; when the queue is full the item waits its turn, unless
+        ``max_waiting`` items are waiting already.
+        """
+        if len(self._in_flight) >= self.depth and len(self._waiting) >= self.max_waiting:
+            self.refused += 1
+            metrics.inc("audio_queue_refused")
+            self._report_error(QueueOverflow(f"{self.queued} items pending for {self.key}"))
+            return None
+        seq = self.submitted
+        self.submitted += 1
+        if len(self._in_flight) < self.depth:
+            self._start(prepare, commit)
+        else:
+            self._waiting.append((prepare, commit))
+            if not self.saturated:
+                self.saturated = True
+                metrics.inc("audio_backpressure", state="saturated")
+                self._notify(True)
+        self._report_depth()
+        if self._committer is None or self._committer.done():
+            self._committer = asyncio.create_task(self._commit_loop())
+        return seq
+
+    def _start(self, prepare: Prepare, commit: Commit) -> None:
+        # Started in submission order, so the synchronous part of each
+        # prepare step also runs in order
+        self._in_flight.append((asyncio.ensure_future(prepare()), commit))
+
+    def _notify(self, saturated: bool) -> None:
+        if self.on_pressure is not None:
+            asyncio.ensure_future(self.on_pressure(saturated, self.queued))
+
+    def _report_error(self, error: Exception) -> None:
+        if self.on_error is not None:
+            asyncio.ensure_future(self.on_error(error))
+
+    async def _commit_loop(self) -> None:
+        while self._in_flight:
+            future, commit = self._in_flight[0]
+            try:
+                result = await future
+                await commit(result)
+                self.committed += 1
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error processing queued item for {self.key}: {e}", exc_info=True)
+                self._report_error(e)
+            self._in_flight.popleft()
+            if self._waiting:
+                self._start(*self._waiting.popleft())
+            if self.saturated and not self._waiting and len(self._in_flight) <= self.depth // 2:
+                self.saturated = False
+                metrics.inc("audio_backpressure", state="released")
+                self._notify(False)
+            self._report_depth()
+
+    def _report_depth(self) -> None:
+        metrics.set_gauge("audio_queue_depth", self.queued, sid=self.key)
+
+    async def drain(self) -> None:
+        """Wait until every submitted item has been committed"""
+        while self._committer is not None and not self._committer.done():
+            await asyncio.shield(self._committer)
+
+    def cancel(self) -> None:
+        """Drop all pending work and stop exporting the depth"""
+        self._waiting.clear()
+        for future, _ in self._in_flight:
+            future.cancel()
+        if self._committer is not None and not self._committer.done():
+            self._committer.cancel()
+        self._in_flight.clear()
+        metrics.remove_gauge("audio_queue_depth", sid=self.key)
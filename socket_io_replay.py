@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Accelerated replay of captured Socket.IO traffic.
+
+Reads a capture log written by the server's ``--capture`` mode (see
+socket_io_capture.py) and drives a running socket_io_server.py with the same
+sessions, preserving the recorded session arrival times and inter-event timing
+scaled by ``--speed``.
+Because captures never contain document text, documents are synthesized with
+the recorded sizes; identical content hashes produce identical documents.
+
+At the end it prints client-observed latency percentiles per event type
+(text_update -> ai_suggestion) together with the server's own metrics
+snapshot, so load shapes seen in production can be reproduced locally.
+
+Usage:
+    python3 socket_io_replay.py capture.jsonl --url http://localhost:8001 --speed 20
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import sys
+import time
+from typing import Dict, Any, List, Optional
+
+import socketio
+
+from socket_io_capture import load_capture, session_offset
+from socket_io_metrics import MetricsRegistry
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('socket_io_replay')
+
+MIN_SPEED = 1.0
+MAX_SPEED = 100.0
+
+FILLER_WORDS = (
+    "the student argues that however important the evidence may be it is "
+    "therefore significant to consider every perspective before concluding"
+).split()
+
+
+def synthesize_document(size: int, seed: str = "") -> str:
+    """
+    Build an HTML document of exactly ``size`` characters.
+
+    The same (size, seed) pair always yields the same document, so sessions
+    that re-sent identical content keep doing so during replay.
+    """
+    if size <= 0:
+        return ""
+    digest = hashlib.sha256(seed.encode("utf-8")).digest()
+    offset = digest[0] % len(FILLER_WORDS)
+    body_size = max(0, size - len("<p></p>"))
+    words: List[str] = []
+    length = 0
+    i = offset
+    while length < body_size:
+        word = FILLER_WORDS[i % len(FILLER_WORDS)]
+        words.append(word)
+        length += len(word) + 1
+        i += 1
+    body = " ".join(words)[:body_size]
+    return f"<p>{body}</p>"[:size]
+
+
+class ReplaySession:
+    """Drives one captured session against the server"""
+
+    def __init__(self, key: str, records: List[Dict[str, Any]], url: str,
+                 speed: float, results: MetricsRegistry, response_timeout: float):
+        self.key = key
+        self.records = records
+        self.url = url
+        self.speed = speed
+        self.results = results
+        self.response_timeout = response_timeout
+        self.client = socketio.AsyncClient(reconnection=False)
+        # Send times of text_updates still waiting for their ai_suggestion
+        self.pending: List[float] = []
+        self.all_answered = asyncio.Event()
+        self.all_answered.set()
+        self.client.on('ai_suggestion', self.on_ai_suggestion)
+
+    async def on_ai_suggestion(self, data):
+        if not self.pending:
+            return
+        sent_at = self.pending.pop(0)
+        self.results.observe("event_latency_ms", (time.perf_counter() - sent_at) * 1000.0, event='text_update')
+        if not self.pending:
+            self.all_answered.set()
+
+    async def run(self) -> None:
+        try:
+            await self.client.connect(self.url, transports=['websocket'])
+        except Exception as e:
+            logger.error(f"Session {self.key}: could not connect to {self.url}: {e}")
+            self.results.inc("replay_errors", reason="connect")
+            return
+
+        start = time.perf_counter()
+        try:
+            for record in self.records:
+                event = record.get("e")
+                if event in ("connect", "disconnect"):
+                    continue
+
+                # Wait until the scaled timestamp of this event
+                due = start + record.get("t", 0) / self.speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.results.observe("schedule_lag_ms", -delay * 1000.0)
+
+                await self.send(record)
+
+            # Give outstanding requests a chance to be answered
+            try:
+                await asyncio.wait_for(self.all_answered.wait(), timeout=self.response_timeout)
+            except asyncio.TimeoutError:
+                self.results.inc("replay_errors", value=len(self.pending), reason="timeout")
+        finally:
+            await self.client.disconnect()
+
+    async def send(self, record: Dict[str, Any]) -> None:
+        event = record["e"]
+        size = record.get("n", 0)
+        seed = record.get("h") or f"{self.key}:{size}"
+        self.results.inc("events_sent", event=event)
+
+        if event == "text_update":
+            content = synthesize_document(size, seed)
+            self.pending.append(time.perf_counter())
+            self.all_answered.clear()
+            await self.client.emit('message', {
+                'type': 'text_update',
+                'content': content,
+                'timestamp': int(time.time() * 1000)
+            })
+        elif event == "highlights_update":
+            highlights = [{
+                "id": f"replay-{i}",
+                "start": i * 10,
+                "end": i * 10 + 5,
+                "type": "suggestion",
+                "message": "Replayed highlight"
+            } for i in range(size)]
+            await self.client.emit('message', {'type': 'highlights_update', 'highlights': highlights})
+        else:
+            logger.debug(f"Session {self.key}: skipping unsupported event type {event}")
+
+
+async def fetch_server_metrics(url: str) -> Optional[Dict[str, Any]]:
+    """Ask the server for its metrics snapshot"""
+    client = socketio.AsyncClient(reconnection=False)
+    try:
+        await client.connect(url, transports=['websocket'])
+        return await client.call('get_server_metrics', {}, timeout=5)
+    except Exception as e:
+        logger.warning(f"Could not fetch server metrics from {url}: {e}")
+        return None
+    finally:
+        if client.connected:
+            await client.disconnect()
+
+
+async def replay(args) -> Dict[str, Any]:
+    sessions = load_capture(args.capture)
+    keys = sorted(sessions, key=lambda k: session_offset(sessions[k]))
+    if args.max_sessions:
+        keys = keys[:args.max_sessions]
+    if keys and not any("o" in sessions[k][0] for k in keys):
+        logger.warning(f"{args.capture} has no session arrival offsets (older capture format); "
+                       f"all sessions start at once")
+    logger.info(f"Replaying {len(keys)} sessions from {args.capture} at {args.speed}x against {args.url}")
+
+    results = MetricsRegistry()
+    server_before = await fetch_server_metrics(args.url)
+
+    # --concurrency is a safety cap for the replaying machine, not a queue:
+    # a session arriving while the cap is reached is skipped and counted
+    # rather than delayed, so the recorded arrival timeline is kept
+    active = 0
+    skipped = 0
+
+    async def run_session(key: str, due: float) -> None:
+        nonlocal active, skipped
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            results.observe("session_start_lag_ms", -delay * 1000.0)
+        if args.concurrency and active >= args.concurrency:
+            results.inc("replay_errors", reason="concurrency")
+            skipped += 1
+            return
+        active += 1
+        try:
+            await ReplaySession(key, sessions[key], args.url, args.speed,
+                                results, args.response_timeout).run()
+        finally:
+            active -= 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_session(k, started + session_offset(sessions[k]) / args.speed) for k in keys))
+    elapsed = time.perf_counter() - started
+
+    if skipped:
+        logger.warning(f"Skipped {skipped} sessions that arrived while {args.concurrency} were connected; "
+                       f"raise --concurrency to replay them")
+
+    return {
+        "capture": args.capture,
+        "sessions": len(keys),
+        "speed": args.speed,
+        "wall_time_s": round(elapsed, 3),
+        "client": results.snapshot(),
+        "server_before": server_before,
+        "server_after": await fetch_server_metrics(args.url),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n--- REPLAY REPORT ({report['sessions']} sessions, {report['speed']}x, {report['wall_time_s']}s) ---")
+    print(f"{'metric':<45} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name, hist in sorted(report["client"]["histograms"].items()):
+        if not hist.get("count"):
+            continue
+        print(f"{name:<45} {hist['count']:>7} {hist['p50']:>9} {hist['p95']:>9} {hist['p99']:>9} {hist['max']:>9}")
+    for name, value in sorted(report["client"]["counters"].items()):
+        print(f"{name:<45} {value:>7}")
+
+    server = report.get("server_after")
+    if server:
+        print("\n--- SERVER METRICS ---")
+        for name, hist in sorted(server.get("histograms", {}).items()):
+            if hist.get("count"):
+                print(f"{name:<45} {hist['count']:>7} {hist['p50']:>9} {hist['p95']:>9} {hist['p99']:>9} {hist['max']:>9}")
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Replay captured Socket.IO traffic against a server')
+    parser.add_argument('capture', help='Capture log written by socket_io_server.py --capture')
+    parser.add_argument('--url', default='http://localhost:8001', help='Socket.IO server URL')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help=f'Replay speed multiplier ({MIN_SPEED:g}-{MAX_SPEED:g})')
+    parser.add_argument('--max-sessions', type=int, default=0, help='Replay at most this many sessions')
+    parser.add_argument('--concurrency', type=int, default=100, help='Maximum sessions connected at once; later arrivals are skipped (0 = no limit)')
+    parser.add_argument('--response-timeout', type=float, default=30.0,
+                        help='Seconds to wait for outstanding responses at the end of a session')
+    parser.add_argument('--json', dest='json_out', help='Also write the full report as JSON to this file')
+    args = parser.parse_args()
+    if not MIN_SPEED <= args.speed <= MAX_SPEED:
+        parser.error(f"--speed must be between {MIN_SPEED:g} and {MAX_SPEED:g}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        report = asyncio.run(replay(args))
+    except KeyboardInterrupt:
+        logger.info("Replay stopped by user")
+        sys.exit(1)
+
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote replay report to {args.json_out}")
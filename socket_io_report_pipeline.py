@@ -0,0 +1,475 @@
+"""
+Background pipeline that turns a finished speaking test into a report.
+
+When a test ends, the STT handlers hand the job its transcript and its
+detached audio spool file, and return immediately. Jobs are written to a
+small SQLite queue first, so a restart does not lose them, and are processed
+by a fixed number of workers. Ending hundreds of tests at once therefore
+puts at most ``workers`` requests on the AI service.
+
+The in-memory queue only carries job ids and holds at most
+REPORT_QUEUE_SIZE of them. Jobs that do not fit stay queued in SQLite and
+are pulled in as workers free up. SQLite calls run in a worker thread, off
+the event loop. A failed job is retried after a jittered, doubling backoff.
+
+Each job runs four timed stages:
+
+    assemble  - map the spooled recording and collect audio/transcript stats
+    measure   - local fluency metrics from the PCM (socket_io_fluency.py)
+    analyze   - full-transcript analysis by the AI service
+    store     - persist the report, with the fluency scores, in the SQLite
+                report store
+
+``report_progress`` events ({reportId, stage, status}) are sent to the test's
+sid as stages start and finish, followed by ``test_completed_summary``.
+
+Usage:
+    pipeline = ReportPipeline()
+    pipeline.start(sio)
+    report_id = await pipeline.submit(sid, topic_id, transcript, spool.path, extra, user_id=user_id,
+                                audio_format=(codec, sample_rate))
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from socket_io_ai_client import AI_SERVICE_URL, get_ai_client
+from socket_io_audio_spool import AudioSpool
+from socket_io_metrics import metrics
+from socket_io_report_store import ReportStore
+from socket_io_transcript import TranscriptLog
+
+logger = logging.getLogger('report_pipeline')
+
+# Number of jobs processed concurrently (and thus concurrent AI requests)
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "4"))
+
+# Persistent job queue location
+REPORT_QUEUE_PATH = os.getenv("REPORT_QUEUE_PATH") or os.path.join(tempfile.gettempdir(), "speaking_report_jobs.sqlite3")
+
+# Job ids held in memory; the rest wait in SQLite until there is room
+REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", "256"))
+
+# Attempts per job before it is marked failed
+REPORT_MAX_ATTEMPTS = 3
+
+# Retry n waits a random time up to REPORT_RETRY_BACKOFF * 2**(n - 1) seconds
+REPORT_RETRY_BACKOFF = float(os.getenv("REPORT_RETRY_BACKOFF", "2.0"))
+
+ANALYSIS_TIMEOUT = 30.0
+
+STAGES = ("assemble", "measure", "analyze", "store")
+
+
+def retry_delay(attempts: int, base: float = REPORT_RETRY_BACKOFF) -> float:
+    """Full-jitter backoff before the retry that follows ``attempts`` failed attempts"""
+    return random.uniform(0.0, base * (2 ** max(0, attempts - 1)))
+
+
+class JobQueue:
+    """
+    SQLite-backed job table; the asyncio queue only carries job ids.
+
+    Methods block and are called through asyncio.to_thread; a lock
+    serializes them on the shared connection.
+    """
+
+    def __init__(self, path: str = REPORT_QUEUE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " report_id TEXT PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def add(self, report_id: str, payload: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self.db.execute(
+                "INSERT INTO jobs (report_id, payload, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+                (report_id, json.dumps(payload), now, now),
+            )
+
+    def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.db.execute("SELECT payload, attempts FROM jobs WHERE report_id = ?", (report_id,)).fetchone()
+        if row is None:
+            return None
+        payload = json.loads(row[0])
+        payload["attempts"] = row[1]
+        return payload
+
+    def mark(self, report_id: str, status: str, error: Optional[str] = None) -> None:
+        attempts = "attempts + 1" if status == "running" else "attempts"
+        with self._lock:
+            self.db.execute(
+                f"UPDATE jobs SET status = ?, error = ?, attempts = {attempts}, updated_at = ? WHERE report_id = ?",
+                (status, error, time.time(), report_id),
+            )
+
+    def delete(self, report_id: str) -> None:
+        with self._lock:
+            self.db.execute("DELETE FROM jobs WHERE report_id = ?", (report_id,))
+
+    def requeue_running(self) -> None:
+        """Put jobs left running by a previous process back in the queue"""
+        with self._lock:
+            self.db.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+
+    def queued(self, limit: int) -> List[str]:
+        """Up to ``limit`` queued jobs, oldest first"""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT report_id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT ?", (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self.db.close()
+
+
+class ReportPipeline:
+    """Bounded worker pool over the persistent job queue"""
+
+    def __init__(self, workers: int = REPORT_WORKERS, queue_path: str = REPORT_QUEUE_PATH,
+                 store: Optional[ReportStore] = None, queue_size: int = REPORT_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_path = queue_path
+        self.store = store
+        self.queue_size = queue_size
+        self.sio = None
+        self.jobs: Optional[JobQueue] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retries: Set[asyncio.Task] = set()
+        # Jobs queued in memory, running or waiting to be retried
+        self._owned: Set[str] = set()
+        # Queued jobs may be waiting in SQLite only
+        self._overflow = False
+        self._running = 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, sio) -> None:
+        """Start the workers and requeue jobs left over from a previous run"""
+        if self.started:
+            return
+        self.sio = sio
+        self.jobs = JobQueue(self.queue_path)
+        if self.store is None:
+            self.store = ReportStore()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        # Jobs left over from a previous run are pulled in by the workers
+        self.jobs.requeue_running()
+        self._overflow = True
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._report_depth()
+        logger.info(f"Report pipeline started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        """Cancel the workers; unfinished jobs stay in the queue for the next start"""
+        tasks = self._tasks + list(self._retries)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._retries.clear()
+        self._owned.clear()
+        if self.jobs is not None:
+            self.jobs.close()
+            self.jobs = None
+
+    async def submit(self, sid: str, topic_id: str, transcript: str, spool_path: str,
+               extra: Optional[Dict[str, Any]] = None, user_id: Optional[str] = None,
+               segments: Optional[List[List[Any]]] = None,
+               audio_format: Optional[Tuple[Optional[str], int]] = None) -> str:
+        """
+        Queue a report job. The job takes ownership of the spool file.
+
+        ``segments`` is the test's TranscriptLog.to_list(); when it matches
+        ``transcript`` the stored highlights get audio time spans.
+        ``audio_format`` is the (codec, sample_rate) of the spooled audio;
+        PCM recordings are measured directly, others from the segments.
+
+        Returns:
+            The report id
+        """
+        report_id = f"report-{uuid.uuid4()}"
+        payload = {
+            "report_id": report_id,
+            "sid": sid,
+            "user_id": user_id or "anonymous",
+            "topic_id": topic_id,
+            "transcript": transcript,
+            "segments": segments or [],
+            "spool_path": spool_path,
+            "codec": audio_format[0] if audio_format else None,
+            "sample_rate": audio_format[1] if audio_format else 0,
+            "ended_at": time.time(),
+            "extra": extra or {},
+        }
+        await asyncio.to_thread(self.jobs.add, report_id, payload)
+        metrics.inc("report_jobs", status="queued")
+        if not self._enqueue(report_id):
+            metrics.inc("report_jobs", status="deferred")
+        self._report_depth()
+        return report_id
+
+    def _enqueue(self, report_id: str) -> bool:
+        """Hand a queued job to the workers; False if it has to wait in SQLite"""
+        if report_id in self._owned:
+            return True
+        if self._queue.full():
+            self._overflow = True
+            return False
+        self._owned.add(report_id)
+        self._queue.put_nowait(report_id)
+        return True
+
+    async def _refill(self) -> None:
+        """Move jobs waiting in SQLite into the in-memory queue while there is room"""
+        self._overflow = False
+        room = self.queue_size - self._queue.qsize() if self.queue_size > 0 else self.workers
+        if room <= 0:
+            self._overflow = True
+            return
+        # One row more than fits tells whether jobs are left behind in SQLite
+        queued = await asyncio.to_thread(self.jobs.queued, room + len(self._owned) + 1)
+        waiting = [report_id for report_id in queued if report_id not in self._owned]
+        for report_id in waiting[:room]:
+            self._enqueue(report_id)
+        if len(waiting) > room:
+            self._overflow = True
+        if waiting:
+            logger.info(f"Queued {min(len(waiting), room)} report jobs waiting in {self.queue_path}")
+        self._report_depth()
+
+    async def _retry_later(self, report_id: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._owned.discard(report_id)
+        if not self._enqueue(report_id):
+            metrics.inc("report_jobs", status="deferred")
+        self._report_depth()
+
+    def _report_depth(self) -> None:
+        metrics.set_gauge("report_queue_depth", self._queue.qsize())
+
+    async def _progress(self, sid: str, report_id: str, stage: str, status: str, **extra: Any) -> None:
+        try:
+            await self.sio.emit('report_progress', {
+                'reportId': report_id,
+                'stage': stage,
+                'status': status,
+                **extra
+            }, room=sid)
+        except Exception as e:
+            logger.debug(f"Could not send report progress to {sid}: {e}")
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            if self._overflow and not self._queue.full():
+                try:
+                    await self._refill()
+                except Exception as e:
+                    logger.error(f"Could not load queued report jobs: {e}")
+                    self._overflow = True
+            report_id = await self._queue.get()
+            self._report_depth()
+            self._running += 1
+            metrics.set_gauge("report_jobs_running", self._running)
+            retrying = False
+            try:
+                retrying = await self._process(report_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Unexpected error in report worker {index}: {e}", exc_info=True)
+            finally:
+                if not retrying:
+                    self._owned.discard(report_id)
+                self._running -= 1
+                metrics.set_gauge("report_jobs_running", self._running)
+                self._queue.task_done()
+
+    async def _process(self, report_id: str) -> bool:
+        """Run a job's stages; True if it failed and will be retried"""
+        job = await asyncio.to_thread(self.jobs.get, report_id)
+        if job is None:
+            return False
+        sid = job["sid"]
+        await asyncio.to_thread(self.jobs.mark, report_id, "running")
+
+        stage_ms: Dict[str, float] = {}
+        context: Dict[str, Any] = {"job": job}
+        stage = STAGES[0]
+        try:
+            for stage in STAGES:
+                await self._progress(sid, report_id, stage, "started")
+                start = time.perf_counter()
+                await getattr(self, f"_stage_{stage}")(context)
+                stage_ms[stage] = round((time.perf_counter() - start) * 1000.0, 3)
+                metrics.observe("report_stage_ms", stage_ms[stage], stage=stage)
+                await self._progress(sid, report_id, stage, "done", ms=stage_ms[stage])
+        except Exception as e:
+            error = f"{stage}: {e}"
+            logger.error(f"Report job {report_id} failed in {error}", exc_info=True)
+            attempts = job["attempts"] + 1
+            if attempts < REPORT_MAX_ATTEMPTS:
+                await asyncio.to_thread(self.jobs.mark, report_id, "queued", error)
+                delay = retry_delay(attempts)
+                logger.info(f"Retrying report job {report_id} in {delay:.1f}s")
+                task = asyncio.create_task(self._retry_later(report_id, delay))
+                self._retries.add(task)
+                task.add_done_callback(self._retries.discard)
+                metrics.inc("report_jobs", status="retried")
+                return True
+            await asyncio.to_thread(self.jobs.mark, report_id, "failed", error)
+            metrics.inc("report_jobs", status="failed")
+            self._release_spool(job)
+            await self._progress(sid, report_id, stage, "failed", error=str(e))
+            return False
+
+        await asyncio.to_thread(self.jobs.delete, report_id)
+        self._release_spool(job)
+        metrics.inc("report_jobs", status="done")
+        metrics.observe("report_total_ms", (time.time() - job["ended_at"]) * 1000.0)
+
+        report = context["report"]
+        await self.sio.emit('test_completed_summary', {
+            'reportId': report_id,
+            'message': 'Your speaking test has been processed',
+            'transcript_length': len(report["transcript"]),
+            'word_count': len(report["transcript"].split()),
+            'audio_bytes': report["audio"]["bytes"],
+            'audio_chunks': report["audio"]["chunks"],
+            'highlights': len(report["highlights"]),
+            'fluency': report["fluency"],
+            'stage_ms': stage_ms,
+            **job["extra"]
+        }, room=sid)
+        return False
+
+    @staticmethod
+    def _release_spool(job: Dict[str, Any]) -> None:
+        if os.path.exists(job["spool_path"]):
+            AudioSpool(path=job["spool_path"]).release()
+
+    # --- Stages ---
+
+    async def _stage_assemble(self, context: Dict[str, Any]) -> None:
+        job = context["job"]
+        audio_bytes = 0
+        if os.path.exists(job["spool_path"]):
+            spool = AudioSpool(path=job["spool_path"])
+            with spool.recording() as audio:
+                audio_bytes = len(audio)
+            spool.detach()
+        context["audio"] = {
+            "bytes": audio_bytes,
+            "chunks": job["extra"].get("audio_chunks", 0),
+        }
+        context["transcript"] = job["transcript"]
+        transcript_log = TranscriptLog.from_list(job.get("segments") or [])
+        # A transcript sent by the client may not match our segments
+        context["transcript_log"] = transcript_log if transcript_log.text == job["transcript"] else None
+
+    async def _stage_measure(self, context: Dict[str, Any]) -> None:
+        # NumPy is loaded on first use (or by the STT warm-up), not with the pipeline
+        from socket_io_fluency import analyze_pcm, analyze_segments, filler_metrics, to_scores
+        job = context["job"]
+        word_count = len(context["transcript"].split())
+        fluency = None
+        if job.get("codec") and os.path.exists(job["spool_path"]):
+            spool = AudioSpool(path=job["spool_path"])
+            with spool.recording() as audio:
+                # The mapping stays open until the analysis thread is done with it
+                fluency = await asyncio.to_thread(
+                    analyze_pcm, audio, job["codec"], job.get("sample_rate") or 0, word_count
+                )
+            spool.detach()
+        if fluency is None:
+            fluency = analyze_segments(job.get("segments") or [], word_count)
+        fluency = fluency or {}
+        fluency.update(filler_metrics(context["transcript"], fluency.get("speaking_span_s", 0.0)))
+        context["fluency"] = fluency
+        context["scores"] = to_scores(context["fluency"])
+
+    async def _stage_analyze(self, context: Dict[str, Any]) -> None:
+        transcript = context["transcript"]
+        context["analysis"] = None
+        context["analysis_error"] = None
+        if len(transcript.split()) < 3:
+            return
+        payload = {
+            "transcripts": [{
+                "topic": context["job"]["topic_id"],
+                "paragraph": transcript
+            }]
+        }
+        try:
+            response = await get_ai_client().post(AI_SERVICE_URL, json=payload, timeout=ANALYSIS_TIMEOUT)
+            response.raise_for_status()
+            results = response.json().get("results") or []
+            context["analysis"] = results[0] if results else {}
+        except Exception as e:
+            # The report is still stored; the analysis can be redone from it
+            logger.warning(f"AI analysis unavailable for {context['job']['report_id']}: {e}")
+            context["analysis_error"] = str(e)
+
+    async def _stage_store(self, context: Dict[str, Any]) -> None:
+        job = context["job"]
+        analysis = context["analysis"] or {}
+        highlights = [{
+            "id": f"highlight-{i + 1}",
+            "start": error.get("start", 0),
+            "end": error.get("end", 0),
+            "type": "grammar",
+            "message": f"Grammar error: {error.get('wrong_version', '')}",
+            "wrongVersion": error.get("wrong_version", ""),
+            "correctVersion": error.get("correct_version", "")
+        } for i, error in enumerate(analysis.get("errors", []))]
+        transcript_log = context["transcript_log"]
+        if transcript_log is not None and len(transcript_log):
+            for highlight in highlights:
+                audio_start, audio_end = transcript_log.span_for(highlight["start"], highlight["end"])
+                highlight["audioStart"] = round(audio_start, 3)
+                highlight["audioEnd"] = round(audio_end, 3)
+        report = {
+            "report_id": job["report_id"],
+            "user_id": job["user_id"],
+            "topic_id": job["topic_id"],
+            "created_at": job["ended_at"],
+            "completed_at": time.time(),
+            "transcript": context["transcript"],
+            "audio": context["audio"],
+            "analysis": analysis,
+            "analysis_error": context["analysis_error"],
+            "highlights": highlights,
+            "fluency": context["fluency"],
+            "scores": context["scores"],
+        }
+        await self.store.save(report)
+        context["report"] = report
@@ -0,0 +1,263 @@
+"""
+Embedded SQLite store for speaking-test reports.
+
+One database file (WAL mode, so readers such as the speaking report agent
+never block the writer) holds four tables:
+
+    reports      one row per report, keyed by report_id, with user_id/topic
+    transcripts  the final transcript of each report
+    highlights   one row per highlight, in document order
+    scores       named numeric scores per report
+
+The schema version is kept in ``PRAGMA user_version``; opening an older
+file for writing upgrades it in place (see MIGRATIONS).
+
+Writes are group-committed: ``save`` queues the report and a single writer
+flushes everything queued so far in one transaction, off the event loop.
+Reads go through a small LRU of assembled reports; each miss is one indexed
+query.
+
+Reports are read back with the queries and row assembly of
+report_store_reader.py (a symlink to livekit-agent-server/rox/), the same
+module the agents use to open this file read-only.
+
+Usage:
+    store = ReportStore()
+    await store.save(report)
+    report = store.get(report_id)
+    report = store.latest_for_user(user_id)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from report_store_reader import LOAD_REPORT_SQL, REPORT_STORE_PATH, report_query, rows_to_report
+from socket_io_metrics import metrics
+
+logger = logging.getLogger('report_store')
+
+# Reports kept assembled in memory
+REPORT_CACHE_SIZE = 128
+
+# Upper bound on reports written in one transaction
+REPORT_WRITE_BATCH = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    report_id     TEXT PRIMARY KEY,
+    user_id       TEXT NOT NULL,
+    topic_id      TEXT,
+    created_at    REAL NOT NULL,
+    completed_at  REAL,
+    audio_bytes   INTEGER NOT NULL DEFAULT 0,
+    audio_chunks  INTEGER NOT NULL DEFAULT 0,
+    analysis      TEXT
+);
+CREATE INDEX IF NOT EXISTS reports_user_latest ON reports (user_id, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS transcripts (
+    report_id   TEXT PRIMARY KEY REFERENCES reports (report_id) ON DELETE CASCADE,
+    text        TEXT NOT NULL,
+    word_count  INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS highlights (
+    report_id        TEXT NOT NULL REFERENCES reports (report_id) ON DELETE CASCADE,
+    highlight_id     TEXT NOT NULL,
+    start            INTEGER NOT NULL,
+    end              INTEGER NOT NULL,
+    type             TEXT NOT NULL,
+    message          TEXT,
+    wrong_version    TEXT,
+    correct_version  TEXT,
+    audio_start      REAL,
+    audio_end        REAL,
+    PRIMARY KEY (report_id, highlight_id)
+);
+CREATE INDEX IF NOT EXISTS highlights_doc_order ON highlights (report_id, start, end);
+
+CREATE TABLE IF NOT EXISTS scores (
+    report_id  TEXT NOT NULL REFERENCES reports (report_id) ON DELETE CASCADE,
+    name       TEXT NOT NULL,
+    value      REAL NOT NULL,
+    PRIMARY KEY (report_id, name)
+);
+"""
+
+
+# Version of SCHEMA; files created by earlier versions are upgraded on open
+SCHEMA_VERSION = 2
+
+# Columns added since version 1, per version: (table, column, type)
+MIGRATIONS = {
+    2: [("highlights", "audio_start", "REAL"), ("highlights", "audio_end", "REAL")],
+}
+
+
+def migrate(db: sqlite3.Connection) -> None:
+    """Bring a store created by an older version up to SCHEMA_VERSION"""
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        version = db.execute("PRAGMA user_version").fetchone()[0]
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            for table, column, column_type in MIGRATIONS.get(target, []):
+                # Fresh files already have the column from SCHEMA
+                columns = {row[1] for row in db.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                    logger.info(f"Report store: added {table}.{column} (schema version {target})")
+        if version < SCHEMA_VERSION:
+            db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+
+
+def connect(path: str = REPORT_STORE_PATH, readonly: bool = False) -> sqlite3.Connection:
+    """Open the store with the pragmas every connection should use"""
+    if readonly:
+        db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        migrate(db)
+    db.execute("PRAGMA foreign_keys=ON")
+    return db
+
+
+class ReportStore:
+    """Batched writer plus LRU reader over the report database"""
+
+    def __init__(self, path: str = REPORT_STORE_PATH, cache_size: int = REPORT_CACHE_SIZE):
+        self.path = path
+        self.db = connect(path)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._db_lock = threading.Lock()
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._writer: Optional[asyncio.Task] = None
+
+    # --- Writes ---
+
+    async def save(self, report: Dict[str, Any]) -> None:
+        """Queue a report and wait until the batch containing it is committed"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((report, future))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._flush_pending())
+        await future
+
+    async def _flush_pending(self) -> None:
+        while self._pending:
+            batch = self._pending[:REPORT_WRITE_BATCH]
+            del self._pending[:REPORT_WRITE_BATCH]
+            try:
+                with metrics.timer("report_store_write_ms"):
+                    await asyncio.to_thread(self.write_batch, [report for report, _ in batch])
+                metrics.observe("report_store_batch_size", len(batch))
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} reports: {e}", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for report, future in batch:
+                self._remember(report["report_id"], None)
+                if not future.done():
+                    future.set_result(None)
+
+    def write_batch(self, reports: List[Dict[str, Any]]) -> None:
+        """Write reports in a single transaction (runs in a worker thread)"""
+        with self._db_lock:
+            self.db.execute("BEGIN")
+            try:
+                for report in reports:
+                    self._write_one(report)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def _write_one(self, report: Dict[str, Any]) -> None:
+        report_id = report["report_id"]
+        audio = report.get("audio", {})
+        self.db.execute(
+            "INSERT OR REPLACE INTO reports (report_id, user_id, topic_id, created_at, completed_at,"
+            " audio_bytes, audio_chunks, analysis) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (report_id, report.get("user_id") or "anonymous", report.get("topic_id"),
+             report["created_at"], report.get("completed_at"),
+             audio.get("bytes", 0), audio.get("chunks", 0),
+             json.dumps(report.get("analysis") or {})),
+        )
+        transcript = report.get("transcript", "")
+        self.db.execute(
+            "INSERT OR REPLACE INTO transcripts (report_id, text, word_count) VALUES (?, ?, ?)",
+            (report_id, transcript, len(transcript.split())),
+        )
+        self.db.execute("DELETE FROM highlights WHERE report_id = ?", (report_id,))
+        self.db.executemany(
+            "INSERT OR REPLACE INTO highlights (report_id, highlight_id, start, end, type, message,"
+            " wrong_version, correct_version, audio_start, audio_end) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(report_id, h.get("id") or f"{report_id}-{i}", h.get("start", 0), h.get("end", 0),
+              h.get("type", "grammar"), h.get("message"), h.get("wrongVersion"), h.get("correctVersion"),
+              h.get("audioStart"), h.get("audioEnd"))
+             for i, h in enumerate(report.get("highlights", []))],
+        )
+        self.db.execute("DELETE FROM scores WHERE report_id = ?", (report_id,))
+        self.db.executemany(
+            "INSERT INTO scores (report_id, name, value) VALUES (?, ?, ?)",
+            [(report_id, name, float(value)) for name, value in (report.get("scores") or {}).items()],
+        )
+
+    # --- Reads ---
+
+    def get(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """Load a report by id"""
+        cached = self._cache.get(report_id)
+        if cached is not None:
+            self._cache.move_to_end(report_id)
+            metrics.inc("report_store_cache", result="hit")
+            return cached
+        metrics.inc("report_store_cache", result="miss")
+        report = self._load(*report_query(LOAD_REPORT_SQL, report_id=report_id))
+        if report is not None:
+            self._remember(report_id, report)
+        return report
+
+    def latest_for_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Load the most recent report of a user (not cached; it changes)"""
+        report = self._load(*report_query(LOAD_REPORT_SQL, user_id=user_id))
+        if report is not None:
+            self._remember(report["report_id"], report)
+        return report
+
+    def _load(self, sql: str, params: Tuple) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return rows_to_report(rows)
+
+    def _remember(self, report_id: str, report: Optional[Dict[str, Any]]) -> None:
+        """Cache an assembled report, or invalidate it when ``report`` is None"""
+        if report is None:
+            self._cache.pop(report_id, None)
+            return
+        self._cache[report_id] = report
+        self._cache.move_to_end(report_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def close(self) -> None:
+        with self._db_lock:
+            self.db.close()
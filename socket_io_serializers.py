@@ -0,0 +1,185 @@
+"""
+Pluggable payload serialization for the Socket.IO feedback server.
+
+Two layers:
+
+1. A json-module compatible backend handed to ``socketio.AsyncServer(json=...)``.
+   It uses orjson when it is installed (falling back to the standard library
+   for anything orjson refuses) and records serialization time and wire bytes
+   per event type. The frontend keeps receiving ordinary Socket.IO JSON.
+
+2. An opt-in per-client msgpack mode. A client that sends
+   ``auth={"encoding": "msgpack"}`` (or ``?encoding=msgpack``) at connect time
+   receives large payloads such as ``ai_suggestion`` as a single msgpack-encoded
+   binary attachment instead of JSON. Clients that don't ask are unaffected.
+
+Usage:
+    from socket_io_serializers import select_json_backend, emit_to_client
+    sio = socketio.AsyncServer(async_mode='asgi', json=select_json_backend())
+    await emit_to_client(sio, 'ai_suggestion', payload, sid)
+"""
+
+import json as _stdlib_json
+import logging
+import os
+import time
+from typing import Dict, Any, Optional
+from urllib.parse import parse_qs
+
+from socket_io_metrics import metrics
+
+logger = logging.getLogger('socket_io_serializers')
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+# Label used for packets that are not named events (acks, connect packets, ...)
+CONTROL_EVENT = "_control"
+
+
+def _event_name(obj: Any) -> str:
+    """Socket.IO event packets are encoded as [event_name, *args]"""
+    if isinstance(obj, list) and obj and isinstance(obj[0], str):
+        return obj[0]
+    return CONTROL_EVENT
+
+
+class InstrumentedJSON:
+    """
+    Drop-in replacement for the ``json`` module used by python-socketio and
+    python-engineio. Only ``dumps`` and ``loads`` are needed by those packages.
+    """
+
+    def __init__(self, use_orjson: bool = True):
+        self.use_orjson = use_orjson and orjson is not None
+        self.name = "orjson" if self.use_orjson else "json"
+
+    def dumps(self, obj: Any, *args, **kwargs) -> str:
+        start = time.perf_counter()
+        encoded: Optional[str] = None
+        wire_bytes = 0
+        if self.use_orjson:
+            try:
+                raw = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+                wire_bytes = len(raw)
+                encoded = raw.decode("utf-8")
+            except TypeError:
+                # e.g. integers wider than 64 bits; the stdlib handles those
+                metrics.inc("serializer_fallbacks", backend="orjson")
+        if encoded is None:
+            kwargs.setdefault("separators", (",", ":"))
+            encoded = _stdlib_json.dumps(obj, *args, **kwargs)
+            # stdlib output is ASCII-only (ensure_ascii), so chars == bytes
+            wire_bytes = len(encoded)
+
+        event = _event_name(obj)
+        metrics.observe("serialize_ms", (time.perf_counter() - start) * 1000.0, event=event, encoding=self.name)
+        metrics.inc("wire_bytes_out", wire_bytes, event=event, encoding=self.name)
+        return encoded
+
+    def loads(self, s: Any, *args, **kwargs) -> Any:
+        start = time.perf_counter()
+        if self.use_orjson:
+            obj = orjson.loads(s)
+        else:
+            obj = _stdlib_json.loads(s, *args, **kwargs)
+        event = _event_name(obj)
+        metrics.observe("deserialize_ms", (time.perf_counter() - start) * 1000.0, event=event, encoding=self.name)
+        # Inbound frames arrive already decoded to str, so this counts characters
+        metrics.inc("wire_bytes_in", len(s), event=event, encoding=self.name)
+        return obj
+
+
+def select_json_backend(name: Optional[str] = None) -> InstrumentedJSON:
+    """
+    Pick the JSON backend for the server.
+
+    Args:
+        name: "auto" (default), "orjson" or "json"; falls back to the
+              SOCKET_IO_JSON environment variable when not given
+
+    Returns:
+        An InstrumentedJSON instance to pass as ``json=`` to AsyncServer
+    """
+    name = (name or os.getenv("SOCKET_IO_JSON", "auto")).lower()
+    if name == "orjson" and orjson is None:
+        logger.warning("orjson requested but not installed; using the standard json module")
+    backend = InstrumentedJSON(use_orjson=name in ("auto", "orjson"))
+    logger.info(f"Socket.IO payload serializer: {backend.name}")
+    return backend
+
+
+def install_json_backend(sio, backend: InstrumentedJSON) -> None:
+    """Swap the JSON backend of an already constructed server"""
+    import engineio.packet
+    sio.packet_class.json = backend
+    engineio.packet.Packet.json = backend
+
+
+# --- Per-client encoding negotiation ---
+
+# Negotiated payload encoding for each connected client
+client_encodings: Dict[str, str] = {}
+
+
+def negotiate_encoding(sid: str, environ: Dict[str, Any], auth: Any = None) -> str:
+    """
+    Decide the payload encoding for a newly connected client.
+
+    Clients opt in with ``auth={"encoding": "msgpack"}`` or an
+    ``encoding=msgpack`` query parameter. Anything else gets JSON.
+    """
+    requested = None
+    if isinstance(auth, dict):
+        requested = auth.get("encoding")
+    if not requested:
+        query = parse_qs(environ.get("QUERY_STRING", ""))
+        requested = (query.get("encoding") or [None])[0]
+
+    encoding = ENCODING_JSON
+    if requested == ENCODING_MSGPACK:
+        if msgpack is not None:
+            encoding = ENCODING_MSGPACK
+        else:
+            logger.warning(f"Client {sid} requested msgpack but it is not installed; using JSON")
+
+    client_encodings[sid] = encoding
+    metrics.inc("client_encodings", encoding=encoding)
+    return encoding
+
+
+def forget_client(sid: str) -> None:
+    """Drop the negotiated encoding of a disconnected client"""
+    client_encodings.pop(sid, None)
+
+
+def encode_msgpack(event: str, data: Any) -> bytes:
+    """Encode a payload with msgpack and record its cost"""
+    start = time.perf_counter()
+    packed = msgpack.packb(data, use_bin_type=True)
+    metrics.observe("serialize_ms", (time.perf_counter() - start) * 1000.0, event=event, encoding=ENCODING_MSGPACK)
+    metrics.inc("wire_bytes_out", len(packed), event=event, encoding=ENCODING_MSGPACK)
+    return packed
+
+
+async def emit_to_client(sio, event: str, data: Any, sid: str) -> None:
+    """
+    Emit an event to a single client using the encoding it negotiated.
+
+    msgpack clients receive the payload as one binary attachment; everyone
+    else gets the regular JSON event.
+    """
+    if client_encodings.get(sid) == ENCODING_MSGPACK:
+        await sio.emit(event, encode_msgpack(event, data), to=sid)
+    else:
+        await sio.emit(event, data, to=sid)
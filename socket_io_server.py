@@ -11,12 +11,19 @@ import sys
 import time
 import uuid
 import hashlib
+import os
 import uvicorn
 from html.parser import HTMLParser
 from typing import Dict, List, Any, Set, Tuple, Optional
 
-# --- Configuration for AI Service ---
-AI_SERVICE_URL = "http://127.0.0.1:8000/analyze"  # URL for the real AI service
+from socket_io_ai_client import AI_SERVICE_URL, get_ai_client, close_ai_client
+from socket_io_capture import TrafficCapture
+from socket_io_metrics import metrics
+from socket_io_serializers import (
+    select_json_backend, install_json_backend, negotiate_encoding, forget_client, emit_to_client
+)
+from socket_io_stt_handlers import register_stt_handlers, cleanup_inactive_tests, report_pipeline
+from socket_io_stt_registry import stt_registry
 
 # Configure logging
 logging.basicConfig(
@@ -30,11 +37,27 @@ sio = socketio.AsyncServer(
     async_mode='asgi',
     cors_allowed_origins='*',  # For development; restrict in production
     ping_interval=25,
-    ping_timeout=10
+    ping_timeout=10,
+    json=select_json_backend()  # orjson when available, see socket_io_serializers.py
 )
 
+# Speaking test STT handlers (audio_chunk, audio_frame, start/end_speaking_test)
+register_stt_handlers(sio)
+
+async def on_startup():
+    """Start background work without delaying the first connection"""
+    # The STT backend and audio modules load in the background; a test that
+    # starts before warm-up finishes initializes them on first use
+    sio.start_background_task(stt_registry.warm_up)
+    sio.start_background_task(cleanup_inactive_tests, sio)
+
+async def on_shutdown():
+    """Release shared resources when the ASGI server stops"""
+    await report_pipeline.stop()
+    await close_ai_client()
+
 # Create an ASGI app to wrap the Socket.IO server
-app = socketio.ASGIApp(sio)
+app = socketio.ASGIApp(sio, on_startup=on_startup, on_shutdown=on_shutdown)
 
 # --- Connection Management ---
 MAX_CONNECTIONS = 50
@@ -44,6 +67,16 @@ connection_attempts: Dict[str, List[float]] = {}
 # Track suggestions for each client to maintain them across edits
 client_suggestions: Dict[str, List[Dict[str, Any]]] = {}
 
+# --- Traffic Capture ---
+# Opt-in anonymized capture of inbound events, see socket_io_capture.py
+traffic_capture: Optional[TrafficCapture] = None
+
+def capture_event(sid: str, event: str, size: int = 0, content: Any = None) -> None:
+    """Record an inbound event if traffic capture is enabled"""
+    metrics.inc("events_received", event=event)
+    if traffic_capture is not None:
+        traffic_capture.record(sid, event, size=size, content=content)
+
 # --- HTML Handling ---
 class HTMLStripper(HTMLParser):
     """Enhanced HTML parser to convert HTML to plain text and track positions for Tiptap"""
@@ -581,7 +614,7 @@ def generate_mock_feedback(text: str, parser=None) -> list:
 # --- Socket.IO Event Handlers ---
 
 @sio.event
-async def connect(sid, environ):
+async def connect(sid, environ, auth=None):
     """Handle new client connections"""
     client_ip = environ.get('REMOTE_ADDR', 'unknown')
     client_id = f"{client_ip}:{sid}"
@@ -606,12 +639,16 @@ async def connect(sid, environ):
     
     # Add to active clients
     active_clients.add(sid)
-    logger.info(f"Client {client_id} connected. Active connections: {len(active_clients)}")
+    metrics.set_gauge("active_clients", len(active_clients))
+    capture_event(sid, 'connect')
+    encoding = negotiate_encoding(sid, environ, auth)
+    logger.info(f"Client {client_id} connected (encoding: {encoding}). Active connections: {len(active_clients)}")
     
     # Send connection acknowledgment
     await sio.emit('connection_ack', {
         'type': 'connection_ack',
         'clientId': sid,
+        'encoding': encoding,
         'message': 'Connected to Socket.IO server'
     }, to=sid)
     
@@ -622,6 +659,9 @@ async def disconnect(sid):
     """Handle client disconnections"""
     if sid in active_clients:
         active_clients.remove(sid)
+    metrics.set_gauge("active_clients", len(active_clients))
+    capture_event(sid, 'disconnect')
+    forget_client(sid)
     logger.info(f"Client {sid} disconnected. Remaining connections: {len(active_clients)}")
 
 @sio.event
@@ -635,6 +675,7 @@ async def message(sid, data):
             logger.info(f"Broadcasting highlights update from {sid} to all clients")
             highlights = data.get('highlights', [])
             logger.info(f"Broadcasting {len(highlights)} highlights")
+            capture_event(sid, 'highlights_update', size=len(highlights), content=highlights)
             
             # Store highlights for this client
             client_suggestions[sid] = highlights
@@ -647,6 +688,8 @@ async def message(sid, data):
         elif isinstance(data, dict) and data.get('type') == 'text_update':
             received_text = data.get('content', '')
             timestamp = data.get('timestamp', 0)
+            received_at = time.perf_counter()
+            capture_event(sid, 'text_update', size=len(received_text), content=received_text)
             
             if not received_text:
                 logger.warning(f"Received empty text from {sid}")
@@ -688,57 +731,56 @@ async def message(sid, data):
             feedback = []
             try:
                 logger.info(f"Calling real AI service for SID {sid}...")
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.post(AI_SERVICE_URL, json=ai_request_payload)
-                    response.raise_for_status()
-                    ai_response_data = response.json()
-                    logger.info(f"Received response from AI service: {str(ai_response_data)[:200]}...")
+                response = await get_ai_client().post(AI_SERVICE_URL, json=ai_request_payload, timeout=30.0)
+                response.raise_for_status()
+                ai_response_data = response.json()
+                logger.info(f"Received response from AI service: {str(ai_response_data)[:200]}...")
+                
+                # Transform AI response to frontend format
+                if ai_response_data and "results" in ai_response_data and ai_response_data["results"]:
+                    first_result = ai_response_data["results"][0]
+                    
+                    # Process error items (corrections/suggestions)
+                    if "errors" in first_result:
+                        for error_item in first_result["errors"]:
+                            if all(k in error_item for k in ["start", "end", "wrong_version", "correct_version"]):
+                                # Create a unique ID for this suggestion
+                                suggestion_id = f"suggestion-{uuid.uuid4().hex[:8]}"
+                                
+                                feedback.append({
+                                    "id": suggestion_id,
+                                    "start": error_item["start"],
+                                    "end": error_item["end"],
+                                    "type": "suggestion",  # Default to suggestion, can be refined based on AI response
+                                    "message": f"Change '{error_item['wrong_version']}' to '{error_item['correct_version']}'.",
+                                    "wrongVersion": error_item["wrong_version"],
+                                    "correctVersion": error_item["correct_version"]
+                                })
+                                logger.info(f"Created suggestion at position {error_item['start']}-{error_item['end']}: '{error_item['wrong_version']}' -> '{error_item['correct_version']}'")
+                    
+                    # Process grammar feedback
+                    if "grammar_feedback" in first_result and first_result["grammar_feedback"]:
+                        feedback.append({
+                            "id": f"grammar-{uuid.uuid4().hex[:8]}",
+                            "start": 0,
+                            "end": len(plain_text),
+                            "type": "grammar",
+                            "message": f"Grammar: {first_result['grammar_feedback']}"
+                        })
+                        logger.info(f"Added grammar feedback: {first_result['grammar_feedback'][:100]}...")
                     
-                    # Transform AI response to frontend format
-                    if ai_response_data and "results" in ai_response_data and ai_response_data["results"]:
-                        first_result = ai_response_data["results"][0]
-                        
-                        # Process error items (corrections/suggestions)
-                        if "errors" in first_result:
-                            for error_item in first_result["errors"]:
-                                if all(k in error_item for k in ["start", "end", "wrong_version", "correct_version"]):
-                                    # Create a unique ID for this suggestion
-                                    suggestion_id = f"suggestion-{uuid.uuid4().hex[:8]}"
-                                    
-                                    feedback.append({
-                                        "id": suggestion_id,
-                                        "start": error_item["start"],
-                                        "end": error_item["end"],
-                                        "type": "suggestion",  # Default to suggestion, can be refined based on AI response
-                                        "message": f"Change '{error_item['wrong_version']}' to '{error_item['correct_version']}'.",
-                                        "wrongVersion": error_item["wrong_version"],
-                                        "correctVersion": error_item["correct_version"]
-                                    })
-                                    logger.info(f"Created suggestion at position {error_item['start']}-{error_item['end']}: '{error_item['wrong_version']}' -> '{error_item['correct_version']}'")
-                        
-                        # Process grammar feedback
-                        if "grammar_feedback" in first_result and first_result["grammar_feedback"]:
-                            feedback.append({
-                                "id": f"grammar-{uuid.uuid4().hex[:8]}",
-                                "start": 0,
-                                "end": len(plain_text),
-                                "type": "grammar",
-                                "message": f"Grammar: {first_result['grammar_feedback']}"
-                            })
-                            logger.info(f"Added grammar feedback: {first_result['grammar_feedback'][:100]}...")
-                        
-                        # Process coherence feedback
-                        if "coherence_feedback" in first_result and first_result["coherence_feedback"]:
-                            feedback.append({
-                                "id": f"coherence-{uuid.uuid4().hex[:8]}",
-                                "start": 0,
-                                "end": len(plain_text),
-                                "type": "coherence",
-                                "message": f"Coherence: {first_result['coherence_feedback']}"
-                            })
-                            logger.info(f"Added coherence feedback: {first_result['coherence_feedback'][:100]}...")
-                    else:
-                        logger.warning("AI service returned empty or invalid response")
+                    # Process coherence feedback
+                    if "coherence_feedback" in first_result and first_result["coherence_feedback"]:
+                        feedback.append({
+                            "id": f"coherence-{uuid.uuid4().hex[:8]}",
+                            "start": 0,
+                            "end": len(plain_text),
+                            "type": "coherence",
+                            "message": f"Coherence: {first_result['coherence_feedback']}"
+                        })
+                        logger.info(f"Added coherence feedback: {first_result['coherence_feedback'][:100]}...")
+                else:
+                    logger.warning("AI service returned empty or invalid response")
             except httpx.HTTPStatusError as e:
                 logger.error(f"HTTP error calling AI service: {e.response.status_code} - {e.response.text}", exc_info=True)
             except httpx.RequestError as e:
@@ -795,7 +837,8 @@ async def message(sid, data):
             }
             
             # Send the response to the client
-            await sio.emit('ai_suggestion', response, to=sid)
+            await emit_to_client(sio, 'ai_suggestion', response, sid)
+            metrics.observe("event_latency_ms", (time.perf_counter() - received_at) * 1000.0, event='text_update')
             logger.info(f"Sent ai_suggestion with {len(feedback)} items to {sid}")
         else:
             logger.warning(f"Received unknown message format from {sid}: {data}")
@@ -812,6 +855,11 @@ async def message(sid, data):
             'message': f'Server error: {str(e)}'
         }, to=sid)
 
+@sio.event
+async def get_server_metrics(sid, data=None):
+    """Return a snapshot of the server metrics (used by socket_io_replay.py)"""
+    return metrics.snapshot()
+
 # --- Server Startup ---
 
 def parse_args():
@@ -820,10 +868,17 @@ def parse_args():
     parser.add_argument('--host', default='localhost', help='Host to bind the server to')
     parser.add_argument('--port', type=int, default=8001, help='Port to bind the server to')
     parser.add_argument('--debug', action='store_true', help='Enable debug logging')
+    parser.add_argument('--json-backend', choices=['auto', 'orjson', 'json'], default=None,
+                        help='Payload JSON serializer (default: SOCKET_IO_JSON or auto)')
+    parser.add_argument('--capture', default=os.getenv('SOCKET_IO_CAPTURE_PATH'),
+                        help='Append an anonymized traffic capture to this file (.jsonl or .jsonl.gz)')
+    parser.add_argument('--capture-hash-content', action='store_true',
+                        help='Include keyed content hashes in the traffic capture')
     return parser.parse_args()
 
 def start_server():
     """Start the Socket.IO server"""
+    global traffic_capture
     args = parse_args()
     
     # Set logging level based on debug flag
@@ -831,15 +886,25 @@ def start_server():
         logging.getLogger().setLevel(logging.DEBUG)
         logger.setLevel(logging.DEBUG)
     
+    if args.json_backend:
+        install_json_backend(sio, select_json_backend(args.json_backend))
+    
+    if args.capture:
+        traffic_capture = TrafficCapture(args.capture, hash_content=args.capture_hash_content)
+    
     logger.info(f"Starting Socket.IO server on http://{args.host}:{args.port}")
     
     # Run the server
-    uvicorn.run(
-        app,
-        host=args.host,
-        port=args.port,
-        log_level="info" if not args.debug else "debug"
-    )
+    try:
+        uvicorn.run(
+            app,
+            host=args.host,
+            port=args.port,
+            log_level="info" if not args.debug else "debug"
+        )
+    finally:
+        if traffic_capture is not None:
+            traffic_capture.close()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,582 @@
+"""
+Streaming STT backends for the TOEFL speaking test handlers.
+
+Each speaking test owns one long-lived STTStream. Audio chunks are pushed
+into it as they arrive and transcription results (interim and final) are
+delivered through an async callback, so cross-chunk context is kept and no
+per-chunk HTTP round trip is paid.
+
+Backends:
+    websocket - Deepgram live-transcription protocol over a WebSocket. Talks
+                to Deepgram itself or to the local stub in socket_io_stt_stub.py
+    mock      - canned transcript segments, one per chunk (development only)
+    replay    - recorded fixtures: identical audio chunks give identical
+                segments after a recorded (scalable) latency, for
+                reproducible benchmarks
+
+Fixtures are recorded by wrapping a real backend in RecordingSTTBackend.
+
+Streams are opened once the test's audio format is known. Raw PCM carries
+no header, so the websocket backend tells Deepgram its encoding and sample
+rate; containerized audio (webm/ogg opus) is detected by Deepgram itself.
+
+Usage:
+    backend = create_backend("websocket", api_key=key)
+    stream = await backend.open_stream(on_result, ("pcm16le", 16000))
+    await stream.send(audio_bytes)
+    await stream.close()
+"""
+
+import abc
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import struct
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
+from urllib.parse import urlencode
+
+logger = logging.getLogger('stt_backends')
+
+DEEPGRAM_LIVE_URL = "wss://api.deepgram.com/v1/listen"
+
+# Deepgram closes idle streams after ~10 s without audio (e.g. during prep time)
+KEEPALIVE_INTERVAL = 5.0
+
+# How long close() waits for the final results after CloseStream
+CLOSE_TIMEOUT = 5.0
+
+# --- Mock STT Responses ---
+# These will be used by the mock backend for development
+MOCK_STT_RESPONSES = [
+    "Hello, ", "my name is ", "Jane Smith. ", "I am taking ", "the TOEFL test ",
+    "today. ", "I would like ", "to discuss ", "a challenging ", "experience ",
+    "that I ", "faced recently. ", "Last year, ", "I had to ", "give a presentation ",
+    "in front of ", "a large audience. ", "It was ", "very intimidating ", "because ",
+    "I had never ", "spoken in public ", "before. ", "I was ", "extremely nervous ",
+    "and worried ", "that I would ", "forget my ", "speech. ", "To overcome ",
+    "this challenge, ", "I practiced ", "extensively ", "for several ", "weeks. ",
+    "I rehearsed ", "in front of ", "my friends ", "and family. ", "They gave me ",
+    "helpful feedback ", "which I ", "incorporated into ", "my presentation. ",
+    "When the ", "day arrived, ", "I was still ", "nervous, but ", "much more ",
+    "prepared. ", "The presentation ", "went well ", "and I received ", "positive comments. ",
+    "This experience ", "taught me ", "that preparation ", "is key ", "to overcoming ",
+    "difficult situations. ", "It also ", "boosted my ", "confidence ", "significantly. ",
+    "Now I feel ", "more comfortable ", "speaking in ", "public settings. "
+]
+
+
+@dataclass
+class STTResult:
+    """One transcription result from a stream"""
+    transcript: str
+    is_final: bool
+    start: float = 0.0  # audio time in seconds since the stream started
+    end: float = 0.0
+    confidence: float = 0.0
+
+
+ResultCallback = Callable[[STTResult], Awaitable[None]]
+
+# (codec, sample rate) of a test's audio, as reported by its first chunk
+AudioFormat = Tuple[Optional[str], int]
+
+# Sample rate assumed for PCM when the client does not report one
+DEFAULT_PCM_SAMPLE_RATE = 16000
+
+
+def websocket_client() -> Tuple[Callable[..., Any], str]:
+    """
+    The websockets ``connect`` function and its headers keyword.
+
+    Imported on first use so loading this module stays cheap.
+    """
+    try:
+        # websockets >= 13 ships the new asyncio implementation
+        from websockets.asyncio.client import connect
+        return connect, "additional_headers"
+    except ImportError:
+        from websockets import connect
+        return connect, "extra_headers"
+
+
+class STTStream(abc.ABC):
+    """A transcription stream owned by a single speaking test"""
+
+    # Request-based streams transcribe each chunk independently and can
+    # run transcribe() for several chunks at once
+    request_based = False
+
+    def __init__(self, on_result: ResultCallback):
+        self.on_result = on_result
+        self.closed = False
+        self.bytes_sent = 0
+
+    async def start(self) -> None:
+        """Open the underlying connection"""
+
+    @abc.abstractmethod
+    async def send(self, audio: bytes) -> None:
+        """Push a chunk of audio into the stream"""
+
+    async def close(self) -> None:
+        """Flush outstanding results and release the connection"""
+        self.closed = True
+
+
+class RequestSTTStream(STTStream):
+    """Base for backends that transcribe every chunk on its own"""
+
+    request_based = True
+
+    @abc.abstractmethod
+    async def transcribe(self, audio: bytes) -> List[STTResult]:
+        """Transcribe one chunk; may run concurrently for consecutive chunks"""
+
+    async def deliver(self, audio: bytes, results: List[STTResult]) -> None:
+        """Hand the results of a transcribed chunk to the stream's callback"""
+        self.bytes_sent += len(audio)
+        for result in results:
+            await self.on_result(result)
+
+    async def send(self, audio: bytes) -> None:
+        await self.deliver(audio, await self.transcribe(audio))
+
+
+class STTBackend(abc.ABC):
+    """Factory for per-test streams"""
+
+    name = "base"
+
+    def prepare(self) -> None:
+        """Do the slow, blocking part of initialization (may run in a thread)"""
+
+    @abc.abstractmethod
+    def create_stream(self, on_result: ResultCallback, audio_format: Optional[AudioFormat] = None) -> STTStream:
+        """Build (but do not open) a stream for audio in ``audio_format``"""
+
+    async def open_stream(self, on_result: ResultCallback, audio_format: Optional[AudioFormat] = None) -> STTStream:
+        stream = self.create_stream(on_result, audio_format)
+        await stream.start()
+        return stream
+
+
+# --- WebSocket (Deepgram live protocol) ---
+
+class WebSocketSTTStream(STTStream):
+    """
+    Streams audio over a WebSocket using Deepgram's live protocol: binary
+    audio frames up, JSON ``Results`` messages down, ``KeepAlive`` while
+    idle and ``CloseStream`` to flush.
+    """
+
+    def __init__(self, on_result: ResultCallback, url: str, headers: Dict[str, str],
+                 transcode: Optional[Callable[[bytes], bytes]] = None):
+        super().__init__(on_result)
+        self.url = url
+        self.headers = headers
+        self.transcode = transcode
+        self._ws = None
+        self._receiver: Optional[asyncio.Task] = None
+        self._keepalive: Optional[asyncio.Task] = None
+        self._last_send = time.monotonic()
+
+    async def start(self) -> None:
+        connect, headers_kwarg = websocket_client()
+        self._ws = await connect(self.url, **{headers_kwarg: self.headers})
+        self._receiver = asyncio.create_task(self._receive_loop())
+        self._keepalive = asyncio.create_task(self._keepalive_loop())
+        logger.info(f"Opened streaming STT connection to {self.url.split('?')[0]}")
+
+    async def send(self, audio: bytes) -> None:
+        if self.closed or self._ws is None:
+            raise RuntimeError("STT stream is closed")
+        self._last_send = time.monotonic()
+        self.bytes_sent += len(audio)
+        await self._ws.send(self.transcode(audio) if self.transcode else audio)
+
+    async def _keepalive_loop(self) -> None:
+        try:
+            while not self.closed:
+                await asyncio.sleep(KEEPALIVE_INTERVAL)
+                if time.monotonic() - self._last_send >= KEEPALIVE_INTERVAL:
+                    await self._ws.send(json.dumps({"type": "KeepAlive"}))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.debug(f"STT keepalive stopped: {e}")
+
+    async def _receive_loop(self) -> None:
+        try:
+            async for message in self._ws:
+                if isinstance(message, bytes):
+                    continue
+                result = parse_live_result(message)
+                if result is not None:
+                    await self.on_result(result)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error receiving from streaming STT: {e}", exc_info=True)
+
+    async def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self._keepalive:
+            self._keepalive.cancel()
+        if self._ws is None:
+            return
+        try:
+            # Ask the server to flush final results, then wait for it to hang up
+            await self._ws.send(json.dumps({"type": "CloseStream"}))
+            if self._receiver:
+                await asyncio.wait_for(self._receiver, timeout=CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Streaming STT did not close in time; dropping connection")
+        except Exception as e:
+            logger.debug(f"Error flushing streaming STT: {e}")
+        finally:
+            if self._receiver and not self._receiver.done():
+                self._receiver.cancel()
+            await self._ws.close()
+
+
+def parse_live_result(message: str) -> Optional[STTResult]:
+    """Turn a Deepgram live ``Results`` message into an STTResult"""
+    try:
+        data = json.loads(message)
+    except json.JSONDecodeError:
+        logger.warning(f"Ignoring non-JSON STT message: {message[:100]}")
+        return None
+    if data.get("type") != "Results":
+        return None
+
+    alternatives = data.get("channel", {}).get("alternatives") or [{}]
+    transcript = alternatives[0].get("transcript", "")
+    if not transcript:
+        return None
+    start = float(data.get("start", 0.0))
+    return STTResult(
+        transcript=transcript,
+        is_final=bool(data.get("is_final", False)),
+        start=start,
+        end=start + float(data.get("duration", 0.0)),
+        confidence=float(alternatives[0].get("confidence", 0.0)),
+    )
+
+
+def f32_to_linear16(audio: bytes) -> bytes:
+    """Convert little-endian float32 PCM to 16-bit PCM, which Deepgram can decode"""
+    usable = len(audio) - len(audio) % 4
+    try:
+        import numpy as np
+    except ImportError:
+        count = usable // 4
+        samples = struct.unpack(f"<{count}f", audio[:usable])
+        return struct.pack(f"<{count}h", *(int(max(-1.0, min(1.0, x)) * 32767.0) for x in samples))
+    samples = np.frombuffer(audio[:usable], dtype="<f4")
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+def live_audio_options(audio_format: Optional[AudioFormat]) -> Tuple[Dict[str, str], Optional[Callable[[bytes], bytes]]]:
+    """
+    Deepgram query options for a test's audio format, and the conversion
+    to apply to its chunks before sending.
+
+    Deepgram has no float encoding, so pcm-f32le is sent as linear16.
+    """
+    codec, sample_rate = audio_format or (None, 0)
+    if codec not in ("pcm16le", "pcm-f32le"):
+        return {}, None
+    options = {
+        "encoding": "linear16",
+        "sample_rate": str(sample_rate or DEFAULT_PCM_SAMPLE_RATE),
+        "channels": "1",
+    }
+    return options, f32_to_linear16 if codec == "pcm-f32le" else None
+
+
+class WebSocketSTTBackend(STTBackend):
+    """Deepgram live transcription (or the local stub speaking the same protocol)"""
+
+    name = "websocket"
+
+    def __init__(self, url: str = DEEPGRAM_LIVE_URL, api_key: Optional[str] = None,
+                 options: Optional[Dict[str, Any]] = None):
+        self.base_url = url
+        self.api_key = api_key
+        self.options = {
+            "punctuate": "true",
+            "interim_results": "true",  # interim results are forwarded to the client
+            "language": "en",
+            "model": "nova-2",
+            "smart_format": "true",
+            "filler_words": "true",  # keep "um"/"uh" for the fluency metrics
+        }
+        if options:
+            self.options.update(options)
+
+    def prepare(self) -> None:
+        websocket_client()
+
+    def create_stream(self, on_result: ResultCallback, audio_format: Optional[AudioFormat] = None) -> STTStream:
+        audio_options, transcode = live_audio_options(audio_format)
+        url = f"{self.base_url}?{urlencode({**self.options, **audio_options})}"
+        headers = {"Authorization": f"Token {self.api_key}"} if self.api_key else {}
+        return WebSocketSTTStream(on_result, url, headers, transcode)
+
+
+# --- Mock ---
+
+class MockSTTStream(RequestSTTStream):
+    """Returns a canned segment for every chunk after a fixed delay"""
+
+    def __init__(self, on_result: ResultCallback, delay: float):
+        super().__init__(on_result)
+        self.delay = delay
+
+    async def transcribe(self, audio: bytes) -> List[STTResult]:
+        await asyncio.sleep(self.delay)  # Simulate processing delay
+        segment = random.choice(MOCK_STT_RESPONSES)
+        logger.info(f"Using mock STT, generated: '{segment}'")
+        return [STTResult(transcript=segment, is_final=True, confidence=1.0)]
+
+
+class MockSTTBackend(STTBackend):
+    name = "mock"
+
+    def __init__(self, delay: float = 0.3):
+        self.delay = delay
+
+    def create_stream(self, on_result: ResultCallback, audio_format: Optional[AudioFormat] = None) -> STTStream:
+        return MockSTTStream(on_result, self.delay)
+
+
+# --- Replay ---
+
+def chunk_key(audio: bytes) -> str:
+    """Content hash identifying an audio chunk in a fixture"""
+    return hashlib.blake2b(audio, digest_size=16).hexdigest()
+
+
+class ReplayFixture:
+    """
+    Recorded transcription of audio chunks.
+
+    The JSON file holds, per chunk hash, the final segments the real backend
+    produced for that chunk and how long they took to arrive::
+
+        {
+          "version": 1,
+          "latency_ms": [212.0, 240.5, ...],
+          "chunks": {
+            "<blake2b-128 hex>": {
+              "latency_ms": 231.0,
+              "segments": [["my name is", 0.12, 0.81, 0.98], ...]
+            }
+          }
+        }
+
+    Segments are ``[text, gap, duration, confidence]``: the silence before
+    the segment and its length, in seconds of audio. Replay rebuilds
+    absolute timestamps from them, so pauses are reproduced.
+    """
+
+    VERSION = 1
+
+    def __init__(self, chunks: Optional[Dict[str, Dict[str, Any]]] = None,
+                 latency_ms: Optional[List[float]] = None):
+        self.chunks: Dict[str, Dict[str, Any]] = chunks or {}
+        self.latency_ms: List[float] = sorted(latency_ms or [])
+
+    @classmethod
+    def load(cls, path: str) -> "ReplayFixture":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"Unsupported STT fixture version in {path}: {data.get('version')}")
+        return cls(data.get("chunks"), data.get("latency_ms"))
+
+    def save(self, path: str) -> None:
+        """Write the fixture atomically"""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "latency_ms": self.latency_ms, "chunks": self.chunks},
+                      f, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def record(self, key: str, segments: List[List[Any]], latency_ms: float) -> None:
+        self.chunks[key] = {"latency_ms": round(latency_ms, 3), "segments": segments}
+        self.latency_ms.append(round(latency_ms, 3))
+        self.latency_ms.sort()
+
+    def lookup(self, key: str) -> Tuple[Optional[List[List[Any]]], float]:
+        """
+        Segments and latency for a chunk. Chunks not in the fixture get no
+        segments and a latency drawn from the recorded distribution by their
+        hash, so the same chunk always waits the same time.
+        """
+        entry = self.chunks.get(key)
+        if entry is not None:
+            return entry["segments"], float(entry.get("latency_ms", 0.0))
+        if not self.latency_ms:
+            return None, 0.0
+        return None, self.latency_ms[int(key[:8], 16) % len(self.latency_ms)]
+
+
+class ReplaySTTStream(RequestSTTStream):
+    """Replays fixture segments for each chunk, on a rebuilt audio clock"""
+
+    def __init__(self, on_result: ResultCallback, fixture: ReplayFixture, latency_scale: float):
+        super().__init__(on_result)
+        self.fixture = fixture
+        self.latency_scale = latency_scale
+        self.clock = 0.0
+
+    async def transcribe(self, audio: bytes) -> List[STTResult]:
+        key = chunk_key(audio)
+        segments, latency_ms = self.fixture.lookup(key)
+        # Timestamps are assigned before the first await: chunks transcribed
+        # concurrently start in order, so the audio clock advances in order
+        results = self._timestamped(key, segments)
+        delay = latency_ms * self.latency_scale / 1000.0
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return results
+
+    def _timestamped(self, key: str, segments: Optional[List[List[Any]]]) -> List[STTResult]:
+        if segments is None:
+            # Unknown chunk: a canned segment, but chosen by content, not at random
+            segments = [[MOCK_STT_RESPONSES[int(key[8:16], 16) % len(MOCK_STT_RESPONSES)], 0.0, 0.5, 1.0]]
+        results = []
+        for text, gap, duration, confidence in segments:
+            start = self.clock + float(gap)
+            self.clock = start + float(duration)
+            results.append(STTResult(transcript=text, is_final=True, start=round(start, 3),
+                                     end=round(self.clock, 3), confidence=float(confidence)))
+        return results
+
+
+class ReplaySTTBackend(STTBackend):
+    """
+    Deterministic backend over a recorded fixture.
+
+    ``latency_scale`` multiplies the recorded latencies: 1.0 replays real
+    timing, 0 returns immediately for throughput runs.
+    """
+
+    name = "replay"
+
+    def __init__(self, fixture: str, latency_scale: float = 1.0):
+        self.fixture_path = fixture
+        self.fixture = ReplayFixture.load(fixture)
+        self.latency_scale = max(0.0, latency_scale)
+        logger.info(f"Loaded STT fixture {fixture}: {len(self.fixture.chunks)} chunks, "
+                    f"latency scale {self.latency_scale}")
+
+    def create_stream(self, on_result: ResultCallback, audio_format: Optional[AudioFormat] = None) -> STTStream:
+        return ReplaySTTStream(on_result, self.fixture, self.latency_scale)
+
+
+class RecordingSTTStream(STTStream):
+    """
+    Passes audio through to a real stream and records which final segments
+    followed each chunk. Results are attributed to the most recent chunk
+    sent before they arrived.
+    """
+
+    def __init__(self, on_result: ResultCallback, backend: "RecordingSTTBackend",
+                 audio_format: Optional[AudioFormat] = None):
+        super().__init__(on_result)
+        self.backend = backend
+        self.audio_format = audio_format
+        self.inner: Optional[STTStream] = None
+        self._current: Optional[Tuple[str, float]] = None
+        self._segments: List[List[Any]] = []
+        self._first_result_at: Optional[float] = None
+        self._last_end = 0.0
+
+    async def start(self) -> None:
+        self.inner = await self.backend.inner.open_stream(self._record, self.audio_format)
+
+    async def _record(self, result: STTResult) -> None:
+        if result.is_final and self._current is not None:
+            if self._first_result_at is None:
+                self._first_result_at = time.monotonic()
+            gap = max(0.0, result.start - self._last_end)
+            self._segments.append([result.transcript, round(gap, 3),
+                                   round(max(0.0, result.end - result.start), 3), result.confidence])
+            self._last_end = max(self._last_end, result.end)
+        await self.on_result(result)
+
+    def _commit_chunk(self) -> None:
+        if self._current is None:
+            return
+        key, sent_at = self._current
+        if self._segments:
+            latency = (self._first_result_at - sent_at) * 1000.0
+            self.backend.fixture.record(key, self._segments, latency)
+        else:
+            self.backend.fixture.record(key, [], 0.0)
+        self._current = None
+        self._segments = []
+        self._first_result_at = None
+
+    async def send(self, audio: bytes) -> None:
+        self._commit_chunk()
+        self.bytes_sent += len(audio)
+        self._current = (chunk_key(audio), time.monotonic())
+        await self.inner.send(audio)
+
+    async def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        await self.inner.close()
+        self._commit_chunk()
+        self.backend.save()
+
+
+class RecordingSTTBackend(STTBackend):
+    """Wraps a real backend and writes what it transcribes to a fixture file"""
+
+    def __init__(self, inner: STTBackend, fixture: str):
+        self.inner = inner
+        self.name = inner.name
+        self.fixture_path = fixture
+        self.fixture = ReplayFixture.load(fixture) if os.path.exists(fixture) else ReplayFixture()
+
+    def create_stream(self, on_result: ResultCallback, audio_format: Optional[AudioFormat] = None) -> STTStream:
+        return RecordingSTTStream(on_result, self, audio_format)
+
+    def save(self) -> None:
+        try:
+            self.fixture.save(self.fixture_path)
+        except OSError as e:
+            logger.error(f"Could not write STT fixture {self.fixture_path}: {e}")
+
+
+def create_backend(name: str, **kwargs: Any) -> STTBackend:
+    """
+    Build an STT backend by name.
+
+    Args:
+        name: "websocket", "mock" or "replay"
+        kwargs: Backend-specific options (url, api_key, options, delay,
+                fixture, latency_scale)
+    """
+    if name == "websocket":
+        return WebSocketSTTBackend(**kwargs)
+    if name == "mock":
+        return MockSTTBackend(**kwargs)
+    if name == "replay":
+        return ReplaySTTBackend(**kwargs)
+    raise ValueError(f"Unknown STT backend: {name}")
@@ -6,64 +6,43 @@ speech-to-text processing for the TOEFL speaking test page.
 
 Usage:
     Import these handlers into your socket_io_server.py file.
+
+Importing this module is cheap: the STT backend is built by stt_registry on
+first use or at server startup (see socket_io_stt_registry.py), and the
+NumPy-based VAD is imported when a test first reports its audio format.
 """
 
 import asyncio
 import base64
-import json
 import logging
-import os
-import random
 import time
-import uuid
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, Any, Optional, Union
 
-import httpx
-from deepgram import Deepgram
+from socket_io_audio_frames import FrameError, FrameReorderBuffer, parse_frame
+from socket_io_audio_spool import AudioSpool
+from socket_io_expiry import ExpiryScheduler
+from socket_io_live_grammar import LiveGrammarStage
+from socket_io_metrics import metrics
+from socket_io_ordered_queue import AUDIO_PIPELINE_DEPTH, OrderedWorkQueue, QueueOverflow
+from socket_io_report_pipeline import ReportPipeline
+from socket_io_transcript import TranscriptLog
+from socket_io_stt_backends import AudioFormat, STTResult, STTStream
+from socket_io_stt_registry import stt_registry
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('stt_handlers')
 
 # --- Constants ---
-AI_SERVICE_URL = "http://127.0.0.1:8000/analyze"  # URL for AI grammar analysis
-
-# Configuration for STT
-DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
-if not DEEPGRAM_API_KEY:
-    logger.warning("DEEPGRAM_API_KEY not found in environment variables. Using mock STT.")
-    USE_MOCK_STT = True
-else:
-    # Initialize Deepgram client
-    try:
-        deepgram_client = Deepgram(DEEPGRAM_API_KEY)
-        USE_MOCK_STT = False
-        logger.info("Deepgram client initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize Deepgram client: {e}")
-        USE_MOCK_STT = True
-
 # Map to store active speaking tests by SID
 active_tests: Dict[str, Dict[str, Any]] = {}
 
-# --- Mock STT Responses ---
-# These will be used when USE_MOCK_STT is True for development
-MOCK_STT_RESPONSES = [
-    "Hello, ", "my name is ", "Jane Smith. ", "I am taking ", "the TOEFL test ",
-    "today. ", "I would like ", "to discuss ", "a challenging ", "experience ",
-    "that I ", "faced recently. ", "Last year, ", "I had to ", "give a presentation ",
-    "in front of ", "a large audience. ", "It was ", "very intimidating ", "because ",
-    "I had never ", "spoken in public ", "before. ", "I was ", "extremely nervous ",
-    "and worried ", "that I would ", "forget my ", "speech. ", "To overcome ", 
-    "this challenge, ", "I practiced ", "extensively ", "for several ", "weeks. ",
-    "I rehearsed ", "in front of ", "my friends ", "and family. ", "They gave me ",
-    "helpful feedback ", "which I ", "incorporated into ", "my presentation. ",
-    "When the ", "day arrived, ", "I was still ", "nervous, but ", "much more ",
-    "prepared. ", "The presentation ", "went well ", "and I received ", "positive comments. ",
-    "This experience ", "taught me ", "that preparation ", "is key ", "to overcoming ",
-    "difficult situations. ", "It also ", "boosted my ", "confidence ", "significantly. ",
-    "Now I feel ", "more comfortable ", "speaking in ", "public settings. "
-]
+# Tests without audio for this long are expired and their audio released
+INACTIVE_TEST_TIMEOUT = 120.0  # seconds
+
+# Deadline per test, touched on every chunk; driven by cleanup_inactive_tests
+test_expiry = ExpiryScheduler(INACTIVE_TEST_TIMEOUT, name="speaking_tests")
+
+# Finished tests are turned into reports in the background
+report_pipeline = ReportPipeline()
 
 # --- Async Functions for Socket.IO Server ---
 
@@ -107,9 +86,244 @@ async def handle_test_stt(sio, sid: str, data: Dict[str, Any]) -> None:
         'is_test': True
     }, room=sid)
 
+def _new_test_state(sid: str, topic_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Create the per-test state kept in active_tests"""
+    return {
+        "start_time": time.time(),
+        "user_id": user_id,
+        # Decoded audio goes to a per-test spool file; only offsets stay in memory
+        "audio_spool": AudioSpool(sid),
+        # Final segments with audio times; see socket_io_transcript.py
+        "transcript": TranscriptLog(),
+        "topic_id": topic_id,
+        "last_chunk_time": time.time(),
+        "stt_stream": None,
+        # Binary audio_frame ingest: frames are released in sequence order
+        "reorder": FrameReorderBuffer(),
+        "reorder_timer": None,
+        "codec": None,
+        "sample_rate": 0,
+        # Speech gate in front of the STT stream (PCM audio only)
+        "vad": None,
+        "wire_bytes": 0,
+    }
+
+def _start_test(sio, sid: str, topic_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Register a new test for this client.
+
+    Its STT stream is opened once the audio format is known (see _set_codec).
+    """
+    test = _new_test_state(sid, topic_id, user_id)
+    test["grammar"] = LiveGrammarStage(sio, sid, test["transcript"], topic=topic_id)
+    # Chunks are transcribed concurrently but committed in arrival order
+    test["audio_queue"] = OrderedWorkQueue(sid, on_pressure=_backpressure_notifier(sio, sid),
+                                           on_error=_queue_error_notifier(sio, sid))
+    active_tests[sid] = test
+    test_expiry.touch(sid)
+    return test
+
+async def _open_stt_stream(sio, sid: str, audio_format: AudioFormat) -> STTStream:
+    """Open the long-lived STT stream for a test, falling back to mock STT"""
+    on_result = _make_result_handler(sio, sid)
+    if stt_registry.ready:
+        backend = stt_registry.backend
+    else:
+        # First test before warm-up finished: build the backend off the event loop
+        backend = await asyncio.to_thread(lambda: stt_registry.backend)
+    try:
+        return await backend.open_stream(on_result, audio_format)
+    except Exception as e:
+        logger.error(f"Error opening {backend.name} STT stream for {sid}: {e}")
+        logger.info("Falling back to mock STT for this test")
+        return await stt_registry.fallback.open_stream(on_result, audio_format)
+
+def _set_codec_from_mime(sio, sid: str, test: Dict[str, Any], mime_type: Optional[str]) -> None:
+    from socket_io_vad import pcm_codec_for_mime, sample_rate_for_mime
+    _set_codec(sio, sid, test, pcm_codec_for_mime(mime_type) or mime_type or "unknown",
+               sample_rate_for_mime(mime_type))
+
+def _set_codec(sio, sid: str, test: Dict[str, Any], codec: Optional[str], sample_rate: int) -> None:
+    """
+    Record the audio format of a test, set up VAD if it can be inspected and
+    start opening the STT stream for that format.
+
+    The stream is opened in a task stored on the test so that chunks which
+    arrive while the connection is still being set up simply await it.
+    """
+    # Imported here so NumPy is not loaded with the handlers (stt_registry preloads it)
+    from socket_io_vad import create_gate
+    test["codec"] = codec
+    test["sample_rate"] = sample_rate
+    test["vad"] = create_gate(codec, sample_rate)
+    test["stt_stream"] = asyncio.ensure_future(_open_stt_stream(sio, sid, (codec, sample_rate)))
+
+def _backpressure_notifier(sio, sid: str):
+    """Build the callback that tells a client to pause or resume sending audio"""
+    async def on_pressure(saturated: bool, queued: int) -> None:
+        if saturated:
+            logger.warning(f"Audio queue full for {sid}: {queued} chunks pending")
+        try:
+            await sio.emit('audio_backpressure', {
+                'paused': saturated,
+                'queued': queued,
+                'depth': AUDIO_PIPELINE_DEPTH
+            }, room=sid)
+        except Exception as e:
+            logger.debug(f"Could not send backpressure signal to {sid}: {e}")
+    return on_pressure
+
+def _queue_error_notifier(sio, sid: str):
+    """Build the callback that tells a client a chunk was not transcribed"""
+    async def on_error(error: Exception) -> None:
+        if isinstance(error, QueueOverflow):
+            logger.warning(f"Audio queue overflow for {sid}, chunk not transcribed: {error}")
+            message = "Audio is arriving faster than it can be transcribed; chunk skipped"
+        else:
+            message = f"Error processing audio: {error}"
+        try:
+            await sio.emit('error', {'message': message}, room=sid)
+        except Exception as e:
+            logger.debug(f"Could not send queue error to {sid}: {e}")
+    return on_error
+
+def _release_audio(test: Dict[str, Any]) -> None:
+    """Stop pending audio work and live grammar checks, and delete the spooled audio of a test"""
+    timer = test.get("reorder_timer")
+    if timer is not None:
+        timer.cancel()
+    audio_queue = test.get("audio_queue")
+    if audio_queue is not None:
+        audio_queue.cancel()
+    grammar = test.get("grammar")
+    if grammar is not None:
+        grammar.cancel()
+    spool = test.get("audio_spool")
+    if spool is not None:
+        spool.release()
+
+async def _close_stt_stream(test: Dict[str, Any]) -> None:
+    """Flush and close the STT stream of a test, if one was opened"""
+    pending = test.get("stt_stream")
+    if pending is None:
+        return
+    try:
+        stream = await pending
+        await stream.close()
+    except Exception as e:
+        logger.error(f"Error closing STT stream: {e}")
+
+def _make_result_handler(sio, sid: str):
+    """Build the callback that forwards STT results for one test to its client"""
+    async def on_result(result: STTResult) -> None:
+        test = active_tests.get(sid)
+        if test is None:
+            return
+
+        # STT only heard the audio the VAD forwarded; its times skip the
+        # silence that was dropped, the recording's do not
+        start, end = result.start, result.end
+        if test["vad"] is not None:
+            start, end = test["vad"].recording_span(start, end)
+        
+        transcript_segment = result.transcript
+        if result.is_final:
+            if not transcript_segment.endswith(" "):
+                transcript_segment += " "
+            logger.info(f"Final STT result for {sid}: '{transcript_segment}'")
+            # Append to the test's timestamped transcript
+            test["transcript"].append(transcript_segment, start, end, result.confidence)
+
+        # Send the new segment to the client
+        try:
+            await sio.emit('live_stt_result', {
+                'transcript_segment': transcript_segment,
+                'is_final': result.is_final,
+                'start': start,
+                'end': end
+            }, room=sid)
+        except Exception as e:
+            logger.error(f"Error sending transcription to client {sid}: {e}")
+
+        if result.is_final:
+            test["grammar"].feed(transcript_segment)
+    return on_result
+
+def _ingest_audio(sio, sid: str, test: Dict[str, Any], audio: bytes) -> None:
+    """
+    Spool one decoded chunk and queue it for STT.
+
+    Called in arrival order and without awaiting, so the spool and the VAD
+    see chunks in order. The test's audio queue then transcribes up to
+    AUDIO_PIPELINE_DEPTH chunks concurrently (request-based backends) and
+    commits their results and confirmations in the same order.
+    """
+    # Store audio data for final processing
+    test["audio_spool"].append(audio)
+    test["last_chunk_time"] = time.time()
+    test_expiry.touch(sid)
+    
+    # Silent chunks never reach STT; the spool above still has them, and
+    # the gate maps STT times back to recording time (see on_result)
+    vad = test["vad"]
+    stt_audio = vad.filter(audio) if vad is not None else audio
+    metrics.inc("stt_chunks", result="sent" if stt_audio is not None else "silent")
+    
+    async def prepare():
+        if stt_audio is None:
+            return None
+        stream = await test["stt_stream"]
+        if stream.request_based:
+            return stream, await stream.transcribe(stt_audio)
+        return stream, None
+    
+    async def commit(prepared) -> None:
+        # --- FEED AUDIO INTO THE TEST'S STT STREAM ---
+        # Streaming backends deliver results through the stream's result handler
+        if prepared is not None:
+            stream, results = prepared
+            if results is None:
+                await stream.send(stt_audio)
+            else:
+                await stream.deliver(stt_audio, results)
+        
+        # Also send a direct confirmation that we processed the audio
+        await sio.emit('audio_processed', {
+            'success': True,
+            'timestamp': time.time(),
+            'message': 'Audio chunk processed successfully'
+        }, room=sid)
+    
+    test["audio_queue"].submit(prepare, commit)
+
+def _ingest_frames(sio, sid: str, test: Dict[str, Any], ready, gaps_before: int) -> None:
+    """Ingest frames released by the reorder buffer and re-arm its release timer"""
+    reorder = test["reorder"]
+    if reorder.gaps > gaps_before:
+        metrics.inc("audio_frame_gaps", reorder.gaps - gaps_before)
+        logger.warning(f"Audio frame gap for {sid}: {reorder.lost_frames} frame(s) lost so far")
+    for released in ready:
+        _ingest_audio(sio, sid, test, released.audio)
+    
+    # Frames held behind a gap are released when their delay runs out, even
+    # if no further frame arrives to trigger the check
+    timer = test.get("reorder_timer")
+    if timer is not None:
+        timer.cancel()
+        test["reorder_timer"] = None
+    release_at = reorder.release_at
+    if release_at is not None:
+        def on_timer():
+            test["reorder_timer"] = None
+            if active_tests.get(sid) is test:
+                gaps = reorder.gaps
+                _ingest_frames(sio, sid, test, reorder.release_expired(), gaps)
+        delay = max(0.0, release_at - time.monotonic())
+        test["reorder_timer"] = asyncio.get_running_loop().call_later(delay, on_timer)
+
 async def handle_audio_chunk(sio, sid: str, data: Dict[str, Any]) -> None:
     """
-    Handle incoming audio chunks from the client.
+    Handle incoming base64 audio chunks from older clients.
     
     Args:
         sio: The Socket.IO server instance
@@ -122,124 +336,33 @@ async def handle_audio_chunk(sio, sid: str, data: Dict[str, Any]) -> None:
         
         if sid not in active_tests:
             # Initialize test state for this client
-            active_tests[sid] = {
-                "start_time": time.time(),
-                "audio_chunks": [],
-                "transcript": "",
-                "topic_id": data.get("topic_id", "unknown"),
-                "last_chunk_time": time.time()
-            }
+            _start_test(sio, sid, data.get("topic_id", "unknown"))
             logger.info(f"Initialized new test state for client {sid}")
+        test = active_tests[sid]
+        if test["codec"] is None:
+            _set_codec_from_mime(sio, sid, test, data.get("mime_type"))
         
-        # Store audio data for later processing if needed
         audio_data = data.get("audio_data")
-        if audio_data:
-            # Log the size of the audio data
-            data_size = len(audio_data) if isinstance(audio_data, str) else 0
-            logger.info(f"Received audio data of size {data_size} bytes from {sid}")
-            
-            active_tests[sid]["audio_chunks"].append(audio_data)
-            active_tests[sid]["last_chunk_time"] = time.time()
+        if not audio_data:
+            logger.warning(f"Received audio_chunk without audio data from {sid}")
+            return
         
-        # --- PROCESS AUDIO WITH STT ---
-        transcript_segment = None
+        # Log the size of the audio data
+        data_size = len(audio_data) if isinstance(audio_data, str) else 0
+        logger.info(f"Received audio data of size {data_size} bytes from {sid}")
         
-        if USE_MOCK_STT:
-            # Use mock STT for development
-            await asyncio.sleep(0.3)  # Simulate processing delay
-            transcript_segment = random.choice(MOCK_STT_RESPONSES)
-            logger.info(f"Using mock STT, generated: '{transcript_segment}'")
-        else:
-            # Use Deepgram for real-time STT
-            try:
-                transcript_segment = await process_with_deepgram(audio_data)
-                logger.info(f"Deepgram processing successful")
-            except Exception as e:
-                logger.error(f"Error processing with Deepgram: {e}")
-                # Fallback to mock if Deepgram fails
-                transcript_segment = random.choice(MOCK_STT_RESPONSES)
-                logger.info(f"Falling back to mock STT: '{transcript_segment}'")
+        # Decode once; the same bytes are spooled and streamed to STT
+        decode_start = time.perf_counter()
+        try:
+            binary_audio_data = base64.b64decode(audio_data)
+        except Exception as e:
+            logger.error(f"Error decoding base64 audio: {e}")
+            return
+        metrics.observe("audio_decode_ms", (time.perf_counter() - decode_start) * 1000.0, event="audio_chunk")
+        metrics.inc("audio_wire_bytes", data_size, event="audio_chunk")
+        test["wire_bytes"] += data_size
         
-        if transcript_segment:
-            logger.info(f"Final STT result for {sid}: '{transcript_segment}'")
-            
-            # Update accumulated transcript
-            active_tests[sid]["transcript"] += transcript_segment
-            current_transcript = active_tests[sid]["transcript"]
-            
-            # Send the new segment to the client
-            try:
-                await sio.emit('live_stt_result', {
-                    'transcript_segment': transcript_segment
-                }, room=sid)
-                logger.info(f"Emitted 'live_stt_result' event to client {sid}")
-                
-                # Also send a direct confirmation that we processed the audio
-                await sio.emit('audio_processed', {
-                    'success': True,
-                    'timestamp': time.time(),
-                    'message': 'Audio chunk processed successfully'
-                }, room=sid)
-            except Exception as e:
-                logger.error(f"Error sending transcription to client {sid}: {e}")
-        else:
-            logger.warning(f"No transcript segment generated for audio from {sid}")
-            
-            # Send a notification that processing occurred but no transcript was generated
-            await sio.emit('audio_processed', {
-                'success': False,
-                'timestamp': time.time(),
-                'message': 'Audio processed but no transcription generated'
-            }, room=sid)
-            
-            # Periodically check for grammar issues using the AI service
-            # We don't want to do this for every tiny chunk
-            if len(transcript_segment.split()) >= 3:  # If segment has at least 3 words
-                try:
-                    # Prepare payload for AI service
-                    ai_request_payload = {
-                        "transcripts": [{
-                            "topic": active_tests[sid].get("topic_id", "Speaking Test"),
-                            "paragraph": current_transcript
-                        }]
-                    }
-                    
-                    # Send to AI service for grammar analysis
-                    async with httpx.AsyncClient() as client:
-                        response = await client.post(
-                            AI_SERVICE_URL, 
-                            json=ai_request_payload,
-                            timeout=3.0  # Short timeout for real-time
-                        )
-                        
-                        if response.status_code == 200:
-                            ai_results = response.json()
-                            
-                            # Transform AI results to highlight format
-                            highlights = []
-                            
-                            if "results" in ai_results and len(ai_results["results"]) > 0:
-                                result = ai_results["results"][0]
-                                
-                                for error in result.get("errors", []):
-                                    highlight = {
-                                        "id": str(uuid.uuid4()),
-                                        "start": error.get("start", 0),
-                                        "end": error.get("end", 0),
-                                        "type": "grammar",
-                                        "message": f"Grammar error: {error.get('wrong_version', '')}",
-                                        "wrongVersion": error.get("wrong_version", ""),
-                                        "correctVersion": error.get("correct_version", "")
-                                    }
-                                    highlights.append(highlight)
-                            
-                            # Send grammar highlights to client if we found any
-                            if highlights:
-                                await sio.emit('live_grammar_highlight', highlights, room=sid)
-                                logger.info(f"Sent {len(highlights)} grammar highlights to {sid}")
-                    
-                except Exception as e:
-                    logger.error(f"Error processing grammar for {sid}: {e}", exc_info=True)
+        _ingest_audio(sio, sid, test, binary_audio_data)
         
     except Exception as e:
         logger.error(f"Error processing audio_chunk for {sid}: {e}", exc_info=True)
@@ -247,6 +370,47 @@ async def handle_audio_chunk(sio, sid: str, data: Dict[str, Any]) -> None:
             'message': f"Error processing audio: {str(e)}"
         }, room=sid)
 
+async def handle_audio_frame(sio, sid: str, data: Union[bytes, Dict[str, Any]]) -> None:
+    """
+    Handle a binary audio frame (see socket_io_audio_frames for the format).
+    
+    Args:
+        sio: The Socket.IO server instance
+        sid: The session ID of the client
+        data: Raw frame bytes, or a dict with the header fields and binary audio
+    """
+    try:
+        parse_start = time.perf_counter()
+        try:
+            frame = parse_frame(data)
+        except FrameError as e:
+            logger.warning(f"Dropping invalid audio_frame from {sid}: {e}")
+            metrics.inc("audio_frames_invalid")
+            await sio.emit('error', {'message': f"Invalid audio frame: {e}"}, room=sid)
+            return
+        metrics.observe("audio_decode_ms", (time.perf_counter() - parse_start) * 1000.0, event="audio_frame")
+        metrics.inc("audio_wire_bytes", frame.wire_bytes, event="audio_frame")
+        
+        if sid not in active_tests:
+            topic_id = data.get("topic_id", "unknown") if isinstance(data, dict) else "unknown"
+            _start_test(sio, sid, topic_id)
+            logger.info(f"Initialized new test state for client {sid}")
+        test = active_tests[sid]
+        test["wire_bytes"] += frame.wire_bytes
+        if test["codec"] is None:
+            _set_codec(sio, sid, test, frame.codec, frame.sample_rate)
+            logger.info(f"Audio frames from {sid}: codec={frame.codec}, sample_rate={frame.sample_rate}")
+        
+        reorder = test["reorder"]
+        gaps_before = reorder.gaps
+        _ingest_frames(sio, sid, test, reorder.push(frame), gaps_before)
+        
+    except Exception as e:
+        logger.error(f"Error processing audio_frame for {sid}: {e}", exc_info=True)
+        await sio.emit('error', {
+            'message': f"Error processing audio: {str(e)}"
+        }, room=sid)
+
 async def handle_start_speaking_test(sio, sid: str, data: Dict[str, Any]) -> None:
     """
     Handle the start of a speaking test.
@@ -258,14 +422,17 @@ async def handle_start_speaking_test(sio, sid: str, data: Dict[str, Any]) -> Non
     """
     logger.info(f"Speaking test started for {sid}, data: {data}")
     
-    # Initialize test state for this client
-    active_tests[sid] = {
-        "start_time": time.time(),
-        "audio_chunks": [],
-        "transcript": "",
-        "topic_id": data.get("topic_id", "unknown"),
-        "last_chunk_time": time.time()
-    }
+    # A restarted test replaces the previous one and its STT stream
+    previous = active_tests.pop(sid, None)
+    if previous is not None:
+        _release_audio(previous)
+        await _close_stt_stream(previous)
+    
+    # Initialize test state for this client; a client that announces its
+    # audio format gets its STT stream opened before the first chunk
+    test = _start_test(sio, sid, data.get("topic_id", "unknown"), data.get("user_id") or data.get("userId"))
+    if data.get("mime_type"):
+        _set_codec_from_mime(sio, sid, test, data["mime_type"])
     
     # Acknowledge test start
     await sio.emit('test_started', {
@@ -287,39 +454,57 @@ async def handle_end_speaking_test(sio, sid: str, data: Dict[str, Any]) -> None:
     if sid in active_tests:
         test_data = active_tests[sid]
         topic_id = test_data.get("topic_id", "unknown")
+        # The test is finishing; it must not expire while it is finalized
+        test_expiry.discard(sid)
         
-        # Get the full transcript from client data or our accumulated one
-        full_transcript = data.get("transcript", test_data.get("transcript", ""))
+        # Release frames still waiting for a missing predecessor, wait for
+        # queued chunks to be committed, then flush the STT stream so the
+        # last final results land in the transcript
+        reorder = test_data["reorder"]
+        if test_data["reorder_timer"] is not None:
+            test_data["reorder_timer"].cancel()
+        for released in reorder.flush():
+            _ingest_audio(sio, sid, test_data, released.audio)
+        await test_data["audio_queue"].drain()
+        await _close_stt_stream(test_data)
+        spool = test_data["audio_spool"]
         
-        # Generate a unique report ID
-        report_id = f"report-{uuid.uuid4()}"
-        
-        # Here we would normally:
-        # 1. Process the full audio for a high-quality transcript
-        # 2. Send the transcript to the AI service for full analysis
-        # 3. Store the results in a database
+        # Get the full transcript from client data or our accumulated one
+        transcript_log = test_data["transcript"]
+        full_transcript = data.get("transcript", transcript_log.text)
         
         try:
-            # For now, just simulate processing time
-            await asyncio.sleep(1.0)
+            # Hand the transcript and the spool file over to the report
+            # pipeline; test_completed_summary follows once it is processed
+            if not report_pipeline.started:
+                report_pipeline.start(sio)
+            report_id = await report_pipeline.submit(sid, topic_id, full_transcript, spool.path, {
+                'audio_chunks': spool.chunk_count,
+                'wire_bytes': test_data["wire_bytes"],
+                'frames': reorder.stats(),
+                'vad': test_data["vad"].stats() if test_data["vad"] is not None else None
+            }, user_id=test_data["user_id"], segments=transcript_log.to_list(),
+                audio_format=(test_data["codec"], test_data["sample_rate"]))
+            # The spool file now belongs to the report job
+            spool.detach()
+            test_data["audio_spool"] = None
             
-            # Send completion notification to client
-            await sio.emit('test_completed_summary', {
+            await sio.emit('report_progress', {
                 'reportId': report_id,
-                'message': 'Your speaking test has been processed',
-                'transcript_length': len(full_transcript),
-                'word_count': len(full_transcript.split())
+                'stage': 'queued',
+                'status': 'queued'
             }, room=sid)
             
-            # Clean up
-            if sid in active_tests:
-                del active_tests[sid]
-                
         except Exception as e:
             logger.error(f"Error finalizing test for {sid}: {e}", exc_info=True)
             await sio.emit('error', {
                 'message': f"Error finalizing test: {str(e)}"
             }, room=sid)
+        finally:
+            # Clean up
+            if active_tests.get(sid) is test_data:
+                del active_tests[sid]
+            _release_audio(test_data)
     else:
         logger.warning(f"Received end_speaking_test for {sid} but no active test found")
         await sio.emit('error', {
@@ -339,6 +524,10 @@ def register_stt_handlers(sio):
     async def audio_chunk(sid, data):
         await handle_audio_chunk(sio, sid, data)
     
+    @sio.event
+    async def audio_frame(sid, data):
+        await handle_audio_frame(sio, sid, data)
+    
     @sio.event
     async def start_speaking_test(sid, data):
         await handle_start_speaking_test(sio, sid, data)
@@ -349,90 +538,39 @@ def register_stt_handlers(sio):
     
     logger.info("Registered STT handlers with Socket.IO server")
 
-# --- Deepgram STT Integration (Placeholder) ---
+# --- Cleanup Function ---
 
-async def process_with_deepgram(audio_data: str) -> str:
-    """
-    Process audio data with Deepgram API.
+async def _expire_test(sio, sid: str) -> None:
+    """Drop an inactive test, release its audio and notify the client"""
+    test_data = active_tests.pop(sid, None)
+    if test_data is None:
+        return
+    logger.info(f"Cleaning up inactive test for {sid}")
+    metrics.inc("tests_expired")
+    _release_audio(test_data)
+    await _close_stt_stream(test_data)
     
-    Args:
-        audio_data: Base64-encoded audio data
-        
-    Returns:
-        Transcribed text from the audio
-    """
+    # Notify client that session has expired
     try:
-        # 1. Decode base64 audio data to binary
-        try:
-            binary_audio_data = base64.b64decode(audio_data)
-        except Exception as e:
-            logger.error(f"Error decoding base64 audio: {e}")
-            return ""
-        
-        # 2. Configure Deepgram options for real-time transcription
-        options = {
-            "punctuate": True,  # Add punctuation
-            "diarize": False,  # Don't identify speakers (only one speaker expected)
-            "interim_results": False,  # We need final results for each chunk
-            "language": "en",  # English language
-            "model": "nova-2",  # Most accurate model as of 2023
-            "smart_format": True,  # Format numbers, dates, etc.
-            "endpointing": False,  # We're handling end of speech manually
-        }
-        
-        # 3. Send request to Deepgram API
-        response = await deepgram_client.transcription.prerecorded(
-            {"buffer": binary_audio_data, "mimetype": "audio/webm"},  # Adjust mimetype based on your client settings
-            options
-        )
-        
-        # 4. Parse and extract transcript
-        if response and "results" in response:
-            # Get transcript from the response
-            transcript = response["results"]["channels"][0]["alternatives"][0]["transcript"]
-            # Log for debugging
-            logger.info(f"Deepgram transcript: {transcript}")
-            return transcript
-        else:
-            logger.warning("No transcript found in Deepgram response")
-            return ""
-            
-    except Exception as e:
-        logger.error(f"Error processing with Deepgram: {e}", exc_info=True)
-        return ""
-
-# --- Cleanup Function ---
+        await sio.emit('test_expired', {
+            'message': 'Your speaking test session has expired due to inactivity'
+        }, room=sid)
+    except Exception:
+        pass
 
 async def cleanup_inactive_tests(sio):
     """
-    Periodically clean up inactive tests.
+    Expire inactive tests as soon as their deadline passes.
+    
+    Runs the test_expiry scheduler; start it once as a background task.
     
     Args:
         sio: The Socket.IO server instance
     """
-    while True:
-        try:
-            current_time = time.time()
-            to_remove = []
-            
-            for sid, test_data in active_tests.items():
-                # If no activity for more than 2 minutes, clean up
-                if current_time - test_data["last_chunk_time"] > 120:
-                    to_remove.append(sid)
-            
-            for sid in to_remove:
-                logger.info(f"Cleaning up inactive test for {sid}")
-                del active_tests[sid]
-                
-                # Notify client that session has expired
-                try:
-                    await sio.emit('test_expired', {
-                        'message': 'Your speaking test session has expired due to inactivity'
-                    }, room=sid)
-                except:
-                    pass
-                    
-        except Exception as e:
-            logger.error(f"Error in cleanup task: {e}")
-            
-        await asyncio.sleep(30)  # Run every 30 seconds
+    # Also resume report jobs left over from a previous run
+    if not report_pipeline.started:
+        report_pipeline.start(sio)
+    
+    async def on_expire(sid):
+        await _expire_test(sio, sid)
+    await test_expiry.run(on_expire)
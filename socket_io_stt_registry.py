@@ -0,0 +1,154 @@
+"""
+Lazily initialized STT backend for the speaking test handlers.
+
+Importing the STT handlers no longer reads the STT configuration or builds a
+backend. The registry does that on first use, or earlier when the ASGI
+server starts and calls ``warm_up``. Warm-up runs the slow parts in a worker
+thread so the event loop keeps serving connections:
+
+    - building the configured backend (websockets import, fixture loading)
+    - importing the NumPy-based VAD and fluency modules
+
+``ready`` (and the ``stt_ready`` gauge) turns true once warm-up finished.
+Init and import times are recorded as ``stt_init_ms{backend}`` and
+``module_import_ms{module}``.
+
+Usage:
+    backend = stt_registry.backend          # builds it on first use
+    await stt_registry.warm_up()            # at startup
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from socket_io_metrics import metrics
+from socket_io_stt_backends import (
+    DEEPGRAM_LIVE_URL, MockSTTBackend, RecordingSTTBackend, STTBackend, create_backend
+)
+
+logger = logging.getLogger('stt_registry')
+
+# Modules used by the audio path that are expensive to import
+WARM_UP_MODULES = ("socket_io_vad", "socket_io_fluency")
+
+
+@dataclass
+class STTConfig:
+    """
+    STT settings from the environment.
+
+    STT_BACKEND selects the streaming backend: "websocket" (Deepgram live
+    protocol), "mock" or "replay". STT_STREAM_URL points the websocket
+    backend at the local stub (socket_io_stt_stub.py) instead of Deepgram.
+    The replay backend reads STT_REPLAY_FIXTURE and scales its recorded
+    latencies by STT_REPLAY_LATENCY_SCALE (0 = no delay). STT_RECORD_FIXTURE
+    records whatever the selected backend transcribes into a fixture file.
+    """
+    backend: str
+    api_key: Optional[str] = None
+    stream_url: str = DEEPGRAM_LIVE_URL
+    replay_fixture: Optional[str] = None
+    replay_latency_scale: float = 1.0
+    record_fixture: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "STTConfig":
+        api_key = os.getenv("DEEPGRAM_API_KEY")
+        stream_url = os.getenv("STT_STREAM_URL", DEEPGRAM_LIVE_URL)
+        backend = os.getenv("STT_BACKEND") or ("websocket" if api_key else "mock")
+        if backend == "websocket" and stream_url == DEEPGRAM_LIVE_URL and not api_key:
+            logger.warning("DEEPGRAM_API_KEY not found in environment variables. Using mock STT.")
+            backend = "mock"
+        return cls(
+            backend=backend,
+            api_key=api_key,
+            stream_url=stream_url,
+            replay_fixture=os.getenv("STT_REPLAY_FIXTURE"),
+            replay_latency_scale=float(os.getenv("STT_REPLAY_LATENCY_SCALE", "1.0")),
+            record_fixture=os.getenv("STT_RECORD_FIXTURE"),
+        )
+
+
+class STTRegistry:
+    """Builds the configured STT backend once, on first use or at warm-up"""
+
+    def __init__(self, config: Optional[STTConfig] = None):
+        self._config = config
+        self._backend: Optional[STTBackend] = None
+        self._lock = threading.Lock()
+        self._warm_up: Optional[asyncio.Task] = None
+        self.ready = False
+        # Used when a streaming connection cannot be opened for a test
+        self.fallback: STTBackend = MockSTTBackend()
+
+    @property
+    def config(self) -> STTConfig:
+        if self._config is None:
+            self._config = STTConfig.from_env()
+        return self._config
+
+    @property
+    def backend(self) -> STTBackend:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._build()
+        return self._backend
+
+    @property
+    def use_mock(self) -> bool:
+        return self.backend.name == "mock"
+
+    def _build(self) -> STTBackend:
+        config = self.config
+        start = time.perf_counter()
+        try:
+            if config.backend == "websocket":
+                backend = create_backend("websocket", url=config.stream_url, api_key=config.api_key)
+            elif config.backend == "replay":
+                backend = create_backend("replay", fixture=config.replay_fixture,
+                                         latency_scale=config.replay_latency_scale)
+            else:
+                backend = create_backend(config.backend)
+            backend.prepare()
+            if config.record_fixture:
+                backend = RecordingSTTBackend(backend, config.record_fixture)
+                logger.info(f"Recording STT results to {config.record_fixture}")
+            logger.info(f"STT backend initialized: {backend.name}")
+        except Exception as e:
+            logger.error(f"Failed to initialize STT backend '{config.backend}': {e}")
+            backend = self.fallback
+        metrics.observe("stt_init_ms", (time.perf_counter() - start) * 1000.0, backend=backend.name)
+        return backend
+
+    @staticmethod
+    def _import_modules() -> None:
+        for name in WARM_UP_MODULES:
+            with metrics.timer("module_import_ms", module=name):
+                importlib.import_module(name)
+
+    async def warm_up(self) -> None:
+        """Build the backend and import the audio modules off the event loop"""
+        if self.ready:
+            return
+        if self._warm_up is None:
+            self._warm_up = asyncio.create_task(self._run_warm_up())
+        await asyncio.shield(self._warm_up)
+
+    async def _run_warm_up(self) -> None:
+        with metrics.timer("stt_warm_up_ms"):
+            await asyncio.to_thread(lambda: self.backend)
+            await asyncio.to_thread(self._import_modules)
+        self.ready = True
+        metrics.set_gauge("stt_ready", 1)
+        logger.info("STT warm-up complete")
+
+
+stt_registry = STTRegistry()
+metrics.set_gauge("stt_ready", 0)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Local WebSocket stub of the streaming STT protocol.
+
+Speaks the same subset of Deepgram's live-transcription protocol that
+socket_io_stt_backends.WebSocketSTTBackend uses, so the STT handlers can be
+exercised and benchmarked without network access or an API key:
+
+    client -> server   binary audio frames
+    client -> server   {"type": "KeepAlive"} / {"type": "CloseStream"}
+    server -> client   {"type": "Results", "is_final": ..., "start": ...,
+                        "duration": ..., "channel": {"alternatives": [...]}}
+
+Transcripts are deterministic: every ``--words-per-chunk`` words are taken
+from a fixed script in order, one interim result is sent per audio frame and
+a final result closes each group of ``--chunks-per-final`` frames.
+
+Usage:
+    python3 socket_io_stt_stub.py --port 8765
+    STT_BACKEND=websocket STT_STREAM_URL=ws://localhost:8765/v1/listen python3 socket_io_server.py
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from typing import List
+
+try:
+    # websockets >= 13 ships the new asyncio implementation
+    from websockets.asyncio.server import serve as ws_serve
+except ImportError:
+    from websockets import serve as ws_serve
+
+from socket_io_stt_backends import MOCK_STT_RESPONSES
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('stt_stub')
+
+SCRIPT_WORDS: List[str] = "".join(MOCK_STT_RESPONSES).split()
+
+
+class StubSession:
+    """State of one streaming connection"""
+
+    def __init__(self, websocket, args):
+        self.ws = websocket
+        self.args = args
+        self.word_index = 0
+        self.pending_words: List[str] = []
+        self.chunks_since_final = 0
+        self.audio_bytes = 0
+        self.segment_start = 0.0
+
+    def audio_time(self) -> float:
+        return self.audio_bytes / self.args.bytes_per_second
+
+    def next_words(self) -> List[str]:
+        words = []
+        for _ in range(self.args.words_per_chunk):
+            words.append(SCRIPT_WORDS[self.word_index % len(SCRIPT_WORDS)])
+            self.word_index += 1
+        return words
+
+    async def send_result(self, is_final: bool) -> None:
+        if not self.pending_words:
+            return
+        end = self.audio_time()
+        await self.ws.send(json.dumps({
+            "type": "Results",
+            "is_final": is_final,
+            "speech_final": is_final,
+            "start": round(self.segment_start, 3),
+            "duration": round(end - self.segment_start, 3),
+            "channel": {"alternatives": [{
+                "transcript": " ".join(self.pending_words),
+                "confidence": 0.99,
+            }]},
+        }))
+        if is_final:
+            self.pending_words = []
+            self.chunks_since_final = 0
+            self.segment_start = end
+
+    async def on_audio(self, frame: bytes) -> None:
+        if self.args.latency_ms:
+            await asyncio.sleep(self.args.latency_ms / 1000.0)
+        self.audio_bytes += len(frame)
+        self.pending_words.extend(self.next_words())
+        self.chunks_since_final += 1
+        is_final = self.chunks_since_final >= self.args.chunks_per_final
+        await self.send_result(is_final)
+
+    async def run(self) -> None:
+        async for message in self.ws:
+            if isinstance(message, bytes):
+                await self.on_audio(message)
+                continue
+            try:
+                control = json.loads(message)
+            except json.JSONDecodeError:
+                continue
+            if control.get("type") == "CloseStream":
+                await self.send_result(is_final=True)
+                await self.ws.send(json.dumps({
+                    "type": "Metadata",
+                    "duration": round(self.audio_time(), 3),
+                }))
+                break
+
+
+def make_handler(args):
+    async def handler(websocket, path=None):
+        logger.info("Stub STT stream opened")
+        try:
+            await StubSession(websocket, args).run()
+        except Exception as e:
+            logger.warning(f"Stub STT stream ended with error: {e}")
+        logger.info("Stub STT stream closed")
+    return handler
+
+
+async def serve(args) -> None:
+    async with ws_serve(make_handler(args), args.host, args.port):
+        logger.info(f"Stub STT server listening on ws://{args.host}:{args.port}/v1/listen")
+        await asyncio.Future()
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Local stub of the streaming STT protocol')
+    parser.add_argument('--host', default='localhost', help='Host to bind the server to')
+    parser.add_argument('--port', type=int, default=8765, help='Port to bind the server to')
+    parser.add_argument('--words-per-chunk', type=int, default=2, help='Words produced per audio frame')
+    parser.add_argument('--chunks-per-final', type=int, default=3, help='Audio frames per final result')
+    parser.add_argument('--bytes-per-second', type=float, default=4000.0,
+                        help='Audio bytes per second used to compute result timestamps')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Artificial delay per audio frame')
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        logger.info("Stub STT server stopped by user")
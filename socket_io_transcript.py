@@ -0,0 +1,127 @@
+"""
+Timestamped transcript of a speaking test.
+
+TranscriptLog is an append-only list of final STT segments. Each segment
+keeps its audio start/end time, its confidence and its character offset in
+the full transcript. Offsets and start times are kept in parallel sorted
+arrays, so mapping a character position to audio time (and back) is a
+binary search. The full text is joined only when asked for and then cached,
+so building it costs O(total length) rather than a string copy per segment.
+
+Usage:
+    log = TranscriptLog()
+    log.append("I went there ", start=0.0, end=1.2, confidence=0.97)
+    log.text                      # "I went there "
+    log.span_for(2, 6)            # audio seconds covering characters 2..6
+    log.offset_at_time(0.8)       # character offset spoken at 0.8 s
+"""
+
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+
+@dataclass
+class TranscriptSegment:
+    text: str
+    start: float
+    end: float
+    confidence: float
+    offset: int  # character offset of the segment in the full transcript
+
+    @property
+    def end_offset(self) -> int:
+        return self.offset + len(self.text)
+
+
+class TranscriptLog:
+    """Append-only transcript with character offset <-> audio time lookup"""
+
+    def __init__(self):
+        self.segments: List[TranscriptSegment] = []
+        self._offsets = array('Q')
+        self._starts = array('d')
+        self._length = 0
+        self._words = 0
+        self._text: Optional[str] = ""
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def word_count(self) -> int:
+        return self._words
+
+    @property
+    def text(self) -> str:
+        """The full transcript, joined on first access after an append"""
+        if self._text is None:
+            self._text = "".join(segment.text for segment in self.segments)
+        return self._text
+
+    def append(self, text: str, start: float = 0.0, end: float = 0.0, confidence: float = 0.0) -> TranscriptSegment:
+        """Add a final segment at the end of the transcript"""
+        # Keep start times sorted even if a backend reports them out of order
+        if self._starts and start < self._starts[-1]:
+            start = self._starts[-1]
+        segment = TranscriptSegment(text, start, max(start, end), confidence, self._length)
+        self.segments.append(segment)
+        self._offsets.append(self._length)
+        self._starts.append(start)
+        self._length += len(text)
+        self._words += len(text.split())
+        self._text = None
+        return segment
+
+    def tail(self, chars: int) -> Tuple[int, str]:
+        """
+        Return ``(offset, text)`` for at least the last ``chars`` characters,
+        starting at a segment boundary; only the trailing segments are joined.
+        """
+        if chars >= self._length:
+            return 0, self.text
+        index = self.segment_index_at(self._length - chars)
+        offset = self._offsets[index]
+        return offset, "".join(segment.text for segment in self.segments[index:])
+
+    def segment_index_at(self, char_offset: int) -> int:
+        """Index of the segment containing ``char_offset``"""
+        if not self.segments:
+            raise IndexError("Transcript is empty")
+        return max(0, bisect_right(self._offsets, char_offset) - 1)
+
+    def time_at_offset(self, char_offset: int) -> float:
+        """Audio time at which the character at ``char_offset`` was spoken (interpolated)"""
+        segment = self.segments[self.segment_index_at(char_offset)]
+        if not segment.text:
+            return segment.start
+        fraction = min(max(char_offset - segment.offset, 0), len(segment.text)) / len(segment.text)
+        return segment.start + fraction * (segment.end - segment.start)
+
+    def offset_at_time(self, seconds: float) -> int:
+        """Character offset of the segment being spoken at ``seconds`` (interpolated)"""
+        if not self.segments:
+            return 0
+        index = max(0, bisect_right(self._starts, seconds) - 1)
+        segment = self.segments[index]
+        duration = segment.end - segment.start
+        if duration <= 0:
+            return segment.offset
+        fraction = min(max(seconds - segment.start, 0.0), duration) / duration
+        return segment.offset + int(fraction * len(segment.text))
+
+    def span_for(self, start_char: int, end_char: int) -> Tuple[float, float]:
+        """Audio span (seconds) covering characters ``start_char``..``end_char``"""
+        return self.time_at_offset(start_char), self.time_at_offset(max(start_char, end_char))
+
+    def to_list(self) -> List[List[Any]]:
+        """Compact serializable form: [text, start, end, confidence] per segment"""
+        return [[s.text, s.start, s.end, s.confidence] for s in self.segments]
+
+    @classmethod
+    def from_list(cls, items: List[List[Any]]) -> "TranscriptLog":
+        log = cls()
+        for text, start, end, confidence in items:
+            log.append(text, start, end, confidence)
+        return log
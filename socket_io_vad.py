@@ -0,0 +1,219 @@
+"""
+Voice activity detection for the speaking test audio path.
+
+A lightweight NumPy detector decides, per incoming chunk, whether it contains
+speech. Silent chunks (preparation time, long pauses) are kept out of the STT
+stream; they are still written to the audio spool, so the full recording is
+unchanged. The last silent chunk before speech resumes is merged into the
+first speech chunk so word onsets are not clipped, and a short hangover keeps
+pauses between words flowing to STT.
+
+The STT stream only hears the forwarded audio, so its timestamps run behind
+the recording by the silence dropped so far. The gate records where in the
+forwarded audio each drop happened and maps STT times back to recording
+time (``recording_span``), which keeps transcript spans aligned with the
+spooled audio.
+
+Each chunk is split into 20 ms frames. A frame counts as speech when its
+energy is clearly above an adaptive noise floor, or when it is above the
+absolute floor and its spectral flux (the rise of the magnitude spectrum
+from the previous frame) marks an onset. Both measures are computed for all
+frames of a chunk in one vectorized pass.
+
+Only PCM audio can be inspected (pcm16le / pcm-f32le frames, or audio_chunk
+events with an ``audio/pcm`` or ``audio/l16`` MIME type). Compressed audio
+such as webm/opus always passes through. NumPy is optional; without it the
+VAD is disabled.
+"""
+
+import logging
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger('vad')
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Set STT_VAD=off to send every chunk to STT
+VAD_ENABLED = os.getenv("STT_VAD", "on").lower() not in ("0", "off", "false", "no")
+
+FRAME_MS = 20
+# Speech if this many dB above the noise floor ...
+NOISE_MARGIN_DB = 9.0
+# ... and never below this absolute level
+ABSOLUTE_FLOOR_DBFS = -55.0
+# Onset if the spectral flux exceeds this multiple of its running mean
+FLUX_ONSET_RATIO = 3.0
+# Keep forwarding for this long after the last speech frame
+HANGOVER_MS = 400
+
+PCM_DTYPES = {
+    "pcm16le": "<i2",
+    "pcm-f32le": "<f4",
+}
+
+
+def pcm_codec_for_mime(mime_type: Optional[str]) -> Optional[str]:
+    """Map an audio_chunk MIME type such as ``audio/pcm;rate=16000`` to a PCM codec"""
+    if not mime_type:
+        return None
+    base = mime_type.split(";")[0].strip().lower()
+    if base in ("audio/pcm", "audio/l16", "audio/x-raw"):
+        return "pcm16le"
+    return None
+
+
+def sample_rate_for_mime(mime_type: Optional[str], default: int = 16000) -> int:
+    for param in (mime_type or "").split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "rate" and value.isdigit():
+            return int(value)
+    return default
+
+
+class EnergyVAD:
+    """Energy + spectral-flux speech detector for one PCM stream"""
+
+    def __init__(self, sample_rate: int, codec: str = "pcm16le"):
+        self.sample_rate = sample_rate or 16000
+        self.dtype = PCM_DTYPES[codec]
+        self.scale = 32768.0 if codec == "pcm16le" else 1.0
+        self.frame_size = max(1, self.sample_rate * FRAME_MS // 1000)
+        self.hangover_frames = HANGOVER_MS // FRAME_MS
+        self.noise_floor_db: Optional[float] = None
+        self.flux_mean = 0.0
+        self._prev_spectrum = None
+        self._remainder = b""
+        self._frames_since_speech = self.hangover_frames + 1
+        self.speech_frames = 0
+        self.total_frames = 0
+
+    def speech_in(self, pcm: bytes) -> bool:
+        """Classify the frames of a chunk; True if any of them is speech (or in hangover)"""
+        data = self._remainder + pcm
+        itemsize = np.dtype(self.dtype).itemsize
+        usable = len(data) - len(data) % (self.frame_size * itemsize)
+        self._remainder = data[usable:]
+        if usable == 0:
+            return self._frames_since_speech <= self.hangover_frames
+
+        samples = np.frombuffer(data[:usable], dtype=self.dtype).astype(np.float32) / self.scale
+        frames = samples.reshape(-1, self.frame_size)
+
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        energy_db = 20.0 * np.log10(np.maximum(rms, 1e-9))
+
+        spectrum = np.abs(np.fft.rfft(frames, axis=1))
+        previous = np.vstack([
+            self._prev_spectrum if self._prev_spectrum is not None else spectrum[:1],
+            spectrum[:-1],
+        ])
+        flux = np.sum(np.maximum(spectrum - previous, 0.0), axis=1)
+        self._prev_spectrum = spectrum[-1:]
+
+        if self.noise_floor_db is None:
+            self.noise_floor_db = float(np.min(energy_db))
+            self.flux_mean = float(np.mean(flux)) or 1e-6
+
+        loud = energy_db > max(self.noise_floor_db + NOISE_MARGIN_DB, ABSOLUTE_FLOOR_DBFS)
+        onset = (energy_db > ABSOLUTE_FLOOR_DBFS) & (flux > FLUX_ONSET_RATIO * self.flux_mean)
+        speech = loud | onset
+
+        # Adapt the noise floor and flux baseline on non-speech frames only
+        quiet = ~speech
+        if quiet.any():
+            self.noise_floor_db = 0.9 * self.noise_floor_db + 0.1 * float(np.mean(energy_db[quiet]))
+            self.flux_mean = 0.9 * self.flux_mean + 0.1 * float(np.mean(flux[quiet]))
+
+        self.total_frames += len(speech)
+        self.speech_frames += int(np.count_nonzero(speech))
+
+        if speech.any():
+            last_speech = int(np.flatnonzero(speech)[-1])
+            self._frames_since_speech = len(speech) - 1 - last_speech
+        else:
+            self._frames_since_speech += len(speech)
+        return bool(speech.any()) or self._frames_since_speech <= self.hangover_frames
+
+
+class VadGate:
+    """Decides which chunks of a test reach the STT stream"""
+
+    def __init__(self, sample_rate: int, codec: str):
+        self.vad = EnergyVAD(sample_rate, codec)
+        self.bytes_per_second = self.vad.sample_rate * np.dtype(self.vad.dtype).itemsize
+        self.forwarded = 0
+        self.dropped = 0
+        self._held: Optional[bytes] = None
+        # Seconds of audio sent to STT so far (the STT stream's clock)
+        self.forwarded_seconds = 0.0
+        self.dropped_seconds = 0.0
+        # STT times at which silence was cut out, and the total cut by then
+        self._cut_at = array('d')
+        self._cut_total = array('d')
+
+    def filter(self, pcm: bytes) -> Optional[bytes]:
+        """
+        Return the audio to send to STT for this chunk, or None to skip it.
+
+        The most recent silent chunk is held back and prepended to the next
+        speech chunk.
+        """
+        if self.vad.speech_in(pcm):
+            self.forwarded += 1
+            if self._held is not None:
+                pcm = self._held + pcm
+                self._held = None
+            self.forwarded_seconds += len(pcm) / self.bytes_per_second
+            return pcm
+        if self._held is not None:
+            self.dropped += 1
+            self._cut(len(self._held) / self.bytes_per_second)
+        self._held = pcm
+        return None
+
+    def _cut(self, seconds: float) -> None:
+        self.dropped_seconds += seconds
+        if self._cut_at and self._cut_at[-1] == self.forwarded_seconds:
+            self._cut_total[-1] = self.dropped_seconds
+        else:
+            self._cut_at.append(self.forwarded_seconds)
+            self._cut_total.append(self.dropped_seconds)
+
+    def recording_span(self, start: float, end: float) -> Tuple[float, float]:
+        """
+        Map a span in STT time to recording time.
+
+        A span starting exactly at a cut lies after the removed silence; one
+        ending there lies before it.
+        """
+        first = bisect_right(self._cut_at, start) - 1
+        last = bisect_left(self._cut_at, end) - 1
+        return (start + (self._cut_total[first] if first >= 0 else 0.0),
+                end + (self._cut_total[last] if last >= 0 else 0.0))
+
+    @property
+    def speech_ratio(self) -> float:
+        if not self.vad.total_frames:
+            return 0.0
+        return self.vad.speech_frames / self.vad.total_frames
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "speech_ratio": round(self.speech_ratio, 3),
+            "chunks_forwarded": self.forwarded,
+            "chunks_dropped": self.dropped + (1 if self._held is not None else 0),
+            "seconds_dropped": round(self.dropped_seconds, 3),
+        }
+
+
+def create_gate(codec: Optional[str], sample_rate: int) -> Optional[VadGate]:
+    """A gate for PCM audio, or None when the VAD cannot or should not run"""
+    if not VAD_ENABLED or np is None or codec not in PCM_DTYPES:
+        return None
+    return VadGate(sample_rate, codec)